@@ -1,66 +1,79 @@
 """
 AI Assistant Router
 ───────────────────
-Provides an in-app customer-support chatbot powered by Google Gemini (free tier).
+Provides an in-app customer-support chatbot powered by Groq, with Gemini and a
+local stub as failover providers (see ai_assistant/llm_gateway.py).
 
 MongoDB collections used:
-  • ai_chat_sessions   – per-device message history
+  • ai_chat_sessions   – per-device message history, capped at write time
+                         to the last max_history_messages entries
+  • ai_chat_archive    – every exchange, one document per turn, for support
   • app_parameters     – config doc  config_key="ai_assistant"
 
 Endpoints:
   POST   /ai/chat                      – send a user message, receive AI reply
+  POST   /ai/chat/stream               – same, streamed as Server-Sent Events
   GET    /ai/chat/history/{device_id}  – fetch persisted chat history
   DELETE /ai/chat/history/{device_id}  – clear chat history
   GET    /ai/config                    – read AI-assistant feature flags
+  GET    /ai/cache/metrics             – semantic answer cache stats (admin)
+  DELETE /ai/cache                     – drop cached answers (admin)
+  GET    /ai/llm/metrics               – LLM provider health, queue/retry stats (admin)
 """
 
+import asyncio
 import os
+import time
 from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from google import genai
 from db.db import get_db
-
-# ── Groq client ──────────────────────────────────────────────────────────────
-from groq import Groq
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+from auth.dependencies import verify_admin_token
+from ai_assistant.answer_cache import answer_cache, prompt_version
+from ai_assistant.help_index import help_index
+from ai_assistant.summarizer import ConversationSummarizer, unsummarized
+
+# ── LLM providers ──────────────────────────────────────────────────────────────
+# All completions go through the shared LLM gateway (ai_assistant/llm_gateway.py),
+# which routes between Groq, Gemini and the local stub by latency and health
+# and applies concurrency/rate limits, coalescing, hedging and retries.
+# Model names below are Groq's; other providers map them to their own.
+from ai_assistant.llm_gateway import llm_gateway
 
 MODEL_NAME = "llama-3.3-70b-versatile"
+SUMMARY_MODEL_NAME = "llama-3.1-8b-instant"
 
 # ── System prompt ──────────────────────────────────────────────────────────────
-DEFAULT_SYSTEM_PROMPT = """You are GR Radio's friendly AI support assistant. Your job is to help users troubleshoot issues and answer questions about the GR Radio mobile app.
-
-**App overview**
-• GR Radio is a free music & radio streaming app built with Flutter, heavily optimized for Android and iOS using `just_audio` for strong background playing capabilities.
-• Core Architecture: Employs `radio_handler_mobile.dart` for station service, supporting robust buffering, error retries, and sleep timers, plus a floating mini-player via `sliding_up_panel`.
-• Standout Features: 
-  - Live local radio stations with an animated music visualizer.
-  - Regional MP3 Downloads & built-in MP3 player (e.g., Telugu, Masstamilan, Malayalam, Hindi). Users can search albums and directly download/play high-quality tracks offline.
-  - Live Radio Transcription: Built-in offline AI local transcriptions (via Vosk models on Android) that caption the radio broadcast live.
-  - Favourites & History: Persistent offline caching (Hive / Shared Preferences) for recently played stations and starred items.
-  - Alarm/Wake up functionality and deep background playback presence.
-• Premium subscription (via RevenueCat/in-app purchases) removes all mobile ads (Admob/Applovin) and unlocks higher audio quality and advanced MP3 downloads.
+# Compact base prompt.  App facts are no longer inlined here: the help
+# sections relevant to each question are retrieved from the BM25 help index
+# (ai_assistant/help_index.py, articles in ai_assistant/help_docs/) and
+# appended per request.
+DEFAULT_SYSTEM_PROMPT = """You are GR Radio's friendly AI support assistant. GR Radio is a free music & radio streaming app for Android and iOS. Help users troubleshoot issues and answer questions about the app using the help articles provided below.
 
 **Guidelines**
 1. STRICTLY restrict your answers ONLY to questions relating to the GR Radio app, its features, subscriptions, or music/radio streaming in general context of this app.
 2. If a user asks a question, command, or request that is completely unrelated to the GR Radio app, politely and smoothly refuse to answer (for example: "I specialize in helping you with the GR Radio app! I'm afraid I cannot help with other topics. Do you have any questions about the app?").
 3. Be concise, friendly, and helpful.
 4. If a user reports a technical error, bug, or issue that you cannot resolve, instruct them to use the Complaint or Feedback form (found in More → Help & Support → Submit Feedback) and to provide a detailed description of the problem.
-5. Never share personal data or make up information about the app.
+5. Never share personal data or make up information about the app. If the help articles do not cover the question, say so and point to the feedback form.
 6. Respond in the same language the user writes in when possible.
 7. Keep responses under 200 words unless the user asks for detail.
 8. Format responses using simple text, not markdown.
 """
 
+# Turns older than the running summary (ai_assistant/summarizer.py) are not
+# replayed; of the rest at most this many go to the model verbatim.
+PROMPT_HISTORY_MESSAGES = int(os.getenv("AI_PROMPT_HISTORY_MESSAGES", 12))
+
 # ── Router ─────────────────────────────────────────────────────────────────────
 router = APIRouter(prefix="/ai", tags=["AI Assistant"])
 
 COLLECTION = "ai_chat_sessions"
+ARCHIVE_COLLECTION = "ai_chat_archive"
 CONFIG_COLLECTION = "app_parameters"
 CONFIG_KEY = "ai_assistant"
 
@@ -82,6 +95,7 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     timestamp: str
+    cached: bool = False
 
 
 class ChatHistory(BaseModel):
@@ -120,23 +134,68 @@ async def _get_config() -> AiAssistantConfig:
         return AiAssistantConfig()
 
 
-async def _get_session(device_id: str) -> dict:
-    """Get or create a chat session document."""
+async def ensure_chat_indexes():
+    """Startup: indexes for the per-turn session read and the archive."""
+    db = get_db()
+    if db is None:
+        return
+    try:
+        await db[COLLECTION].create_index("device_id", unique=True)
+    except Exception as e:
+        # Duplicate sessions from before upserts were used; still index reads.
+        print(f"⚠️ Unique index on {COLLECTION}.device_id failed, using non-unique: {e}")
+        await db[COLLECTION].create_index("device_id")
+    try:
+        await db[ARCHIVE_COLLECTION].create_index([("device_id", 1), ("created_at", -1)])
+    except Exception as e:
+        print(f"⚠️ Index on {ARCHIVE_COLLECTION} failed: {e}")
+
+
+async def _get_history(device_id: str, limit: int) -> list[dict]:
+    """Read only the last ``limit`` messages of a session (server-side $slice)."""
+    db = get_db()
+    session = await db[COLLECTION].find_one(
+        {"device_id": device_id},
+        {"_id": 0, "messages": {"$slice": -limit}},
+    )
+    return (session or {}).get("messages", [])
+
+
+async def _get_prompt_history(device_id: str, limit: int) -> tuple[list[dict], Optional[str]]:
+    """Running summary plus the messages it does not cover yet."""
     db = get_db()
-    session = await db[COLLECTION].find_one({"device_id": device_id})
-    if session is None:
-        session = {
-            "device_id": device_id,
-            "messages": [],
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        }
-        await db[COLLECTION].insert_one(session)
-    return session
-
-
-def _build_groq_messages(messages: list[dict], user_message: str, system_prompt: str) -> list[dict]:
-    """Build the messages array for Groq."""
+    session = await db[COLLECTION].find_one(
+        {"device_id": device_id},
+        {"_id": 0, "summary": 1, "summary_upto": 1, "messages": {"$slice": -limit}},
+    ) or {}
+    recent = unsummarized(session.get("messages", []), session.get("summary_upto"))
+    return recent[-PROMPT_HISTORY_MESSAGES:], session.get("summary")
+
+
+async def _complete_summary(messages: list[dict]) -> str:
+    return await llm_gateway.complete(
+        model=SUMMARY_MODEL_NAME,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=256,
+    )
+
+
+chat_summarizer = ConversationSummarizer(COLLECTION, _complete_summary)
+
+
+def _build_groq_messages(
+    messages: list[dict],
+    user_message: str,
+    system_prompt: str,
+    help_snippets: Optional[str] = None,
+    summary: Optional[str] = None,
+) -> list[dict]:
+    """Build the OpenAI-style messages array sent to the LLM gateway."""
+    if help_snippets:
+        system_prompt = f"{system_prompt}\n**Help articles**\n{help_snippets}\n"
+    if summary:
+        system_prompt = f"{system_prompt}\n**Earlier in this conversation**\n{summary}\n"
     contents = [{"role": "system", "content": system_prompt}]
     for msg in messages:
         role = "user" if msg["role"] == "user" else "assistant"
@@ -145,15 +204,26 @@ def _build_groq_messages(messages: list[dict], user_message: str, system_prompt:
     return contents
 
 
-# ── Endpoints ──────────────────────────────────────────────────────────────────
+def _raise_llm_error(exc: Exception):
+    error_msg = str(exc)
+    if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
+        # 429 lets the mobile app show its "busy, try again" state.
+        raise HTTPException(
+            status_code=429,
+            detail="AI Assistant is temporarily overloaded. Please try again later."
+        )
+    raise HTTPException(
+        status_code=500,
+        detail=f"LLM API error: {error_msg}",
+    )
 
-@router.post("/chat", response_model=ChatResponse, summary="Send a chat message")
-async def chat(req: ChatRequest):
-    """Send a user message to the AI assistant and get a response."""
-    if not client:
+
+async def _load_chat_config() -> AiAssistantConfig:
+    """Validate that the assistant can answer and return its config."""
+    if not llm_gateway.available:
         raise HTTPException(
             status_code=503,
-            detail="AI assistant is not configured. GROQ_API_KEY is missing.",
+            detail="AI assistant is not configured. GROQ_API_KEY / GEMINI_API_KEY is missing.",
         )
 
     db = get_db()
@@ -164,61 +234,160 @@ async def chat(req: ChatRequest):
     config = await _get_config()
     if not config.enabled:
         raise HTTPException(status_code=403, detail="AI assistant is currently disabled.")
+    return config
+
+
+def _system_prompt(config: AiAssistantConfig) -> str:
+    return config.system_prompt_override or DEFAULT_SYSTEM_PROMPT
+
+
+async def _turn_messages(req: ChatRequest, config: AiAssistantConfig) -> tuple[list[dict], bool]:
+    """Prompt messages for this turn, and whether they carry earlier conversation."""
+    (history, summary), snippets = await asyncio.gather(
+        _get_prompt_history(req.device_id, config.max_history_messages),
+        help_index.snippets_for(req.message),
+    )
+    messages = _build_groq_messages(history, req.message, _system_prompt(config), snippets, summary)
+    return messages, bool(history or summary)
+
+
+async def _save_turn(device_id: str, user_message: str, reply_text: str, max_messages: int) -> str:
+    """
+    Persist one user/assistant exchange; returns its timestamp.
+
+    The session keeps only the newest ``max_messages`` ($push + $slice), so
+    its size is bounded; the full exchange also goes to the archive.  A
+    summary refresh is then scheduled in the background.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc).isoformat()
+    user_msg = {"role": "user", "content": user_message, "timestamp": now}
+    assistant_msg = {"role": "assistant", "content": reply_text, "timestamp": now}
+
+    await asyncio.gather(
+        db[COLLECTION].update_one(
+            {"device_id": device_id},
+            {
+                "$push": {"messages": {"$each": [user_msg, assistant_msg], "$slice": -max_messages}},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        ),
+        db[ARCHIVE_COLLECTION].insert_one(
+            {"device_id": device_id, "created_at": now, "messages": [user_msg, assistant_msg]}
+        ),
+    )
+    chat_summarizer.schedule(device_id, max_messages)
+    return now
 
-    # Get or create session
-    session = await _get_session(req.device_id)
-    history = session.get("messages", [])
 
-    # Trim history to max
-    if len(history) > config.max_history_messages:
-        history = history[-config.max_history_messages:]
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: ".encode() + orjson.dumps(data) + b"\n\n"
 
-    # Build system prompt
-    system_prompt = config.system_prompt_override or DEFAULT_SYSTEM_PROMPT
 
-    # Call Groq
+# ── Endpoints ──────────────────────────────────────────────────────────────────
+
+@router.post("/chat", response_model=ChatResponse, summary="Send a chat message")
+async def chat(req: ChatRequest):
+    """Send a user message to the AI assistant and get a response."""
+    config = await _load_chat_config()
+    version = prompt_version(_system_prompt(config))
+
+    cached = answer_cache.lookup(req.message, req.locale, version)
+    if cached is not None:
+        now = await _save_turn(req.device_id, req.message, cached[0], config.max_history_messages)
+        return ChatResponse(reply=cached[0], timestamp=now, cached=True)
+
+    messages, has_context = await _turn_messages(req, config)
+
+    # Call the LLM
+    started = time.perf_counter()
     try:
-        messages = _build_groq_messages(history, req.message, system_prompt)
-        response = client.chat.completions.create(
+        reply_text = (await llm_gateway.complete(
             model=MODEL_NAME,
             messages=messages,
             temperature=0.7,
             max_tokens=512,
-        )
-        reply_text = response.choices[0].message.content.strip()
+        )).strip()
     except Exception as exc:
-        error_msg = str(exc)
-        if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-            # Return a user-friendly message so the mobile app can display it cleanly
-            reply_text = "I'm receiving a lot of questions right now! Please wait a moment and try again."
-            # Optionally, you could still raise a 429 HTTPException here if your frontend
-            # is designed to catch HTTP 429s and show a specific UI state.
-            raise HTTPException(
-                status_code=429,
-                detail="AI Assistant is temporarily overloaded. Please try again later."
-            )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Gemini API error: {error_msg}",
-            )
-
-    # Save messages
-    now = datetime.now(timezone.utc).isoformat()
-    user_msg = {"role": "user", "content": req.message, "timestamp": now}
-    assistant_msg = {"role": "assistant", "content": reply_text, "timestamp": now}
-
-    await db[COLLECTION].update_one(
-        {"device_id": req.device_id},
-        {
-            "$push": {"messages": {"$each": [user_msg, assistant_msg]}},
-            "$set": {"updated_at": now},
-        },
-    )
+        _raise_llm_error(exc)
 
+    # A reply that leaned on earlier turns is not an answer to the question alone.
+    if not has_context:
+        answer_cache.store(req.message, reply_text, req.locale, version, (time.perf_counter() - started) * 1000)
+    now = await _save_turn(req.device_id, req.message, reply_text, config.max_history_messages)
     return ChatResponse(reply=reply_text, timestamp=now)
 
 
+@router.post("/chat/stream", summary="Send a chat message, stream the reply (SSE)")
+async def chat_stream(req: ChatRequest):
+    """
+    Streams the reply as Server-Sent Events:
+
+        event: token   data: {"delta": "..."}          (repeated)
+        event: done    data: {"reply": "...", "timestamp": "...", "cached": bool}
+        event: error   data: {"status": 500, "detail": "..."}
+
+    Setup failures (disabled, 429 before the first token) are returned as
+    plain HTTP errors.  The exchange is persisted once the reply is complete;
+    a client that disconnects mid-stream leaves no partial turn behind.
+    A semantic cache hit is sent as a single token event; only replies to
+    turns without earlier conversation are cached.
+    """
+    config = await _load_chat_config()
+    version = prompt_version(_system_prompt(config))
+
+    cached = answer_cache.lookup(req.message, req.locale, version)
+    if cached is not None:
+        async def cached_events():
+            now = await _save_turn(req.device_id, req.message, cached[0], config.max_history_messages)
+            yield _sse("token", {"delta": cached[0]})
+            yield _sse("done", {"reply": cached[0], "timestamp": now, "cached": True})
+
+        return StreamingResponse(
+            cached_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    messages, has_context = await _turn_messages(req, config)
+    started = time.perf_counter()
+    try:
+        stream = await llm_gateway.open_stream(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=512,
+        )
+    except Exception as exc:
+        _raise_llm_error(exc)
+
+    async def events():
+        parts = []
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+        except Exception as exc:
+            yield _sse("error", {"status": 500, "detail": f"LLM API error: {exc}"})
+            return
+        finally:
+            await stream.close()
+
+        reply_text = "".join(parts).strip()
+        if not has_context:
+            answer_cache.store(req.message, reply_text, req.locale, version, (time.perf_counter() - started) * 1000)
+        now = await _save_turn(req.device_id, req.message, reply_text, config.max_history_messages)
+        yield _sse("done", {"reply": reply_text, "timestamp": now, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get(
     "/chat/history/{device_id}",
     response_model=ChatHistory,
@@ -230,17 +399,8 @@ async def get_history(device_id: str):
     if db is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
 
-    session = await db[COLLECTION].find_one(
-        {"device_id": device_id}, {"_id": 0}
-    )
-    if not session:
-        return ChatHistory(device_id=device_id, messages=[])
-
     config = await _get_config()
-    messages = session.get("messages", [])
-    # Return only the last N messages
-    if len(messages) > config.max_history_messages:
-        messages = messages[-config.max_history_messages:]
+    messages = await _get_history(device_id, config.max_history_messages)
 
     return ChatHistory(device_id=device_id, messages=messages)
 
@@ -261,7 +421,10 @@ async def clear_history(device_id: str):
             "$set": {
                 "messages": [],
                 "updated_at": datetime.now(timezone.utc).isoformat(),
-            }
+            },
+            "$unset": {"summary": "", "summary_upto": ""},
+            # Invalidates summaries still being generated from the old history.
+            "$inc": {"history_epoch": 1},
         },
     )
     return {"status": "ok", "message": "Chat history cleared."}
@@ -275,3 +438,31 @@ async def clear_history(device_id: str):
 async def get_ai_config():
     """Return the AI assistant feature flags and human-support config."""
     return await _get_config()
+
+
+@router.get(
+    "/cache/metrics",
+    summary="Semantic answer cache statistics (this worker)",
+    dependencies=[Depends(verify_admin_token)],
+)
+async def get_answer_cache_metrics():
+    return answer_cache.metrics()
+
+
+@router.delete(
+    "/cache",
+    summary="Drop all cached answers (this worker)",
+    dependencies=[Depends(verify_admin_token)],
+)
+async def clear_answer_cache():
+    answer_cache.clear()
+    return {"status": "ok", "message": "Answer cache cleared."}
+
+
+@router.get(
+    "/llm/metrics",
+    summary="LLM gateway routing, provider health, queue time and retry statistics (this worker)",
+    dependencies=[Depends(verify_admin_token)],
+)
+async def get_llm_gateway_metrics():
+    return llm_gateway.metrics()
@@ -0,0 +1,194 @@
+"""
+Semantic answer cache for the support chatbot.
+
+Support questions are mostly near-duplicates ("how do I remove ads",
+"how to remove the ads?").  Each question is normalised and embedded
+locally as a hashed bag of word uni/bi-grams and character 3-grams,
+weighted by TF-IDF over the cached questions, and compared with NumPy
+cosine similarity.  A cached answer is reused when the best match clears
+AI_ANSWER_CACHE_THRESHOLD.
+
+Entries are scoped by (locale, prompt version): changing
+``system_prompt_override`` yields a new version, so answers written under
+an old prompt are never served.  The cache is per worker and in memory;
+entries expire after AI_ANSWER_CACHE_TTL_SECONDS and the least recently
+used are evicted beyond AI_ANSWER_CACHE_MAX_ENTRIES per scope.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ai_assistant.text_norm import content_words, normalize_text
+
+ANSWER_CACHE_DIM = 1 << 12
+ANSWER_CACHE_THRESHOLD = float(os.getenv("AI_ANSWER_CACHE_THRESHOLD", 0.85))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("AI_ANSWER_CACHE_MAX_ENTRIES", 1000))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("AI_ANSWER_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Very short messages ("why?", "and iOS?") depend on the conversation.
+ANSWER_CACHE_MIN_WORDS = 3
+
+
+def prompt_version(system_prompt: str) -> str:
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+normalize_question = normalize_text
+
+
+def _features(normalized: str) -> Dict[int, float]:
+    """Hashed term counts: content words, their bigrams and char 3-grams."""
+    words = content_words(normalized)
+    grams = list(words)
+    grams += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"#{w}#"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    counts: Dict[int, float] = {}
+    for g in grams:
+        # crc32 is stable across processes, unlike hash().
+        idx = zlib.crc32(g.encode("utf-8")) & (ANSWER_CACHE_DIM - 1)
+        counts[idx] = counts.get(idx, 0.0) + 1.0
+    # Sublinear tf.
+    return {i: 1.0 + np.log(c) for i, c in counts.items()}
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "features", "created_at", "last_hit", "hits")
+
+    def __init__(self, question: str, answer: str, features: Dict[int, float]):
+        self.question = question
+        self.answer = answer
+        self.features = features
+        self.created_at = time.time()
+        self.last_hit = self.created_at
+        self.hits = 0
+
+
+class _ScopeIndex:
+    """Entries of one (locale, prompt version) scope plus a lazily rebuilt matrix."""
+
+    def __init__(self):
+        self.entries: List[_Entry] = []
+        self.df = np.zeros(ANSWER_CACHE_DIM, dtype=np.float32)
+        self._matrix: Optional[np.ndarray] = None
+        self._idf: Optional[np.ndarray] = None
+
+    def _dirty(self):
+        self._matrix = None
+        self._idf = None
+
+    def add(self, entry: _Entry):
+        self.entries.append(entry)
+        for i in entry.features:
+            self.df[i] += 1
+        self._dirty()
+
+    def remove(self, entries: List[_Entry]):
+        gone = {id(e) for e in entries}
+        for e in entries:
+            for i in e.features:
+                self.df[i] -= 1
+        self.entries = [e for e in self.entries if id(e) not in gone]
+        self._dirty()
+
+    def _vector(self, features: Dict[int, float], idf: np.ndarray) -> np.ndarray:
+        v = np.zeros(ANSWER_CACHE_DIM, dtype=np.float32)
+        idx = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        v[idx] = np.fromiter(features.values(), dtype=np.float32, count=len(features)) * idf[idx]
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def best_match(self, features: Dict[int, float]) -> Tuple[Optional[_Entry], float]:
+        if not self.entries:
+            return None, 0.0
+        if self._matrix is None:
+            n = len(self.entries)
+            self._idf = np.log((n + 1) / (self.df + 1)).astype(np.float32) + 1.0
+            self._matrix = np.vstack([self._vector(e.features, self._idf) for e in self.entries])
+        sims = self._matrix @ self._vector(features, self._idf)
+        best = int(np.argmax(sims))
+        return self.entries[best], float(sims[best])
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._scopes: Dict[Tuple[str, str], _ScopeIndex] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.saved_llm_ms = 0.0
+        self._llm_ms_ewma: Optional[float] = None
+
+    @staticmethod
+    def cacheable(question: str) -> bool:
+        return len(normalize_question(question).split()) >= ANSWER_CACHE_MIN_WORDS
+
+    def _expire(self, scope: _ScopeIndex):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [e for e in scope.entries if e.created_at < cutoff]
+        if expired:
+            scope.remove(expired)
+
+    def lookup(self, question: str, locale: str, version: str) -> Optional[Tuple[str, float]]:
+        """Returns (answer, similarity) for a close enough cached question."""
+        if not self.cacheable(question):
+            return None
+        scope = self._scopes.get((locale, version))
+        if scope is None:
+            self.misses += 1
+            return None
+        self._expire(scope)
+        entry, similarity = scope.best_match(_features(normalize_question(question)))
+        if entry is None or similarity < self.threshold:
+            self.misses += 1
+            return None
+        entry.hits += 1
+        entry.last_hit = time.time()
+        self.hits += 1
+        if self._llm_ms_ewma is not None:
+            self.saved_llm_ms += self._llm_ms_ewma
+        return entry.answer, similarity
+
+    def store(self, question: str, answer: str, locale: str, version: str, llm_ms: Optional[float] = None):
+        if llm_ms is not None:
+            self._llm_ms_ewma = llm_ms if self._llm_ms_ewma is None else 0.9 * self._llm_ms_ewma + 0.1 * llm_ms
+        if not answer or not self.cacheable(question):
+            return
+        normalized = normalize_question(question)
+        scope = self._scopes.setdefault((locale, version), _ScopeIndex())
+        if any(e.question == normalized for e in scope.entries):
+            return
+        scope.add(_Entry(normalized, answer, _features(normalized)))
+        self.stores += 1
+        if len(scope.entries) > self.max_entries:
+            lru = sorted(scope.entries, key=lambda e: e.last_hit)[: len(scope.entries) - self.max_entries]
+            scope.remove(lru)
+
+    def clear(self):
+        self._scopes.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "entries": sum(len(s.entries) for s in self._scopes.values()),
+            "scopes": len(self._scopes),
+            "threshold": self.threshold,
+            "avg_llm_ms": round(self._llm_ms_ewma, 1) if self._llm_ms_ewma is not None else None,
+            "saved_llm_ms": round(self.saved_llm_ms, 1),
+        }
+
+
+answer_cache = SemanticAnswerCache()
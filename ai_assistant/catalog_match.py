@@ -0,0 +1,114 @@
+"""
+Batched catalog matching for AI song recommendations.
+
+All suggestions go to PostgreSQL in one query: ``unnest($1, $2)`` turns
+the (song, album) arrays into rows, and a LATERAL subquery picks the best
+catalog song for each by pg_trgm word similarity.  That makes one round
+trip instead of one ILIKE scan per suggestion, and typos or
+transliteration variants ("Channa Mereya" / "Chana Mereyaa") still match.
+
+Candidates come from two trigram GIN indexes (see db/migrations.py):
+
+  • song names similar to the suggested song, or
+  • songs of albums similar to the suggested album; these must still
+    reach ALBUM_CONFIRMED_SONG_SCORE on the title.
+
+The best candidate is ranked by 0.7 × song score + 0.3 × album score.
+"""
+
+from typing import Dict, List
+
+# Minimum word_similarity(suggested title, catalog title) on its own…
+MIN_SONG_SCORE = 0.5
+# …or together with a strongly matching album.
+ALBUM_CONFIRMED_SONG_SCORE = 0.3
+MIN_ALBUM_SCORE = 0.6
+# pg_trgm.word_similarity_threshold for the indexed <% candidate lookups.
+CANDIDATE_THRESHOLD = min(MIN_SONG_SCORE, MIN_ALBUM_SCORE)
+
+
+class Catalog:
+    """A scraped song catalog whose files are mirrored to Blomp."""
+
+    def __init__(self, name: str, songs_table: str, albums_table: str, object_prefix: str):
+        self.name = name
+        self.songs_table = songs_table
+        self.albums_table = albums_table
+        # Swift object names are "<prefix><blomp_path>".
+        self.object_prefix = object_prefix
+
+
+HINDIFLACS = Catalog("hindiflacs", "hindiflacs_songs", "hindiflacs_albums_list", "hindiflacs_songs/")
+TELUGUWAP = Catalog("teluguwap", "teluguwap_songs", "teluguwap_albums_list", "teluguwap_songs/")
+
+QUALITY_COLUMNS = {
+    "original": "blomp_path_original",
+    "128kbps": "blomp_path_128kbps",
+    "320kbps": "blomp_path_320kbps",
+}
+
+
+def _match_sql(catalog: Catalog, path_col: str) -> str:
+    return f"""
+        WITH wanted AS (
+            SELECT ord,
+                   lower(btrim(song)) AS song,
+                   lower(btrim(COALESCE(album, ''))) AS album
+            FROM unnest($1::text[], $2::text[]) WITH ORDINALITY AS w(song, album, ord)
+            WHERE btrim(COALESCE(song, '')) <> ''
+        )
+        SELECT DISTINCT ON (m.song_id) w.ord, m.*
+        FROM wanted w
+        CROSS JOIN LATERAL (
+            SELECT s.id AS song_id,
+                   s.song_name,
+                   a.album_name,
+                   s.{path_col} AS blomp_path,
+                   uma.email AS blomp_user_email,
+                   word_similarity(w.song, lower(s.song_name)) AS song_score,
+                   CASE WHEN w.album = '' THEN 0
+                        ELSE word_similarity(w.album, lower(a.album_name)) END AS album_score
+            FROM {catalog.songs_table} s
+            JOIN {catalog.albums_table} a ON a.id = s.album_id
+            LEFT JOIN public.user_mail_accounts uma ON uma.id = s.blomp_user_id
+            WHERE s.{path_col} IS NOT NULL
+              AND s.id IN (
+                  SELECT c.id FROM {catalog.songs_table} c
+                  WHERE w.song <% lower(c.song_name)
+                  UNION
+                  SELECT c.id FROM {catalog.albums_table} ca
+                  JOIN {catalog.songs_table} c ON c.album_id = ca.id
+                  WHERE w.album <> '' AND w.album <% lower(ca.album_name)
+              )
+            ORDER BY 0.7 * word_similarity(w.song, lower(s.song_name))
+                     + 0.3 * CASE WHEN w.album = '' THEN 0
+                                  ELSE word_similarity(w.album, lower(a.album_name)) END DESC,
+                     similarity(lower(s.song_name), w.song) DESC
+            LIMIT 1
+        ) m
+        WHERE m.song_score >= $3
+           OR (m.song_score >= $4 AND m.album_score >= $5)
+        ORDER BY m.song_id, w.ord
+    """
+
+
+async def match_suggestions(conn, catalog: Catalog, suggestions: List[Dict], quality: str) -> List[Dict]:
+    """
+    Best catalog match per suggestion with a file in ``quality``, in
+    suggestion order.  A catalog song matched by several suggestions
+    appears once.  Rows: song_name, album_name, blomp_path,
+    blomp_user_email, song_score, album_score.
+    """
+    suggestions = [s for s in suggestions if isinstance(s, dict)]
+    songs = [str(s.get("song_name") or "") for s in suggestions]
+    albums = [str(s.get("album_name") or "") for s in suggestions]
+    if not any(songs):
+        return []
+
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL pg_trgm.word_similarity_threshold = {CANDIDATE_THRESHOLD}")
+        rows = await conn.fetch(
+            _match_sql(catalog, QUALITY_COLUMNS[quality]),
+            songs, albums, MIN_SONG_SCORE, ALBUM_CONFIRMED_SONG_SCORE, MIN_ALBUM_SCORE,
+        )
+    return [dict(r) for r in sorted(rows, key=lambda r: r["ord"])]
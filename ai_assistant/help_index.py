@@ -0,0 +1,156 @@
+"""
+BM25 retrieval over app help articles.
+
+Instead of sending the whole app overview with every request, the chatbot
+sends a compact base prompt plus the few help sections that match the
+question.
+
+Articles are markdown files in ai_assistant/help_docs/ plus documents in
+the Mongo collection ``ai_help_articles`` ({slug, title, body}); a DB
+article replaces the file with the same slug.  Each ``#``/``##`` section is
+indexed as its own passage, titled "<article> › <section>".  The index is
+rebuilt every HELP_INDEX_REFRESH_SECONDS on the next lookup.
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from db.db import get_db
+from ai_assistant.text_norm import content_words, normalize_text
+
+HELP_DOCS_DIR = Path(__file__).parent / "help_docs"
+HELP_ARTICLES_COLLECTION = "ai_help_articles"
+HELP_INDEX_REFRESH_SECONDS = int(os.getenv("AI_HELP_INDEX_REFRESH_SECONDS", 600))
+HELP_TOP_K = int(os.getenv("AI_HELP_TOP_K", 3))
+# Passages scoring below this are not worth their tokens.
+HELP_MIN_SCORE = float(os.getenv("AI_HELP_MIN_SCORE", 1.0))
+HELP_RELATIVE_CUTOFF = 0.5
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_HEADING = re.compile(r"^(#{1,2})\s+(.*)$", re.MULTILINE)
+
+
+def _terms(text: str) -> List[str]:
+    # Light plural folding so "ads"/"ad", "downloads"/"download" meet.
+    return [
+        w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+        for w in content_words(normalize_text(text))
+    ]
+
+
+def split_sections(title: str, body: str) -> List[Tuple[str, str]]:
+    """Split a markdown article into (section title, text) passages."""
+    sections = []
+    matches = list(_HEADING.finditer(body))
+    if not matches:
+        return [(title, body.strip())] if body.strip() else []
+    preamble = body[: matches[0].start()].strip()
+    if preamble:
+        sections.append((title, preamble))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(body)
+        text = body[m.end():end].strip()
+        if m.group(1) == "#":
+            title = m.group(2).strip()
+            heading = title
+        else:
+            heading = f"{title} › {m.group(2).strip()}"
+        if text:
+            sections.append((heading, text))
+    return sections
+
+
+class HelpIndex:
+    def __init__(self):
+        self.passages: List[Tuple[str, str]] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        self._avg_len = 0.0
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def build(self, articles: Dict[str, Tuple[str, str]]):
+        passages = []
+        for title, body in articles.values():
+            passages.extend(split_sections(title, body))
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc_id, (heading, text) in enumerate(passages):
+            terms = _terms(f"{heading} {text}")
+            lengths.append(len(terms))
+            counts: Dict[str, int] = {}
+            for t in terms:
+                counts[t] = counts.get(t, 0) + 1
+            for t, tf in counts.items():
+                postings.setdefault(t, []).append((doc_id, tf))
+
+        self.passages = passages
+        self._postings = postings
+        self._lengths = lengths
+        self._avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def search(self, query: str, k: int = HELP_TOP_K, min_score: float = HELP_MIN_SCORE) -> List[Tuple[str, str, float]]:
+        n = len(self.passages)
+        if not n:
+            return []
+        scores: Dict[int, float] = {}
+        for term in set(_terms(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / self._avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        if not ranked:
+            return []
+        # Weak tail matches share only incidental words ("not", "phone").
+        cutoff = max(min_score, ranked[0][1] * HELP_RELATIVE_CUTOFF)
+        return [(*self.passages[d], s) for d, s in ranked if s >= cutoff]
+
+    async def _load_articles(self) -> Dict[str, Tuple[str, str]]:
+        articles: Dict[str, Tuple[str, str]] = {}
+        if HELP_DOCS_DIR.is_dir():
+            for path in sorted(HELP_DOCS_DIR.glob("*.md")):
+                body = path.read_text(encoding="utf-8")
+                m = _HEADING.search(body)
+                articles[path.stem] = (m.group(2).strip() if m else path.stem.replace("-", " ").title(), body)
+
+        db = get_db()
+        if db is not None:
+            try:
+                async for doc in db[HELP_ARTICLES_COLLECTION].find({}, {"_id": 0, "slug": 1, "title": 1, "body": 1}):
+                    if doc.get("slug") and doc.get("body"):
+                        articles[doc["slug"]] = (doc.get("title") or doc["slug"], doc["body"])
+            except Exception as e:
+                print(f"⚠️ Help articles could not be read from Mongo: {e}")
+        return articles
+
+    async def ensure_fresh(self):
+        if time.monotonic() - self._loaded_at < HELP_INDEX_REFRESH_SECONDS and self.passages:
+            return
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < HELP_INDEX_REFRESH_SECONDS and self.passages:
+                return
+            self.build(await self._load_articles())
+            self._loaded_at = time.monotonic()
+
+    async def snippets_for(self, question: str, k: int = HELP_TOP_K) -> Optional[str]:
+        """Prompt-ready text of the top-k passages, or None if nothing matches."""
+        await self.ensure_fresh()
+        hits = self.search(question, k)
+        if not hits:
+            return None
+        return "\n\n".join(f"[{heading}]\n{text}" for heading, text, _ in hits)
+
+
+help_index = HelpIndex()
@@ -0,0 +1,364 @@
+"""
+LLM gateway: every LLM call from the API goes through ``llm_gateway``.
+
+  • Providers    – Groq, Gemini and the local stub (ai_assistant/llm_providers.py),
+                   whichever are configured.  Each request goes to the fastest
+                   healthy provider: ranked by rolling p95 latency, with
+                   providers above LLM_MAX_ERROR_RATE or cooling down after a
+                   429 moved to the back (still tried as a last resort).
+  • Hedging      – if the chosen provider has not answered after its own p95
+                   (clamped to LLM_HEDGE_MIN_MS..LLM_HEDGE_AFTER_MS), the same
+                   request is sent to the next provider and the first answer
+                   wins.  A failed provider fails over to the next at once.
+  • Concurrency  – at most LLM_MAX_CONCURRENCY calls (or open streams) in
+                   flight per provider and worker; the rest queue.
+  • Rate limits  – token buckets per provider and model for requests/minute
+                   and tokens/minute, matching each provider's quota, so we
+                   queue instead of collecting 429s.
+  • Coalescing   – identical non-streaming requests that are in flight at
+                   the same time share one upstream call.
+  • Retries      – when every provider failed with a retryable error (429,
+                   5xx, timeouts, connection errors) the request is retried
+                   up to LLM_MAX_RETRIES times with full-jitter exponential
+                   backoff, honouring Retry-After.
+
+Streams fail over when opening fails but are not hedged; their time to
+first token (or failure) counts in the same provider stats.  ``metrics()``
+reports queue time percentiles, retries, hedges and per-provider health;
+it is served at GET /ai/llm/metrics.
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from ai_assistant.llm_providers import LLMProvider, ProviderStats, configured_providers
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 0.5))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", 8))
+LLM_HEDGE_MIN_MS = int(os.getenv("LLM_HEDGE_MIN_MS", 500))
+LLM_HEDGE_AFTER_MS = int(os.getenv("LLM_HEDGE_AFTER_MS", 4000))
+
+
+def estimate_tokens(messages, max_tokens: Optional[int]) -> int:
+    prompt = sum(len(str(m.get("content", ""))) for m in messages) // 4 + 4 * len(messages)
+    return prompt + (max_tokens or 512)
+
+
+class TokenBucket:
+    """Continuous-refill bucket; ``acquire`` waits until ``amount`` is available."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class _GatewayStream:
+    """
+    Async iterator of text deltas that frees its gateway slot when closed or
+    exhausted.  On close it reports ``on_done(first_token_ms, error)`` once,
+    so streamed calls feed the provider's stats like complete() does.
+    """
+
+    def __init__(self, deltas, release, started: float, on_done):
+        self._deltas = deltas
+        self._release = release
+        self._started = started
+        self._on_done = on_done
+        self._first_token_ms: Optional[float] = None
+        self._error: Optional[Exception] = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for delta in self._deltas:
+                if self._first_token_ms is None:
+                    self._first_token_ms = (time.perf_counter() - self._started) * 1000
+                yield delta
+        except Exception as exc:
+            self._error = exc
+            raise
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._release is not None:
+            release, self._release = self._release, None
+            try:
+                await self._deltas.aclose()
+            finally:
+                release()
+                self._on_done(self._first_token_ms, self._error)
+
+
+class LLMGateway:
+    def __init__(self, providers: List[LLMProvider], max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.providers = list(providers)
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats() for p in self.providers}
+        self._sems = {p.name: asyncio.Semaphore(max_concurrency) for p in self.providers}
+        self._max_concurrency = max_concurrency
+        self._buckets: Dict[tuple, tuple] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._queue_ms = deque(maxlen=1000)
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(self.providers)
+
+    def _require(self):
+        if not self.providers:
+            raise RuntimeError("LLM gateway has no provider configured (GROQ_API_KEY / GEMINI_API_KEY missing).")
+
+    def ranked(self) -> List[LLMProvider]:
+        """Healthy before unhealthy, then by p95 latency; unmeasured providers after measured ones."""
+        def key(item):
+            index, provider = item
+            stats = self.stats[provider.name]
+            p95 = stats.p95_ms()
+            return (not stats.healthy(), p95 is None, p95 or 0.0, index)
+
+        return [p for _, p in sorted(enumerate(self.providers), key=key)]
+
+    def _hedge_delay(self, provider: LLMProvider) -> float:
+        p95 = self.stats[provider.name].p95_ms()
+        ms = LLM_HEDGE_AFTER_MS if p95 is None else min(max(p95, LLM_HEDGE_MIN_MS), LLM_HEDGE_AFTER_MS)
+        return ms / 1000
+
+    async def _acquire(self, provider: LLMProvider, model: str, tokens: int):
+        """Take a concurrency slot and rate budget on ``provider``."""
+        started = time.perf_counter()
+        sem = self._sems[provider.name]
+        await sem.acquire()
+        try:
+            key = (provider.name, model)
+            if key not in self._buckets:
+                self._buckets[key] = (TokenBucket(provider.rpm), TokenBucket(provider.tpm))
+            requests_bucket, tokens_bucket = self._buckets[key]
+            await requests_bucket.acquire(1)
+            await tokens_bucket.acquire(tokens)
+        except BaseException:
+            sem.release()
+            raise
+        self._queue_ms.append((time.perf_counter() - started) * 1000)
+
+    def _note_failure(self, provider: LLMProvider, exc: Exception):
+        stats = self.stats[provider.name]
+        stats.record(None, False)
+        if provider.is_rate_limit(exc):
+            self.rate_limited += 1
+            stats.cool_down(provider.retry_after(exc) or 1.0)
+
+    def _stream_done(self, provider: LLMProvider, started: float):
+        """Record a finished stream: time to first token, or its failure."""
+        def on_done(first_token_ms: Optional[float], error: Optional[Exception]):
+            if error is not None:
+                self._note_failure(provider, error)
+            else:
+                # Closed before any delta: the elapsed time is a (censored) sample.
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats[provider.name].record(first_token_ms if first_token_ms is not None else elapsed_ms, True)
+        return on_done
+
+    async def _attempt(self, provider: LLMProvider, model: str, messages: list, params: dict, tokens: int) -> str:
+        await self._acquire(provider, model, tokens)
+        stats = self.stats[provider.name]
+        started = time.perf_counter()
+        try:
+            self.calls += 1
+            text = await provider.complete(model, messages, **params)
+        except asyncio.CancelledError:
+            # Lost a hedge race: the elapsed time is still a (censored)
+            # sample, so a provider that is always outrun drops in rank.
+            stats.record((time.perf_counter() - started) * 1000, True)
+            raise
+        except Exception as exc:
+            self._note_failure(provider, exc)
+            raise
+        finally:
+            self._sems[provider.name].release()
+        stats.record((time.perf_counter() - started) * 1000, True)
+        return text
+
+    async def _race(self, model: str, messages: list, params: dict, tokens: int) -> str:
+        queue = self.ranked()
+        primary = queue[0]
+        pending: Dict[asyncio.Task, LLMProvider] = {}
+        can_hedge = len(queue) > 1
+        last_exc: Optional[BaseException] = None
+
+        def launch():
+            provider = queue.pop(0)
+            pending[asyncio.ensure_future(self._attempt(provider, model, messages, params, tokens))] = provider
+
+        launch()
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if can_hedge and queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    can_hedge = False
+                    # Hedging into a saturated provider would only add load.
+                    if not self._sems[queue[0].name].locked():
+                        self.hedges += 1
+                        launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if provider is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_exc = task.exception()
+                if not pending and queue:
+                    self.failovers += 1
+                    launch()
+            raise last_exc
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Backoff before the next attempt, or None if ``exc`` is not retryable."""
+        if not any(p.is_retryable(exc) for p in self.providers):
+            return None
+        hinted = next((d for d in (p.retry_after(exc) for p in self.providers) if d is not None), None)
+        if hinted is not None:
+            return min(hinted, LLM_RETRY_MAX_SECONDS)
+        return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+    async def _with_retries(self, model: str, messages: list, params: dict, tokens: int) -> str:
+        attempt = 0
+        while True:
+            try:
+                return await self._race(model, messages, params, tokens)
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt) if attempt < LLM_MAX_RETRIES else None
+                if delay is None:
+                    self.failures += 1
+                    raise
+                attempt += 1
+                self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def complete(self, *, model: str, messages: list, coalesce: bool = True, **params: Any) -> str:
+        """Non-streaming chat completion; returns the reply text."""
+        self._require()
+        tokens = estimate_tokens(messages, params.get("max_tokens"))
+        if not coalesce:
+            return await self._with_retries(model, messages, params, tokens)
+
+        key = hashlib.sha1(orjson.dumps(
+            {"model": model, "messages": messages, "params": params}, option=orjson.OPT_SORT_KEYS
+        )).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._with_retries(model, messages, params, tokens))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller disconnecting must not cancel the shared call.
+        return await asyncio.shield(task)
+
+    async def open_stream(self, *, model: str, messages: list, **params: Any) -> _GatewayStream:
+        """
+        Open a streaming completion on the best provider that accepts it.  The
+        concurrency slot is held until the stream is exhausted or closed.
+        """
+        self._require()
+        tokens = estimate_tokens(messages, params.get("max_tokens"))
+        attempt = 0
+        while True:
+            for index, provider in enumerate(self.ranked()):
+                if index:
+                    self.failovers += 1
+                await self._acquire(provider, model, tokens)
+                started = time.perf_counter()
+                try:
+                    self.calls += 1
+                    deltas = await provider.open_stream(model, messages, **params)
+                    return _GatewayStream(
+                        deltas, self._sems[provider.name].release, started, self._stream_done(provider, started)
+                    )
+                except Exception as exc:
+                    self._sems[provider.name].release()
+                    self._note_failure(provider, exc)
+                    last_exc = exc
+                except BaseException:
+                    self._sems[provider.name].release()
+                    raise
+            delay = self._retry_delay(last_exc, attempt) if attempt < LLM_MAX_RETRIES else None
+            if delay is None:
+                self.failures += 1
+                raise last_exc
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> dict:
+        samples = sorted(self._queue_ms)
+
+        def pct(p):
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)], 1) if samples else None
+
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "queue_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "samples": len(samples)},
+            "routing": [p.name for p in self.ranked()],
+            "providers": {
+                p.name: {
+                    **self.stats[p.name].snapshot(),
+                    "in_flight": self._max_concurrency - self._sems[p.name]._value,
+                    "rpm": p.rpm,
+                    "tpm": p.tpm,
+                }
+                for p in self.providers
+            },
+            "concurrency": self._max_concurrency,
+        }
+
+
+llm_gateway = LLMGateway(configured_providers())
@@ -0,0 +1,110 @@
+"""
+SDK-backed LLM providers (see ai_assistant/llm_providers.py):
+
+  • OpenAICompatProvider – Groq, or any OpenAI-compatible server such as
+                           pythonutil/stub_llm_server.py (AsyncGroq client)
+  • GeminiProvider       – Google Gemini via google.genai
+
+Imported by configured_providers() only for providers that are enabled.
+"""
+
+from typing import AsyncIterator, Dict, Optional
+
+import groq
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+from groq import AsyncGroq
+
+from ai_assistant.llm_providers import LLMProvider
+
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class OpenAICompatProvider(LLMProvider):
+    """Groq, or the local stub server (same wire format, different base URL)."""
+
+    _retryable = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError, groq.APITimeoutError)
+
+    def __init__(self, name: str, client: AsyncGroq, rpm: int, tpm: int):
+        self.name = name
+        self.client = client
+        self.rpm = rpm
+        self.tpm = tpm
+
+    async def complete(self, model: str, messages: list, **params) -> str:
+        response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content or ""
+
+    async def open_stream(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+
+        async def deltas():
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+        return deltas()
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return isinstance(exc, self._retryable)
+
+    def is_rate_limit(self, exc: Exception) -> bool:
+        return isinstance(exc, groq.RateLimitError)
+
+    def retry_after(self, exc: Exception) -> Optional[float]:
+        response = getattr(exc, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, client: genai.Client, model_map: Dict[str, str], default_model: str, rpm: int, tpm: int):
+        self.client = client
+        self.model_map = model_map
+        self.default_model = default_model
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def _request(self, model: str, messages: list, params: dict) -> dict:
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = [
+            {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+            for m in messages if m["role"] != "system"
+        ]
+        json_mode = (params.get("response_format") or {}).get("type") == "json_object"
+        config = genai_types.GenerateContentConfig(
+            system_instruction=system or None,
+            temperature=params.get("temperature"),
+            max_output_tokens=params.get("max_tokens"),
+            response_mime_type="application/json" if json_mode else None,
+        )
+        return {"model": self.model_map.get(model, self.default_model), "contents": contents, "config": config}
+
+    async def complete(self, model: str, messages: list, **params) -> str:
+        response = await self.client.aio.models.generate_content(**self._request(model, messages, params))
+        return response.text or ""
+
+    async def open_stream(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(**self._request(model, messages, params))
+
+        async def deltas():
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+
+        return deltas()
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return isinstance(exc, genai_errors.APIError) and exc.code in _RETRYABLE_STATUS
+
+    def is_rate_limit(self, exc: Exception) -> bool:
+        return isinstance(exc, genai_errors.APIError) and exc.code == 429
@@ -0,0 +1,141 @@
+"""
+LLM providers behind the gateway (ai_assistant/llm_gateway.py).
+
+A provider turns OpenAI-style ``messages`` into reply text, either in one
+piece (``complete``) or as a stream of text deltas (``open_stream``), and
+classifies its own errors for the gateway's failover and retry logic.
+
+  • OpenAICompatProvider – Groq, or any OpenAI-compatible server such as
+                           pythonutil/stub_llm_server.py (AsyncGroq client)
+  • GeminiProvider       – Google Gemini via google.genai
+
+Both live in ai_assistant/llm_provider_clients.py, which is imported only
+when one of them is configured, so the gateway loads without the SDKs.
+
+Callers keep passing Groq model names; other providers map them to their
+own models.  ``ProviderStats`` keeps the rolling latency/error window the
+gateway ranks providers by.
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", 100))
+LLM_STATS_MAX_AGE_SECONDS = int(os.getenv("LLM_STATS_MAX_AGE_SECONDS", 300))
+LLM_STATS_MIN_SAMPLES = int(os.getenv("LLM_STATS_MIN_SAMPLES", 5))
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", 0.5))
+
+
+class ProviderStats:
+    """Rolling window of (time, latency ms, ok) samples for one provider."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW, max_age: float = LLM_STATS_MAX_AGE_SECONDS):
+        self.samples: deque = deque(maxlen=window)
+        self.max_age = max_age
+        self.cooldown_until = 0.0
+
+    def record(self, latency_ms: Optional[float], ok: bool):
+        self.samples.append((time.monotonic(), latency_ms, ok))
+
+    def cool_down(self, seconds: float):
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def _recent(self) -> List[Tuple[float, Optional[float], bool]]:
+        cutoff = time.monotonic() - self.max_age
+        return [s for s in self.samples if s[0] >= cutoff]
+
+    def p95_ms(self) -> Optional[float]:
+        latencies = sorted(lat for _, lat, ok in self._recent() if ok and lat is not None)
+        if len(latencies) < LLM_STATS_MIN_SAMPLES:
+            return None
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        return sum(1 for _, _, ok in recent if not ok) / len(recent) if recent else 0.0
+
+    def healthy(self) -> bool:
+        if time.monotonic() < self.cooldown_until:
+            return False
+        recent = self._recent()
+        if len(recent) < LLM_STATS_MIN_SAMPLES:
+            return True
+        return self.error_rate() <= LLM_MAX_ERROR_RATE
+
+    def snapshot(self) -> dict:
+        p95 = self.p95_ms()
+        return {
+            "healthy": self.healthy(),
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate(), 3),
+            "samples": len(self._recent()),
+        }
+
+
+class LLMProvider(ABC):
+    name = "provider"
+    rpm = 30
+    tpm = 6000
+
+    @abstractmethod
+    async def complete(self, model: str, messages: list, **params) -> str:
+        ...
+
+    @abstractmethod
+    async def open_stream(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        """Open the stream (errors surface here) and return an iterator of text deltas."""
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return False
+
+    def is_rate_limit(self, exc: Exception) -> bool:
+        return False
+
+    def retry_after(self, exc: Exception) -> Optional[float]:
+        return None
+
+
+def configured_providers() -> List[LLMProvider]:
+    """
+    Providers with credentials, in LLM_PROVIDERS order (default
+    "groq,gemini,stub").  The order only breaks ties: the gateway routes by
+    measured latency and health.
+    """
+    order = [n.strip() for n in os.getenv("LLM_PROVIDERS", "groq,gemini,stub").split(",") if n.strip()]
+    groq_key = os.getenv("GROQ_API_KEY", "")
+    gemini_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    stub_url = os.getenv("LLM_STUB_BASE_URL")
+    enabled = {"groq": groq_key, "gemini": gemini_key, "stub": stub_url}
+    if not any(enabled.get(n) for n in order):
+        return []
+
+    from ai_assistant.llm_provider_clients import AsyncGroq, GeminiProvider, OpenAICompatProvider, genai
+
+    available: Dict[str, LLMProvider] = {}
+    if groq_key:
+        available["groq"] = OpenAICompatProvider(
+            "groq",
+            AsyncGroq(api_key=groq_key, base_url=os.getenv("GROQ_BASE_URL") or None),
+            rpm=int(os.getenv("LLM_RPM", 30)),
+            tpm=int(os.getenv("LLM_TPM", 6000)),
+        )
+
+    if gemini_key:
+        gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+        available["gemini"] = GeminiProvider(
+            genai.Client(api_key=gemini_key),
+            {"llama-3.1-8b-instant": os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")},
+            default_model=gemini_model,
+            rpm=int(os.getenv("GEMINI_RPM", 15)),
+            tpm=int(os.getenv("GEMINI_TPM", 1_000_000)),
+        )
+
+    if stub_url:
+        available["stub"] = OpenAICompatProvider(
+            "stub", AsyncGroq(api_key="stub", base_url=stub_url), rpm=6000, tpm=10_000_000
+        )
+
+    return [available[n] for n in order if n in available]
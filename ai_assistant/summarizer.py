@@ -0,0 +1,116 @@
+"""
+Rolling conversation summaries for the support chatbot.
+
+Each ai_chat_sessions document may carry
+
+    summary        running summary of everything up to summary_upto
+    summary_upto   timestamp of the newest message folded into the summary
+    history_epoch  bumped by every history clear
+
+The prompt is the summary plus the messages newer than ``summary_upto``.
+After a turn is saved, ``schedule`` checks (off the request path) whether
+those unsummarised messages exceed AI_HISTORY_TOKEN_BUDGET; if so all but
+the last AI_SUMMARY_KEEP_MESSAGES are folded into the summary by one small
+LLM call.  The update is conditional on ``summary_upto`` so two workers
+cannot overwrite each other's summary, and on ``history_epoch`` so a
+summary of history cleared during the LLM call is dropped.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+from db.db import get_db
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", 1200))
+SUMMARY_KEEP_MESSAGES = int(os.getenv("AI_SUMMARY_KEEP_MESSAGES", 6))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("AI_SUMMARY_MAX_CONCURRENCY", 2))
+
+SUMMARY_PROMPT = """You maintain a running summary of a support chat between a GR Radio app user and its support assistant.
+Merge the previous summary and the new messages into one updated summary of at most 120 words.
+Keep: the user's device/platform, problems reported, steps already tried, answers given, and open questions.
+Drop greetings and small talk. Write plain text in the third person."""
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    # ~4 characters per token plus per-message overhead; no tokenizer needed.
+    return sum(len(m.get("content", "")) // 4 + 4 for m in messages)
+
+
+def unsummarized(messages: list[dict], summary_upto: Optional[str]) -> list[dict]:
+    if not summary_upto:
+        return messages
+    return [m for m in messages if (m.get("timestamp") or "") > summary_upto]
+
+
+class ConversationSummarizer:
+    def __init__(self, collection: str, complete: Callable[[list[dict]], Awaitable[str]]):
+        self.collection = collection
+        self._complete = complete
+        self._running: set = set()
+        self._tasks: set = set()
+        self._sem = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+        self.runs = 0
+        self.failures = 0
+
+    def schedule(self, device_id: str, history_limit: int):
+        """Fire-and-forget summary check for one session."""
+        if device_id in self._running:
+            return
+        self._running.add(device_id)
+        task = asyncio.create_task(self._run(device_id, history_limit))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, device_id: str, history_limit: int):
+        try:
+            async with self._sem:
+                await self.summarize_if_needed(device_id, history_limit)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Chat summary failed for {device_id}: {e}")
+        finally:
+            self._running.discard(device_id)
+
+    async def summarize_if_needed(self, device_id: str, history_limit: int) -> bool:
+        db = get_db()
+        if db is None:
+            return False
+        session = await db[self.collection].find_one(
+            {"device_id": device_id},
+            {"_id": 0, "summary": 1, "summary_upto": 1, "history_epoch": 1, "messages": {"$slice": -history_limit}},
+        )
+        if not session:
+            return False
+
+        summary_upto = session.get("summary_upto")
+        pending = unsummarized(session.get("messages", []), summary_upto)
+        if estimate_tokens(pending) <= HISTORY_TOKEN_BUDGET or len(pending) <= SUMMARY_KEEP_MESSAGES:
+            return False
+
+        # Fold whole turns: both messages of a turn share one timestamp.
+        new_upto = pending[-SUMMARY_KEEP_MESSAGES - 1].get("timestamp")
+        if not new_upto:
+            return False
+        to_fold = [m for m in pending if (m.get("timestamp") or "") <= new_upto]
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in to_fold)
+        previous = session.get("summary") or "(none)"
+        summary = await self._complete([
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Previous summary:\n{previous}\n\nNew messages:\n{transcript}"},
+        ])
+        if not summary:
+            return False
+
+        result = await db[self.collection].update_one(
+            {"device_id": device_id, "summary_upto": summary_upto, "history_epoch": session.get("history_epoch")},
+            {"$set": {"summary": summary.strip(), "summary_upto": new_upto}},
+        )
+        self.runs += 1
+        return result.modified_count == 1
+
+    async def drain(self):
+        """Wait for in-flight summaries (shutdown)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
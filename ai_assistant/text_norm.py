@@ -0,0 +1,27 @@
+"""Text normalisation shared by the answer cache and the help index."""
+
+import re
+import unicodedata
+from typing import List
+
+# Function words carry no intent ("how do i…" vs "how can i…").
+STOPWORDS = frozenset("""
+    a an the and or but if of to in on at for from with by about into is are was were be been am
+    do does did i me my we you your it its this that these those can could would should will
+    how what why when where which who please hi hello hey there just get got so
+""".split())
+
+_NON_WORD = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def content_words(normalized: str) -> List[str]:
+    """Non-stopwords of already normalised text (all words if none remain)."""
+    words = normalized.split()
+    return [w for w in words if w not in STOPWORDS] or words
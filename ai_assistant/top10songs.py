@@ -1,19 +1,20 @@
 import os
 import json
-from typing import List
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Union
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from groq import Groq
-from db.redis_config import (r_async, CACHE_TTL, CACHE_KEY_FIRST_PAGE)
+import requests
+from db.redis_config import r_async
 import swiftclient
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-# Import your DB connection function
-from db.db import get_pg_conn
+from ai_assistant.top_songs_snapshots import LANGUAGE_CATALOGS, is_stale, read_snapshot, schedule_refresh
 
 load_dotenv()
 
@@ -21,13 +22,28 @@ router = APIRouter(prefix="/api/v1/ai", tags=["AI Assistant"])
 
 
 # --- Configurations ---
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY", ""))
 BLOMP_PASS = os.getenv("BLOMP_PASS", "your_blomp_password")
+BLOMP_AUTH_URL = "https://authenticate.blomp.com/v3"
 
 
 redis_client = r_async
-# Cache tokens and AI responses for 12 Hours
 CACHE_TTL_SECONDS = 43200
+# Blomp tokens are cached until this long before they expire…
+BLOMP_TOKEN_MARGIN_SECONDS = int(os.getenv("BLOMP_TOKEN_MARGIN_SECONDS", 300))
+# …or for this long when Keystone does not report the expiry (its default
+# token lifetime is one hour).
+BLOMP_TOKEN_FALLBACK_TTL = int(os.getenv("BLOMP_TOKEN_FALLBACK_TTL", 3000))
+# How long another worker may hold the "I'm loading this key" lock.
+SINGLE_FLIGHT_LOCK_SECONDS = 30
+
+# Delete the lock only if it still holds our token: after
+# SINGLE_FLIGHT_LOCK_SECONDS it may belong to another worker.
+_UNLOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
 
 # --- Models ---
@@ -38,191 +54,209 @@ class AISongResponse(BaseModel):
     auth_token: str  # Added so Flutter can authenticate the stream
 
 
-# --- Helpers ---
-def get_blomp_auth_data(email: str) -> dict:
-    """
-    Authenticates with Blomp and returns the storage_url and token.
-    Caches the token in Redis for 12 hours to avoid spamming the Auth API.
-    """
-    if not email:
-        return {}
+# --- Single-flight Redis cache ---
+_inflight: Dict[str, asyncio.Task] = {}
 
-    cache_key = f"blomp_auth:{email}"
 
-    # 1. Check if we already have a valid token for this email
+async def _cache_get(key: str):
     try:
-        cached = redis_client.get(cache_key)
-        if cached:
-            return json.loads(cached)
+        cached = await redis_client.get(key)
+        return json.loads(cached) if cached else None
     except Exception as e:
-        print(f"Redis Auth Read Error: {e}")
-
-    # 2. Fetch new token from Blomp
-    try:
-        swift_conn = swiftclient.Connection(
-            authurl="https://authenticate.blomp.com/v3",
-            user=email,
-            key=BLOMP_PASS,
-            os_options={
-                'project_name': 'storage',
-                'user_domain_name': 'Default',
-                'project_domain_name': 'Default',
-                'endpoint_type': 'publicURL'
-            },
-            auth_version="3",
-            insecure=True
-        )
-        storage_url, token = swift_conn.get_auth()
-        swift_conn.close()
+        print(f"Redis Read Error ({key}): {e}")
+        return None
 
-        auth_data = {"storage_url": storage_url, "token": token}
 
-        # 3. Cache it for 12 hours
-        try:
-            redis_client.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(auth_data))
-        except Exception as e:
-            print(f"Redis Auth Write Error: {e}")
+async def _cache_set(key: str, value, ttl: int):
+    try:
+        await redis_client.setex(key, ttl, json.dumps(value))
+    except Exception as e:
+        print(f"Redis Write Error ({key}): {e}")
 
-        return auth_data
 
+async def _load_once(key: str, loader: Callable[[], Awaitable], ttl: Union[int, Callable[[Any], int]]):
+    lock_key = f"lock:{key}"
+    lock_token = uuid.uuid4().hex
+    try:
+        locked = await redis_client.set(lock_key, lock_token, nx=True, ex=SINGLE_FLIGHT_LOCK_SECONDS)
     except Exception as e:
-        print(f"Blomp Auth Error for {email}: {e}")
-        return {}
+        print(f"Redis Lock Error ({key}): {e}")
+        locked = True
+
+    if not locked:
+        # Another worker is loading this key: wait for its result rather
+        # than repeating the load.  If it gives up, load it here.
+        deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+            cached = await _cache_get(key)
+            if cached is not None:
+                return cached
+            try:
+                if not await redis_client.exists(lock_key):
+                    break
+            except Exception:
+                break
+
+    try:
+        value = await loader()
+        if value:
+            await _cache_set(key, value, ttl(value) if callable(ttl) else ttl)
+        return value
+    finally:
+        if locked:
+            try:
+                await redis_client.eval(_UNLOCK_SCRIPT, 1, lock_key, lock_token)
+            except Exception as e:
+                print(f"Redis Unlock Error ({key}): {e}")
 
 
-def get_ai_song_recommendations(language: str) -> List[dict]:
-    prompt = f"""
-    You are a music expert. Provide a list of the 15 most popular {language} songs.
-    Return ONLY a valid JSON array of objects. Do not include markdown formatting or backticks.
-    Each object must have exactly two keys: "song_name" and "album_name".
+async def cached_single_flight(
+        key: str,
+        loader: Callable[[], Awaitable],
+        ttl: Union[int, Callable[[Any], int]] = CACHE_TTL_SECONDS,
+):
+    """
+    Return the Redis-cached value for ``key``, loading it with ``loader()`` on
+    a miss.  Concurrent misses in this worker share one loader call, and
+    other workers wait on a short Redis lock.  Empty results are not cached.
+    ``ttl`` may be a function of the loaded value.
     """
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_once(key, loader, ttl))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield: one caller disconnecting must not cancel the shared load.
+    return await asyncio.shield(task)
+
+
+# --- Helpers ---
+def _blomp_token_expiry(token: str) -> str:
+    """Keystone's expires_at for ``token`` (ISO-8601), or "" if unavailable."""
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            response_format={"type": "json_object"}
+        resp = requests.get(
+            f"{BLOMP_AUTH_URL}/auth/tokens",
+            headers={"X-Auth-Token": token, "X-Subject-Token": token},
+            params={"nocatalog": ""},
+            verify=False,
+            timeout=10,
         )
+        resp.raise_for_status()
+        return resp.json()["token"]["expires_at"]
+    except Exception as e:
+        print(f"⚠️ Blomp token expiry lookup failed: {e}")
+        return ""
+
+
+def _blomp_authenticate(email: str) -> dict:
+    """Blocking Swift/Keystone auth; run in a worker thread."""
+    swift_conn = swiftclient.Connection(
+        authurl=BLOMP_AUTH_URL,
+        user=email,
+        key=BLOMP_PASS,
+        os_options={
+            'project_name': 'storage',
+            'user_domain_name': 'Default',
+            'project_domain_name': 'Default',
+            'endpoint_type': 'publicURL'
+        },
+        auth_version="3",
+        insecure=True
+    )
+    try:
+        storage_url, token = swift_conn.get_auth()
+    finally:
+        swift_conn.close()
+    return {"storage_url": storage_url, "token": token, "expires_at": _blomp_token_expiry(token)}
 
-        raw_text = chat_completion.choices[0].message.content.strip()
-        data = json.loads(raw_text)
 
-        if isinstance(data, list):
-            return data
+def _blomp_auth_ttl(auth_data: dict) -> int:
+    """Cache a token until BLOMP_TOKEN_MARGIN_SECONDS before it expires."""
+    try:
+        expires_at = datetime.fromisoformat(auth_data["expires_at"].replace("Z", "+00:00"))
+    except (KeyError, ValueError):
+        return BLOMP_TOKEN_FALLBACK_TTL
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    return max(int(remaining) - BLOMP_TOKEN_MARGIN_SECONDS, 1)
 
-        if isinstance(data, dict):
-            for key in data.keys():
-                if isinstance(data[key], list):
-                    return data[key]
-        return []
-    except Exception as e:
-        print(f"AI Generation Error: {e}")
-        return []
+
+async def get_blomp_auth_data(email: str) -> dict:
+    """
+    Returns the Blomp storage_url and token for ``email``.
+    Cached in Redis until shortly before the token expires so we don't
+    spam the Auth API.
+    """
+    if not email:
+        return {}
+
+    async def load():
+        try:
+            return await asyncio.to_thread(_blomp_authenticate, email)
+        except Exception as e:
+            print(f"Blomp Auth Error for {email}: {e}")
+            return {}
+
+    # v2: entries cached before expiry tracking lived for a fixed 12 hours.
+    return await cached_single_flight(f"blomp_auth:v2:{email}", load, _blomp_auth_ttl)
 
 
 # --- Endpoint ---
 @router.get("/top-songs", response_model=List[AISongResponse])
-def get_ai_top_songs(
+async def get_ai_top_songs(
+        response: Response,
         language: str = Query("hindi", description="Language of the songs"),
         quality: str = Query("128kbps", pattern="^(original|128kbps|320kbps)$", description="Audio quality")
 ):
-    if language.lower() != "hindi":
-        raise HTTPException(status_code=400, detail="Currently only 'hindi' language is supported.")
-
-    cache_key = f"top_songs:{language.lower()}:{quality.lower()}"
-
-    # 1. Check Redis Cache First
-    try:
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            print("Returning AI songs from 12-hour Redis cache.")
-            return json.loads(cached_data)
-    except Exception as e:
-        print(f"Redis Read Error: {e}")
-
-    # 2. Cache Miss: Get AI Recommendations
-    ai_recommendations = get_ai_song_recommendations(language)
-    if not ai_recommendations:
-        raise HTTPException(status_code=500, detail="Failed to generate song list from AI.")
+    """
+    Serves the precomputed snapshot (ai_assistant/top_songs_snapshots.py);
+    requests never wait on the LLM.  A stale snapshot is served while a
+    refresh runs in the background.
+    """
+    language = language.lower()
+    quality = quality.lower()
+    if language not in LANGUAGE_CATALOGS:
+        supported = ", ".join(f"'{lang}'" for lang in LANGUAGE_CATALOGS)
+        raise HTTPException(status_code=400, detail=f"Supported languages: {supported}.")
+
+    snapshot = await read_snapshot(language, quality)
+    if snapshot is None:
+        schedule_refresh(language)
+        raise HTTPException(
+            status_code=503,
+            detail="Top songs are being prepared. Please try again shortly.",
+            headers={"Retry-After": "60"},
+        )
+    if is_stale(snapshot):
+        schedule_refresh(language)
+    if not snapshot["songs"]:
+        raise HTTPException(status_code=404, detail="AI suggested songs, but none were found in the database.")
 
-    # 3. Map Quality
-    quality_columns = {
-        "original": "blomp_path_original",
-        "128kbps": "blomp_path_128kbps",
-        "320kbps": "blomp_path_320kbps",
-    }
-    path_col = quality_columns[quality]
+    # One auth lookup per Blomp account, in parallel
+    emails = list({song["blomp_email"] for song in snapshot["songs"] if song.get("blomp_email")})
+    auth_by_email = dict(zip(emails, await asyncio.gather(*(get_blomp_auth_data(e) for e in emails))))
 
     matched_songs = []
-
-    # 4. Check DB for matches & Get User Email
-    conn = get_pg_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed.")
-
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            for ai_song in ai_recommendations:
-                search_song = f"%{ai_song.get('song_name', '')}%"
-                search_album = f"%{ai_song.get('album_name', '')}%"
-
-                query = f"""
-                    SELECT 
-                        s.song_name, 
-                        a.album_name, 
-                        s.{path_col} AS blomp_path, 
-                        uma.email AS blomp_user_email
-                    FROM public.hindiflacs_songs s
-                    JOIN public.hindiflacs_albums_list a ON s.album_id = a.id
-                    LEFT JOIN public.user_mail_accounts uma ON s.blomp_user_id = uma.id
-                    WHERE s.song_name ILIKE %s AND a.album_name ILIKE %s
-                    AND s.{path_col} IS NOT NULL
-                    LIMIT 1;
-                """
-
-                cur.execute(query, (search_song, search_album))
-                row = cur.fetchone()
-
-                if row:
-                    blomp_email = row.get('blomp_user_email') or os.environ.get("BLOMP_USER")
-
-                    # Fetch Cached Auth Data (Storage URL + Token)
-                    auth_data = get_blomp_auth_data(blomp_email)
-
-                    if auth_data:
-                        # Construct the direct OpenStack Swift URL
-                        object_path = row['blomp_path']
-                        if not object_path.startswith("hindiflacs_songs/"):
-                            object_path = f"hindiflacs_songs/{object_path}"
-
-                        blomp_url = f"{auth_data['storage_url']}/{blomp_email}/{object_path}"
-
-                        matched_songs.append(
-                            AISongResponse(
-                                song_name=row['song_name'],
-                                album_name=row['album_name'],
-                                blomp_url=blomp_url,
-                                auth_token=auth_data['token']  # Give the token to Flutter
-                            )
-                        )
-
-                if len(matched_songs) >= 10:
-                    break
-    except Exception as e:
-        print(f"DB Error: {e}")
-        raise HTTPException(status_code=500, detail="Error querying the database.")
-    finally:
-        conn.close()
+    for song in snapshot["songs"]:
+        auth_data = auth_by_email.get(song.get("blomp_email"))
+        if not auth_data:
+            continue
+        matched_songs.append(
+            AISongResponse(
+                song_name=song["song_name"],
+                album_name=song["album_name"],
+                # Construct the direct OpenStack Swift URL
+                blomp_url=f"{auth_data['storage_url']}/{song['blomp_email']}/{song['object_path']}",
+                auth_token=auth_data['token']  # Give the token to Flutter
+            )
+        )
 
     if not matched_songs:
-        raise HTTPException(status_code=404, detail="AI suggested songs, but none were found in the database.")
-
-    # 5. Save to Redis
-    try:
-        result_list = [s.model_dump() if hasattr(s, 'model_dump') else s.dict() for s in matched_songs]
-        redis_client.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(result_list))
-        print("Stored new AI songs in Redis cache for 12 hours.")
-    except Exception as e:
-        print(f"Redis Write Error: {e}")
+        raise HTTPException(status_code=503, detail="Song storage is temporarily unavailable. Please try again later.")
 
-    return matched_songs
\ No newline at end of file
+    response.headers["X-Generated-At"] = snapshot["generated_at"]
+    return matched_songs
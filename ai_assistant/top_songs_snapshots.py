@@ -0,0 +1,229 @@
+"""
+Precomputed AI top-songs snapshots, one per (language, quality).
+
+A background job asks the LLM for each language's popular songs, matches
+them against that language's catalog (ai_assistant/catalog_match.py), and
+stores the ten best matches in Redis under ``top_songs:snapshot:<language>:<quality>``:
+
+    {"generated_at": "<ISO-8601 UTC>", "songs": [
+        {"song_name", "album_name", "blomp_email", "object_path"}, ...]}
+
+Snapshots hold storage locations, not Blomp tokens; the endpoint attaches
+current tokens when serving.  A snapshot is fresh for
+TOP_SONGS_REFRESH_SECONDS (one day).  Older snapshots are still served
+(stale-while-revalidate) until SNAPSHOT_TTL_SECONDS, while a refresh runs
+in the background.
+
+Each refresh attempt claims ``top_songs:refresh_attempt:<language>`` with
+SET NX, so only one worker refreshes a language at a time and attempts
+are throttled: a failed LLM call is retried after TOP_SONGS_RETRY_SECONDS,
+a completed one is not repeated for TOP_SONGS_REFRESH_SECONDS even if
+some quality had no matches (its previous snapshot is kept).
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from db.db import get_pg_pool
+from db.redis_config import r_async
+from ai_assistant.llm_gateway import llm_gateway
+from ai_assistant.catalog_match import HINDIFLACS, TELUGUWAP, QUALITY_COLUMNS, match_suggestions
+
+# telugump3's ``songs`` table has no Blomp paths, so Telugu is served from
+# teluguwap only.
+LANGUAGE_CATALOGS = {
+    "hindi": HINDIFLACS,
+    "telugu": TELUGUWAP,
+}
+TOP_SONGS_LIMIT = 10
+TOP_SONGS_REFRESH_SECONDS = int(os.getenv("TOP_SONGS_REFRESH_SECONDS", 24 * 3600))
+TOP_SONGS_CHECK_SECONDS = int(os.getenv("TOP_SONGS_CHECK_SECONDS", 900))
+SNAPSHOT_TTL_SECONDS = int(os.getenv("TOP_SONGS_SNAPSHOT_TTL_SECONDS", 7 * 24 * 3600))
+TOP_SONGS_RETRY_SECONDS = int(os.getenv("TOP_SONGS_RETRY_SECONDS", 1800))
+
+_task: Optional[asyncio.Task] = None
+_revalidating: set = set()
+_revalidate_tasks: set = set()
+
+
+def snapshot_key(language: str, quality: str) -> str:
+    return f"top_songs:snapshot:{language}:{quality}"
+
+
+def attempt_key(language: str) -> str:
+    return f"top_songs:refresh_attempt:{language}"
+
+
+def snapshot_age(snapshot: dict) -> float:
+    generated_at = datetime.fromisoformat(snapshot["generated_at"])
+    return (datetime.now(timezone.utc) - generated_at).total_seconds()
+
+
+def is_stale(snapshot: dict) -> bool:
+    return snapshot_age(snapshot) > TOP_SONGS_REFRESH_SECONDS
+
+
+async def read_snapshot(language: str, quality: str) -> Optional[dict]:
+    try:
+        cached = await r_async.get(snapshot_key(language, quality))
+        return json.loads(cached) if cached else None
+    except Exception as e:
+        print(f"Redis Read Error (top songs snapshot {language}/{quality}): {e}")
+        return None
+
+
+async def get_ai_song_recommendations(language: str) -> List[dict]:
+    prompt = f"""
+    You are a music expert. Provide a list of the 15 most popular {language} songs.
+    Return ONLY a valid JSON array of objects. Do not include markdown formatting or backticks.
+    Each object must have exactly two keys: "song_name" and "album_name".
+    """
+    try:
+        raw_text = await llm_gateway.complete(
+            messages=[{"role": "user", "content": prompt}],
+            model="llama-3.1-8b-instant",
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+
+        data = json.loads(raw_text.strip())
+
+        if isinstance(data, list):
+            return data
+
+        if isinstance(data, dict):
+            for key in data.keys():
+                if isinstance(data[key], list):
+                    return data[key]
+        return []
+    except Exception as e:
+        print(f"AI Generation Error: {e}")
+        return []
+
+
+async def _needs_refresh(language: str) -> bool:
+    for quality in QUALITY_COLUMNS:
+        snapshot = await read_snapshot(language, quality)
+        if snapshot is None or is_stale(snapshot):
+            return True
+    return False
+
+
+async def _claim_attempt(language: str) -> bool:
+    """Marks a refresh attempt of ``language``; False if one is already recorded."""
+    try:
+        return bool(await r_async.set(
+            attempt_key(language), datetime.now(timezone.utc).isoformat(),
+            nx=True, ex=TOP_SONGS_RETRY_SECONDS,
+        ))
+    except Exception as e:
+        print(f"Redis Write Error (top songs attempt {language}): {e}")
+        return False
+
+
+async def refresh_language(language: str, force: bool = False) -> Dict[str, int]:
+    """
+    Regenerate all quality snapshots of ``language``.  Returns songs stored
+    per quality; empty when another attempt is running or recent, the
+    snapshots are already fresh, or the LLM returned nothing.
+    """
+    catalog = LANGUAGE_CATALOGS[language]
+    pool = get_pg_pool()
+    if pool is None:
+        return {}
+
+    if not force and not await _needs_refresh(language):
+        return {}
+    if not await _claim_attempt(language) and not force:
+        return {}
+
+    # The LLM call can take a while (retries, failover); no pool
+    # connection is held for it.
+    suggestions = await get_ai_song_recommendations(language)
+    if not suggestions:
+        print(f"⚠️ Top songs refresh for {language}: LLM returned no songs, keeping previous snapshot.")
+        return {}
+
+    generated_at = datetime.now(timezone.utc).isoformat()
+    stored = {}
+    async with pool.acquire() as conn:
+        for quality in QUALITY_COLUMNS:
+            rows = await match_suggestions(conn, catalog, suggestions, quality)
+            songs = []
+            for row in rows[:TOP_SONGS_LIMIT]:
+                object_path = row["blomp_path"]
+                if not object_path.startswith(catalog.object_prefix):
+                    object_path = f"{catalog.object_prefix}{object_path}"
+                songs.append({
+                    "song_name": row["song_name"],
+                    "album_name": row["album_name"],
+                    "blomp_email": row["blomp_user_email"] or os.environ.get("BLOMP_USER"),
+                    "object_path": object_path,
+                })
+            # Keep an older non-empty snapshot; without one, an empty
+            # snapshot tells the endpoint nothing matched.
+            if not songs and await read_snapshot(language, quality) is not None:
+                print(f"⚠️ Top songs refresh for {language}/{quality}: no catalog matches, keeping previous snapshot.")
+                continue
+            await r_async.setex(
+                snapshot_key(language, quality),
+                SNAPSHOT_TTL_SECONDS,
+                json.dumps({"generated_at": generated_at, "songs": songs}),
+            )
+            stored[quality] = len(songs)
+
+    # A completed generation is not repeated until the next daily refresh,
+    # even if some quality kept an older snapshot.
+    await r_async.set(attempt_key(language), generated_at, ex=TOP_SONGS_REFRESH_SECONDS)
+    return stored
+
+
+async def _revalidate(language: str):
+    try:
+        await refresh_language(language)
+    except Exception as e:
+        print(f"⚠️ Top songs refresh failed for {language}: {e}")
+    finally:
+        _revalidating.discard(language)
+
+
+def schedule_refresh(language: str):
+    """Fire-and-forget refresh of ``language`` (stale or missing snapshot)."""
+    if language in _revalidating:
+        return
+    _revalidating.add(language)
+    task = asyncio.create_task(_revalidate(language))
+    _revalidate_tasks.add(task)
+    task.add_done_callback(_revalidate_tasks.discard)
+
+
+async def _refresh_loop():
+    while True:
+        for language in LANGUAGE_CATALOGS:
+            try:
+                await refresh_language(language)
+            except Exception as e:
+                print(f"⚠️ Top songs refresh failed for {language}: {e}")
+        await asyncio.sleep(TOP_SONGS_CHECK_SECONDS)
+
+
+async def start_top_songs_refresh():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_top_songs_refresh():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    for task in list(_revalidate_tasks):
+        task.cancel()
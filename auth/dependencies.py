@@ -1,20 +1,54 @@
 import jwt
+import time
+from collections import OrderedDict
+from typing import Tuple
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 import os
 
 SECRET_KEY = os.environ.get("ADMIN_SECRET_KEY", "your-super-secret-key-123")
 ALGORITHM = "HS256"
+TOKEN_CACHE_SIZE = int(os.environ.get("ADMIN_TOKEN_CACHE_SIZE", 512))
 
 # This expects the frontend clients to send a header: Authorization: Bearer <token>
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/admin/login")
 
-def verify_admin_token(token: str = Depends(oauth2_scheme)):
+# token -> (username, exp).  Only tokens that fully verified are stored, and an
+# entry is honoured only until the token's own ``exp``, so a hit is equivalent
+# to re-decoding.  LRU order keeps busy admin sessions resident.
+_verified_tokens: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+def _cached_username(token: str):
+    entry = _verified_tokens.get(token)
+    if entry is None:
+        return None
+    username, exp = entry
+    if exp <= time.time():
+        del _verified_tokens[token]
+        raise HTTPException(status_code=401, detail="Token has expired. Please login again.")
+    _verified_tokens.move_to_end(token)
+    return username
+
+def _remember_token(token: str, username: str, exp):
+    if exp is None:
+        return
+    _verified_tokens[token] = (username, float(exp))
+    _verified_tokens.move_to_end(token)
+    while len(_verified_tokens) > TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+
+async def verify_admin_token(token: str = Depends(oauth2_scheme)):
+    # async so it runs on the event loop instead of hopping to the threadpool
+    # like a plain ``def`` dependency would.
+    username = _cached_username(token)
+    if username is not None:
+        return username
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        _remember_token(token, username, payload.get("exp"))
         return username
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired. Please login again.")
@@ -4,6 +4,8 @@ from db.db import get_pg_pool
 from pydantic import BaseModel
 import bcrypt
 import jwt
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import os
 
@@ -13,6 +15,12 @@ router = APIRouter(prefix="/admin", tags=["Admin Auth"])
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 7 days validity for admin
 
+# bcrypt is deliberately slow (~100-300 ms) and releases the GIL, so it runs on
+# a small dedicated pool instead of blocking the event loop.  The pool size
+# bounds how many hashes run at once; extra logins queue behind them.
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", 2))
+_bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
 def verify_password(plain_password: str, hashed_password: str):
     if isinstance(hashed_password, str):
         hashed_password_bytes = hashed_password.encode('utf-8')
@@ -24,6 +32,14 @@ def get_password_hash(password: str):
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
+async def verify_password_async(plain_password: str, hashed_password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, get_password_hash, password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -51,7 +67,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, user_row["password"]):
+    if not await verify_password_async(form_data.password, user_row["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -74,13 +90,15 @@ async def change_admin_password(req: ChangePasswordRequest, username: str = Depe
     async with pool.acquire() as conn:
         user_row = await conn.fetchrow("SELECT username, password FROM admin_users WHERE username = $1", username)
         
-        if not user_row:
-            raise HTTPException(status_code=404, detail="Admin user not found")
-            
-        if not verify_password(req.old_password, user_row["password"]):
-            raise HTTPException(status_code=400, detail="Incorrect original password")
-            
-        new_hashed_pw = get_password_hash(req.new_password)
+    if not user_row:
+        raise HTTPException(status_code=404, detail="Admin user not found")
+        
+    # bcrypt runs without holding a pool connection.
+    if not await verify_password_async(req.old_password, user_row["password"]):
+        raise HTTPException(status_code=400, detail="Incorrect original password")
+        
+    new_hashed_pw = await get_password_hash_async(req.new_password)
+    async with pool.acquire() as conn:
         await conn.execute("UPDATE admin_users SET password = $1 WHERE username = $2", new_hashed_pw, username)
         
     return {"success": True, "message": "Password changed successfully"}
@@ -94,6 +112,6 @@ async def setup_default_admin():
     async with pool.acquire() as conn:
         user_count = await conn.fetchval("SELECT COUNT(*) FROM admin_users")
         if user_count == 0:
-            hashed_pw = get_password_hash("admin123")
+            hashed_pw = await get_password_hash_async("admin123")
             await conn.execute("INSERT INTO admin_users (username, password) VALUES ($1, $2)", "admin", hashed_pw)
             print("NOTICE: Created default admin user: admin / admin123")
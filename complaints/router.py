@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, EmailStr, Field, AliasChoices, ConfigDict
 
 from auth.dependencies import verify_admin_token
 from db.db import get_pg_pool
+from db.pagination import ListFilter, ListSpec, apply_page_headers, fetch_page
+from complaints.search import SEARCH_MAX_LIMIT, SEARCH_MAX_OFFSET, search_complaints
 
 router = APIRouter()
 
@@ -29,13 +31,37 @@ class ComplaintModel(BaseModel):
 class ComplaintReplyBody(BaseModel):
     admin_response: str = Field(..., min_length=1)
 
+COMPLAINTS_LIST = ListSpec(
+    table="cust_feedback_complaints",
+    sorts={"created_at": "created_at", "replied_at": "replied_at", "status": "status"},
+    default_sort="created_at",
+    filters={
+        "status": ListFilter("status"),
+        "device_id": ListFilter("device_id"),
+        "email": ListFilter("email"),
+        "reference_no": ListFilter("reference_no"),
+        "created_from": ListFilter("created_at", "gte"),
+        "created_to": ListFilter("created_at", "lt"),
+    },
+    default_limit=500,
+    max_limit=1000,
+    not_null_sorts=("created_at",),
+)
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at is a naive UTC TIMESTAMP column.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 def _serialize_complaint(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     if not doc:
         return {}
     out = dict(doc)
+    out.pop("search_vector", None)
     for key in ("created_at", "replied_at"):
         val = out.get(key)
         if val is not None and hasattr(val, "isoformat"):
@@ -94,15 +120,61 @@ async def get_complaint_by_reference(reference_no: str):
     "/admin/complaints",
     dependencies=[Depends(verify_admin_token)],
 )
-async def list_complaints_admin(limit: int = 500) -> List[Dict[str, Any]]:
+async def list_complaints_admin(
+    response: Response,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    status: Optional[str] = None,
+    device_id: Optional[str] = None,
+    email: Optional[str] = None,
+    reference_no: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    pool = get_pg_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database connection failed.")
+    try:
+        async with pool.acquire() as conn:
+            page = await fetch_page(
+                conn, COMPLAINTS_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={
+                    "status": status, "device_id": device_id, "email": email,
+                    "reference_no": reference_no,
+                    "created_from": _naive_utc(created_from), "created_to": _naive_utc(created_to),
+                },
+            )
+        apply_page_headers(response, page)
+        return [_serialize_complaint(r) for r in page.items]
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+@router.get(
+    "/admin/complaints/search",
+    dependencies=[Depends(verify_admin_token)],
+)
+async def search_complaints_admin(
+    q: str = Query(..., min_length=1, max_length=200, description='Web-search syntax: words, "phrases", -exclusions, or'),
+    status: Optional[str] = Query(None, pattern="^[PR]$"),
+    device_id: Optional[str] = None,
+    sort: str = Query("relevance", pattern="^(relevance|created_at)$"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+) -> Dict[str, Any]:
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database connection failed.")
     try:
-        actual_limit = min(max(limit, 1), 1000)
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM cust_feedback_complaints ORDER BY created_at DESC LIMIT $1", actual_limit)
-            return [_serialize_complaint(dict(r)) for r in rows]
+            hits, total, capped = await search_complaints(
+                conn, q.strip(), status=status, device_id=(device_id or "").strip() or None,
+                sort=sort, limit=limit, offset=offset,
+            )
+        return {"query": q, "total": total, "total_is_lower_bound": capped, "items": hits}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
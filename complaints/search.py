@@ -0,0 +1,101 @@
+"""
+Full-text search over cust_feedback_complaints.
+
+``search_vector`` is a stored generated tsvector (db/migrations.py) with a
+GIN index:
+
+    A  subject       (english)
+    B  description   (english)
+    C  name, email   (simple – no stemming for identifiers)
+
+Queries use websearch_to_tsquery, so admins can type
+``refund -android "not playing"``.  Only the requested page is ranked
+for snippets: ts_headline runs on at most ``limit`` rows.
+"""
+
+import html
+from typing import Any, Dict, List, Optional, Tuple
+
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_OFFSET = 1000
+# Totals are counted up to this many matches, then reported as a lower bound.
+SEARCH_TOTAL_CAP = 1000
+
+_HL_START = "{{hl}}"
+_HL_STOP = "{{/hl}}"
+_SUBJECT_HEADLINE = f'HighlightAll=true, StartSel="{_HL_START}", StopSel="{_HL_STOP}"'
+_DESCRIPTION_HEADLINE = (
+    f'MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=" … ", '
+    f'StartSel="{_HL_START}", StopSel="{_HL_STOP}"'
+)
+
+_ORDER_BY = {
+    "relevance": "rank DESC, created_at DESC NULLS LAST, id DESC",
+    "created_at": "created_at DESC NULLS LAST, id DESC",
+}
+
+_MATCH_WHERE = """
+    c.search_vector @@ websearch_to_tsquery('english', $1)
+    AND ($2::text IS NULL OR c.status = $2)
+    AND ($3::text IS NULL OR c.device_id = $3)
+"""
+
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    """Escape complaint text, then turn the sentinels into <mark> tags."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_HL_START, "<mark>").replace(_HL_STOP, "</mark>")
+
+
+def _serialize_hit(row) -> Dict[str, Any]:
+    out = dict(row)
+    for key in ("created_at", "replied_at"):
+        val = out.get(key)
+        if val is not None and hasattr(val, "isoformat"):
+            out[key] = val.isoformat()
+    out["rank"] = float(out["rank"])
+    out["subject_snippet"] = _highlight(out.get("subject_snippet"))
+    out["description_snippet"] = _highlight(out.get("description_snippet"))
+    return out
+
+
+async def search_complaints(
+    conn,
+    q: str,
+    *,
+    status: Optional[str] = None,
+    device_id: Optional[str] = None,
+    sort: str = "relevance",
+    limit: int = 20,
+    offset: int = 0,
+) -> Tuple[List[Dict[str, Any]], int, bool]:
+    """Returns (hits, total, total_is_lower_bound)."""
+    order_by = _ORDER_BY[sort]
+    rows = await conn.fetch(f"""
+        WITH hits AS (
+            SELECT c.id, c.reference_no, c.name, c.email, c.contact, c.subject, c.description,
+                   c.status, c.device_id, c.created_at, c.replied_at, c.admin_response,
+                   ts_rank_cd(c.search_vector, websearch_to_tsquery('english', $1)) AS rank
+            FROM cust_feedback_complaints c
+            WHERE {_MATCH_WHERE}
+            ORDER BY {order_by}
+            LIMIT $4 OFFSET $5
+        )
+        SELECT hits.*,
+               ts_headline('english', COALESCE(subject, ''), websearch_to_tsquery('english', $1), $6) AS subject_snippet,
+               ts_headline('english', COALESCE(description, ''), websearch_to_tsquery('english', $1), $7) AS description_snippet
+        FROM hits
+        ORDER BY {order_by}
+    """, q, status, device_id, limit, offset, _SUBJECT_HEADLINE, _DESCRIPTION_HEADLINE)
+
+    total = await conn.fetchval(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM cust_feedback_complaints c
+            WHERE {_MATCH_WHERE}
+            LIMIT {SEARCH_TOTAL_CAP + 1}
+        ) matched
+    """, q, status, device_id)
+
+    capped = total > SEARCH_TOTAL_CAP
+    return [_serialize_hit(r) for r in rows], min(total, SEARCH_TOTAL_CAP), capped
@@ -8,8 +8,10 @@ Analytics API: still returns all four list blocks (for Pydantic / existing clien
 
 from __future__ import annotations
 
+import json as py_json
+import uuid
 from copy import deepcopy
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 LIST_KEYS = ("stations_list", "mp3_list", "downloads_list", "recordings_list")
 
@@ -22,6 +24,16 @@ DISABLED_PLACEMENT: Dict[str, Any] = {
 }
 
 
+# Top-level flags matching ScreenAdsConfig defaults (every ad type off).
+DISABLED_AD_FLAGS: Dict[str, Any] = {
+    "ads_enabled": False,
+    "banner_enabled": False,
+    "interstitial_enabled": False,
+    "interstitial_every_n_taps": 5,
+    "inlist_enabled": False,
+}
+
+
 def _without_id_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(doc)
     out.pop("_id", None)
@@ -41,22 +53,23 @@ def sanitize_ads_document_for_storage(doc: Dict[str, Any]) -> Dict[str, Any]:
     out = _without_id_fields(doc)
     screen: Optional[str] = out.get("screen")
 
-    if screen == "radio":
-        for k in ("mp3_list", "downloads_list", "recordings_list"):
-            out.pop(k, None)
-    elif screen == "player":
-        out.pop("stations_list", None)
-    elif screen == "mp3_download":
-        for k in LIST_KEYS:
-            out.pop(k, None)
-    else:
-        if not screen:
-            for k in LIST_KEYS:
-                out.pop(k, None)
+    for k in disallowed_list_keys(screen):
+        out.pop(k, None)
 
     return out
 
 
+def disallowed_list_keys(screen: Optional[str]) -> Tuple[str, ...]:
+    """List keys that must not be stored for `screen` (see sanitize above)."""
+    if screen == "radio":
+        return ("mp3_list", "downloads_list", "recordings_list")
+    if screen == "player":
+        return ("stations_list",)
+    if screen == "mp3_download" or not screen:
+        return LIST_KEYS
+    return ()
+
+
 def expand_for_analytics_client(screen: str, doc: Dict[str, Any]) -> Dict[str, Any]:
     """
     Build a dict suitable for ScreenAdsConfig: all four list keys present;
@@ -89,8 +102,12 @@ def expand_for_analytics_client(screen: str, doc: Dict[str, Any]) -> Dict[str, A
     return merged
 
 
+def disabled_for_analytics_client(screen: str) -> Dict[str, Any]:
+    """What GET /analytics/ads/{screen} returns while global ads are off."""
+    return expand_for_analytics_client(screen, DISABLED_AD_FLAGS)
+
+
 async def replace_sanitized_ads_doc(pool, oid: str, sanitized: Dict[str, Any]) -> Dict[str, Any]:
-    import json as py_json
     to_store = deepcopy(sanitized)
     screen = to_store.pop("screen", "global")
     
@@ -106,3 +123,52 @@ async def replace_sanitized_ads_doc(pool, oid: str, sanitized: Dict[str, Any]) -
         d = dict(row)
         cdata = py_json.loads(d["ads_data"]) if isinstance(d["ads_data"], str) else (d.get("ads_data") or {})
         return {**cdata, "id": d["id"], "screen": d["screen"]}
+
+
+async def merge_ads_doc_atomic(pool, screen: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Insert or merge `patch` into the ads_config row for `screen` in a single
+    statement (INSERT … ON CONFLICT (screen) DO UPDATE … RETURNING).
+
+    - Scalar keys are merged with ``||``.
+    - List blocks (dict values) are merged field-by-field into the stored block
+      with ``jsonb_set`` so a partial block keeps its sibling fields.
+    - Keys that sanitize_ads_document_for_storage would drop for this screen
+      are stripped from both the patch and the stored document.
+
+    Requires the unique index on ads_config(screen) (see db/migrations.py).
+    """
+    sanitized = sanitize_ads_document_for_storage({**patch, "screen": screen})
+    sanitized.pop("screen", None)
+
+    scalars = {k: v for k, v in sanitized.items() if not isinstance(v, dict)}
+    blocks = {k: v for k, v in sanitized.items() if isinstance(v, dict)}
+    strip_keys: List[str] = ["_id", "id", "screen", *disallowed_list_keys(screen)]
+
+    args: List[Any] = [
+        uuid.uuid4().hex[:24],
+        screen,
+        py_json.dumps(sanitized),
+        strip_keys,
+        py_json.dumps(scalars),
+    ]
+    merged_expr = "((COALESCE(ads_config.ads_data, '{}'::jsonb) - $4::text[]) || $5::jsonb)"
+    for key, block in blocks.items():
+        args.extend([key, py_json.dumps(block)])
+        key_ref, block_ref = len(args) - 1, len(args)
+        merged_expr = (
+            f"jsonb_set({merged_expr}, ARRAY[${key_ref}::text], "
+            f"COALESCE(ads_config.ads_data -> ${key_ref}::text, '{{}}'::jsonb) || ${block_ref}::jsonb)"
+        )
+
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(f"""
+            INSERT INTO ads_config (id, screen, ads_data)
+            VALUES ($1, $2, $3::jsonb)
+            ON CONFLICT (screen) DO UPDATE SET ads_data = {merged_expr}
+            RETURNING id, screen, ads_data
+        """, *args)
+
+    d = dict(row)
+    cdata = py_json.loads(d["ads_data"]) if isinstance(d["ads_data"], str) else (d.get("ads_data") or {})
+    return {**cdata, "id": d["id"], "screen": d["screen"]}
@@ -1,8 +1,10 @@
 import uuid
 import json as py_json
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+import asyncpg
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import Dict, Any, Optional
 from db.db import get_pg_pool
+from db.pagination import ListFilter, ListSpec, apply_page_headers, fetch_page
 from auth.dependencies import verify_admin_token
 from config.ads_config_normalize import (
     sanitize_ads_document_for_storage,
@@ -12,6 +14,15 @@ from stations.analytics_router import invalidate_ads_config_cache
 
 router = APIRouter(prefix="/ads-config", tags=["Ads Config"])
 
+ADS_CONFIG_LIST = ListSpec(
+    table="ads_config",
+    sorts={"id": "id", "screen": "screen"},
+    default_sort="id",
+    filters={"screen": ListFilter("screen")},
+    default_limit=100,
+    max_limit=500,
+)
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
@@ -25,20 +36,33 @@ def _reconstruct_doc(row):
     return {**cdata, "id": d["id"], "screen": d["screen"]}
 
 @router.get("/", summary="Get all Ads Configurations")
-async def get_ads_configs():
+async def get_ads_configs(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    screen: Optional[str] = None,
+):
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM ads_config ORDER BY id DESC LIMIT 100")
-            out = []
-            for row in rows:
-                doc = _reconstruct_doc(row)
-                sanitized = sanitize_ads_document_for_storage(doc)
-                sanitized["id"] = doc["id"]
-                out.append(sanitized)
-            return out
+            page = await fetch_page(
+                conn, ADS_CONFIG_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={"screen": screen},
+            )
+        apply_page_headers(response, page)
+        out = []
+        for row in page.items:
+            doc = _reconstruct_doc(row)
+            sanitized = sanitize_ads_document_for_storage(doc)
+            sanitized["id"] = doc["id"]
+            out.append(sanitized)
+        return out
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -92,6 +116,8 @@ async def create_ads_config(config: Dict[Any, Any]):
             screen_final = sanitized.get("screen")
             await invalidate_ads_config_cache(screen_final)
             return final
+    except asyncpg.UniqueViolationError:
+        raise HTTPException(status_code=409, detail=f"Ads configuration for screen '{screen}' already exists.")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
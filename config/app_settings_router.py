@@ -1,12 +1,22 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import Dict, Any, List, Optional
 from db.db import get_pg_pool
+from db.pagination import ListFilter, ListSpec, apply_page_headers, fetch_page
 from auth.dependencies import verify_admin_token
 import json as py_json
 
 router = APIRouter(prefix="/app-settings", tags=["App Settings"])
 
+APP_SETTINGS_LIST = ListSpec(
+    table="app_settings",
+    sorts={"id": "id", "config_name": "config_name"},
+    default_sort="id",
+    filters={"config_name": ListFilter("config_name")},
+    default_limit=100,
+    max_limit=500,
+)
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
@@ -20,14 +30,27 @@ def _reconstruct_doc(row):
     return {**cdata, "id": d["id"], "config_name": d["config_name"]}
 
 @router.get("/", summary="Get all App Settings")
-async def get_app_settings():
+async def get_app_settings(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    config_name: Optional[str] = None,
+):
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM app_settings ORDER BY id DESC LIMIT 100")
-            return [_reconstruct_doc(row) for row in rows]
+            page = await fetch_page(
+                conn, APP_SETTINGS_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={"config_name": config_name},
+            )
+        apply_page_headers(response, page)
+        return [_reconstruct_doc(row) for row in page.items]
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -0,0 +1,197 @@
+"""
+Config change feed.
+
+Every insert/update/delete on ads_config, app_parameters and app_settings
+takes the next value of ``config_version_seq`` and sends it on the
+``config_changes`` NOTIFY channel (triggers in db/migrations.py).  The
+triggers serialize config writers until commit, so versions commit in
+order and ``version > since`` never skips a late-committing write.
+
+Screen ads documents are served the way GET /analytics/ads/{screen}
+serves them: fully disabled while the global ``ads_enabled`` flag is off.
+A change to the global document therefore re-sends every screen document
+at the global document's version.
+
+ConfigChangeFeed keeps a dedicated LISTEN connection, tracks the latest
+version seen and wakes long-poll / SSE waiters when it moves.  A periodic
+refresh from the tables covers lost notifications and reconnects the
+listener if it dropped.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+import orjson
+
+from db.db import POSTGRESQL_DATABASE_URL_TELUGUWAP, get_pg_pool
+from config.ads_config_normalize import disabled_for_analytics_client, expand_for_analytics_client
+
+CONFIG_CHANGES_CHANNEL = "config_changes"
+CONFIG_FEED_REFRESH_SECONDS = int(os.getenv("CONFIG_FEED_REFRESH_SECONDS", 30))
+
+_LATEST_VERSION_SQL = """
+    SELECT GREATEST(
+        (SELECT MAX(version) FROM ads_config),
+        (SELECT MAX(version) FROM app_parameters),
+        (SELECT MAX(version) FROM app_settings),
+        (SELECT MAX(version) FROM config_deletions)
+    )
+"""
+
+_CHANGES_SQL = """
+    SELECT 'ads_config' AS kind, screen AS key, id, version, ads_data AS data, FALSE AS deleted
+    FROM ads_config WHERE version > $1
+    UNION ALL
+    SELECT 'app_parameters', parameter_code, id, version, parameter_data, FALSE
+    FROM app_parameters WHERE version > $1
+    UNION ALL
+    SELECT 'app_settings', config_name, id, version, config_data, FALSE
+    FROM app_settings WHERE version > $1
+    UNION ALL
+    SELECT kind, config_key, NULL, version, NULL, TRUE
+    FROM config_deletions WHERE version > $1
+    ORDER BY version
+    LIMIT $2
+"""
+
+_GLOBAL_ADS_SQL = "SELECT ads_data FROM ads_config WHERE screen = 'global'"
+
+_SCREEN_ADS_SQL = """
+    SELECT 'ads_config' AS kind, screen AS key, id, version, ads_data AS data, FALSE AS deleted
+    FROM ads_config WHERE screen <> 'global'
+    ORDER BY screen
+"""
+
+
+def _load_json(data) -> Dict[str, Any]:
+    return orjson.loads(data) if isinstance(data, str) else (data or {})
+
+
+def _serialize_change(row, ads_enabled: bool, version: Optional[int] = None) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "kind": row["kind"],
+        "key": row["key"],
+        "version": version or row["version"],
+        "deleted": row["deleted"],
+    }
+    if row["deleted"]:
+        return out
+
+    data = _load_json(row["data"])
+    if row["kind"] == "ads_config" and row["key"] != "global":
+        # Same shape clients get from GET /analytics/ads/{screen}.
+        if ads_enabled:
+            data = expand_for_analytics_client(row["key"], data)
+        else:
+            data = disabled_for_analytics_client(row["key"])
+    out["id"] = row["id"]
+    out["data"] = data
+    return out
+
+
+class ConfigChangeFeed:
+    def __init__(self):
+        self.latest_version = 0
+        self._changed = asyncio.Event()
+        self._listener: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ── Version tracking ─────────────────────────────────────────────────────
+
+    def _advance(self, version: int):
+        if version > self.latest_version:
+            self.latest_version = version
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self._advance(int(payload))
+        except ValueError:
+            pass
+
+    async def refresh(self):
+        pool = get_pg_pool()
+        if pool is None:
+            return
+        async with pool.acquire() as conn:
+            version = await conn.fetchval(_LATEST_VERSION_SQL)
+        self._advance(version or 0)
+
+    async def wait_for_change(self, since: int, timeout: float) -> bool:
+        """Wait until latest_version > since. Returns False on timeout."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.latest_version <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def changes_since(self, since: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Changes with version > ``since`` in version order, at most ``limit``
+        source rows.  Screen documents re-sent for a global ads change come
+        right before it and share its version.
+        """
+        pool = get_pg_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                rows = await conn.fetch(_CHANGES_SQL, since, limit)
+                global_ads = await conn.fetchval(_GLOBAL_ADS_SQL)
+                global_changed = any(r["kind"] == "ads_config" and r["key"] == "global" for r in rows)
+                screens = await conn.fetch(_SCREEN_ADS_SQL) if global_changed else []
+
+        ads_enabled = bool(_load_json(global_ads).get("ads_enabled", False))
+        changes = []
+        for row in rows:
+            if row["kind"] == "ads_config" and row["key"] == "global":
+                changes.extend(_serialize_change(s, ads_enabled, row["version"]) for s in screens)
+            changes.append(_serialize_change(row, ads_enabled))
+        return changes
+
+    # ── Listener lifecycle ───────────────────────────────────────────────────
+
+    async def _ensure_listener(self):
+        if self._listener is not None and not self._listener.is_closed():
+            return
+        try:
+            self._listener = await asyncpg.connect(POSTGRESQL_DATABASE_URL_TELUGUWAP)
+            await self._listener.add_listener(CONFIG_CHANGES_CHANNEL, self._on_notify)
+        except Exception as e:
+            self._listener = None
+            print(f"⚠️ Config change listener unavailable, polling only: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await self._ensure_listener()
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Config change feed refresh failed: {e}")
+            await asyncio.sleep(CONFIG_FEED_REFRESH_SECONDS)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listener is not None and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+
+
+config_change_feed = ConfigChangeFeed()
@@ -0,0 +1,91 @@
+"""
+GET /config/changes – push-style config updates for mobile clients.
+
+Clients remember the highest ``version`` they have applied and ask for
+everything newer.  Two transports:
+
+  • Long-poll (default): the request is held for up to ``timeout`` seconds
+    until something changes, then returns
+        { "version": <new high-water mark>, "changes": [...], "has_more": bool }
+    An empty ``changes`` list means "nothing new, poll again".
+
+  • Server-Sent Events (``?mode=sse`` or ``Accept: text/event-stream``):
+    one ``config`` event per changed document, ``id:`` = its version, so a
+    reconnecting EventSource resumes via ``Last-Event-ID``.
+
+Each change is
+    { "kind": "ads_config" | "app_parameters" | "app_settings",
+      "key": <screen | parameter_code | config_name>,
+      "version": int, "deleted": bool, "id": str, "data": {...} }
+``data``/``id`` are omitted for deletions.
+"""
+
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from db.db import get_pg_pool
+from config.change_feed import config_change_feed
+
+router = APIRouter(prefix="/config", tags=["Config Changes"])
+
+CHANGES_PAGE_SIZE = 500
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/changes", summary="Long-poll or SSE feed of changed config documents")
+async def get_config_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Highest version the client already has"),
+    timeout: int = Query(25, ge=0, le=60, description="Long-poll wait in seconds"),
+    mode: str = Query("poll", pattern="^(poll|sse)$"),
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    if get_pg_pool() is None:
+        raise HTTPException(status_code=503, detail="Database connection failed.")
+
+    if mode == "sse" or (accept and "text/event-stream" in accept):
+        if last_event_id and last_event_id.isdigit():
+            since = max(since, int(last_event_id))
+        return StreamingResponse(
+            _sse_stream(request, since),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    if config_change_feed.latest_version <= since:
+        await config_change_feed.wait_for_change(since, timeout)
+
+    changes = await config_change_feed.changes_since(since, CHANGES_PAGE_SIZE)
+    return {
+        "version": changes[-1]["version"] if changes else max(since, config_change_feed.latest_version),
+        "changes": changes,
+        "has_more": len(changes) >= CHANGES_PAGE_SIZE,
+    }
+
+
+async def _sse_stream(request: Request, since: int):
+    yield b"retry: 5000\n\n"
+    while not await request.is_disconnected():
+        if not await config_change_feed.wait_for_change(since, SSE_KEEPALIVE_SECONDS):
+            yield b": keepalive\n\n"
+            continue
+
+        changes = await config_change_feed.changes_since(since, CHANGES_PAGE_SIZE)
+        for i, change in enumerate(changes):
+            # Only the last event of a version carries its id, so a client
+            # that disconnects midway resumes before the rest of it.
+            last_of_version = i + 1 == len(changes) or changes[i + 1]["version"] != change["version"]
+            event_id = f"id: {change['version']}\n" if last_of_version else ""
+            yield (
+                f"{event_id}event: config\ndata: ".encode()
+                + orjson.dumps(change)
+                + b"\n\n"
+            )
+            since = change["version"]
+        if not changes:
+            # Version moved but nothing newer is visible (e.g. rolled back write).
+            since = max(since, config_change_feed.latest_version)
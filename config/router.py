@@ -2,9 +2,13 @@ from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from db.db import get_pg_pool
+from db.redis_config import r_async, CACHE_TTL
 import json as py_json
+import orjson
 import uuid
 
+APP_UPDATE_CACHE_KEY = "appconfig:availableupdate"
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
@@ -303,28 +307,54 @@ async def patch_album_entry_enabled(lang: str, enabled: bool):
 
 @router.get("/availableupdate")
 async def get_app_config():
+    """
+    Return ``{parameter_code: value}`` for every scalar-valued app parameter.
+
+    Reads the generated ``scalar_value`` column only, so large JSON blobs
+    (cached language / country lists, screen configs) are never fetched.
+    The result is cached in Redis until the next PUT.
+    """
     try:
+        if r_async is not None:
+            try:
+                cached = await r_async.get(APP_UPDATE_CACHE_KEY)
+                if cached:
+                    return {"status": "success", "config": orjson.loads(cached)}
+            except Exception as e:
+                print(f"⚠️ Redis read error ({APP_UPDATE_CACHE_KEY}): {e}")
+
         pool = get_pg_pool()
         if pool is None:
             raise HTTPException(status_code=503, detail="Database connection failed.")
             
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT parameter_code, parameter_data FROM app_parameters")
-            params = {}
+            rows = await conn.fetch(
+                "SELECT parameter_code, scalar_value FROM app_parameters WHERE scalar_value IS NOT NULL"
+            )
 
-            for row in rows:
-                p_data = py_json.loads(row["parameter_data"]) if isinstance(row["parameter_data"], str) else (row["parameter_data"] or {})
-                params[row["parameter_code"]] = p_data.get("value")
+        params = {}
+        for row in rows:
+            value = row["scalar_value"]
+            params[row["parameter_code"]] = orjson.loads(value) if isinstance(value, str) else value
 
-            return {"status": "success", "config": params}
+        if r_async is not None:
+            try:
+                await r_async.set(APP_UPDATE_CACHE_KEY, orjson.dumps(params), ex=CACHE_TTL)
+            except Exception as e:
+                print(f"⚠️ Redis write error ({APP_UPDATE_CACHE_KEY}): {e}")
 
+        return {"status": "success", "config": params}
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/availableupdate", summary="Update App Update parameters")
 async def upsert_app_update_config(config: AppUpdateConfig):
     """
-    Updates the `app_update_*` records in `app_parameters`.
+    Updates the `app_update_*` records in `app_parameters` with a single
+    multi-row upsert and invalidates the cached GET response.
     """
     pool = get_pg_pool()
     if pool is None:
@@ -338,16 +368,24 @@ async def upsert_app_update_config(config: AppUpdateConfig):
             "app_update_url": config.app_update_url,
         }
 
+        codes = list(updates)
         async with pool.acquire() as conn:
-            for parameter_code, value in updates.items():
-                exists = await conn.fetchval("SELECT id FROM app_parameters WHERE parameter_code = $1", parameter_code)
-                p_data = py_json.dumps({"value": value})
-                if exists:
-                    await conn.execute("UPDATE app_parameters SET parameter_data = $1 WHERE id = $2", p_data, exists)
-                else:
-                    await conn.execute("INSERT INTO app_parameters (id, parameter_code, parameter_data) VALUES ($1, $2, $3)", _generate_id(), parameter_code, p_data)
+            await conn.execute("""
+                INSERT INTO app_parameters (id, parameter_code, parameter_data)
+                SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::jsonb[])
+                ON CONFLICT (parameter_code) DO UPDATE SET parameter_data = EXCLUDED.parameter_data
+            """,
+                [_generate_id() for _ in codes],
+                codes,
+                [py_json.dumps({"value": updates[c]}) for c in codes],
+            )
+
+        if r_async is not None:
+            try:
+                await r_async.delete(APP_UPDATE_CACHE_KEY)
+            except Exception as e:
+                print(f"⚠️ Redis delete error ({APP_UPDATE_CACHE_KEY}): {e}")
 
         return {"status": "success", "config": updates}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
-
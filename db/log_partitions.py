@@ -0,0 +1,160 @@
+"""
+Monthly partition maintenance for ``user_actions_logs``.
+
+The table is RANGE-partitioned on ``created_at`` (see db/migrations.py).
+A background loop started from the FastAPI lifespan:
+  • creates the partitions for the current month and the next
+    LOG_PARTITION_MONTHS_AHEAD months, so inserts never land in the
+    DEFAULT partition;
+  • drops whole partitions whose upper bound is older than
+    LOG_RETENTION_MONTHS, instead of running large DELETEs.
+
+Only one worker does the work per cycle (pg_try_advisory_lock).
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from db.db import get_pg_pool
+
+LOG_TABLE = "user_actions_logs"
+LOG_PARTITION_MONTHS_AHEAD = int(os.getenv("LOG_PARTITION_MONTHS_AHEAD", 3))
+LOG_RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", 12))
+LOG_PARTITION_CHECK_INTERVAL = int(os.getenv("LOG_PARTITION_CHECK_INTERVAL", 6 * 3600))
+
+PARTITION_LOCK_KEY = 7_314_002
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+_task: Optional[asyncio.Task] = None
+_warned_unpartitioned = False
+
+
+def _month_start(dt: datetime, offset: int = 0) -> datetime:
+    """First instant (UTC) of the month `offset` months away from `dt`."""
+    index = dt.year * 12 + (dt.month - 1) + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _parse_bound(text: str) -> Optional[datetime]:
+    """Parse one side of a partition bound; MINVALUE/MAXVALUE → None."""
+    text = text.strip().strip("'")
+    if text in ("MINVALUE", "MAXVALUE"):
+        return None
+    # Postgres renders offsets as "+00"/"+05:30"; fromisoformat wants "+HH:MM".
+    text = re.sub(r"([+-]\d{2})$", r"\1:00", text)
+    return datetime.fromisoformat(text)
+
+
+async def _partition_bounds(conn) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """(name, lower, upper) for every range partition of LOG_TABLE."""
+    rows = await conn.fetch("""
+        SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass
+    """, LOG_TABLE)
+
+    out = []
+    for row in rows:
+        match = _BOUND_RE.search(row["bound"] or "")
+        if not match:
+            continue  # DEFAULT partition
+        out.append((row["name"], _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return out
+
+
+def _overlaps(bounds, lower: datetime, upper: datetime) -> bool:
+    for _, b_lower, b_upper in bounds:
+        if (b_lower is None or b_lower < upper) and (b_upper is None or b_upper > lower):
+            return True
+    return False
+
+
+async def ensure_log_partitions(conn, months_ahead: int = LOG_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create missing monthly partitions from this month up to `months_ahead`."""
+    now = datetime.now(timezone.utc)
+    bounds = await _partition_bounds(conn)
+    created = []
+
+    for offset in range(months_ahead + 1):
+        lower, upper = _month_start(now, offset), _month_start(now, offset + 1)
+        if _overlaps(bounds, lower, upper):
+            continue
+        name = f"{LOG_TABLE}_p{lower:%Y%m}"
+        await conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {LOG_TABLE} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        bounds.append((name, lower, upper))
+        created.append(name)
+
+    return created
+
+
+async def drop_expired_log_partitions(conn, retention_months: int = LOG_RETENTION_MONTHS) -> List[str]:
+    """Drop partitions whose whole range is older than the retention window."""
+    cutoff = _month_start(datetime.now(timezone.utc), -retention_months)
+    dropped = []
+
+    for name, _, upper in await _partition_bounds(conn):
+        if upper is not None and upper <= cutoff:
+            await conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+            dropped.append(name)
+
+    return dropped
+
+
+async def run_log_partition_maintenance():
+    """One maintenance cycle; skipped if another worker holds the lock."""
+    global _warned_unpartitioned
+    pool = get_pg_pool()
+    if pool is None:
+        return
+
+    async with pool.acquire() as conn:
+        kind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", f"public.{LOG_TABLE}")
+        if kind != "p":
+            # Large tables are not converted at boot (db/migrations.py).
+            if not _warned_unpartitioned:
+                print(f"⚠️ {LOG_TABLE} is not partitioned; run pythonutil/partition_user_actions_logs.py.")
+                _warned_unpartitioned = True
+            return
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", PARTITION_LOCK_KEY):
+            return
+        try:
+            created = await ensure_log_partitions(conn)
+            dropped = await drop_expired_log_partitions(conn)
+            if created or dropped:
+                print(f"{LOG_TABLE} partitions created={created} dropped={dropped}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", PARTITION_LOCK_KEY)
+
+
+async def _maintenance_loop():
+    while True:
+        try:
+            await run_log_partition_maintenance()
+        except Exception as e:
+            print(f"⚠️ {LOG_TABLE} partition maintenance failed: {e}")
+        await asyncio.sleep(LOG_PARTITION_CHECK_INTERVAL)
+
+
+async def start_log_partition_maintenance():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_maintenance_loop())
+
+
+async def stop_log_partition_maintenance():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
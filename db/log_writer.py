@@ -0,0 +1,210 @@
+"""
+Write-behind batched ingestion for append-only log tables.
+
+Request handlers call ``submit()`` which only appends a record to an
+in-process bounded buffer and returns immediately.  A background task drains
+the buffer with ``copy_records_to_table`` whenever ``batch_size`` records are
+pending or ``flush_interval_ms`` has elapsed, whichever comes first.
+
+Backpressure policy (``LOG_WRITER_OVERFLOW``):
+  • reject       – submit() returns False when the buffer is full; the caller
+                   answers 429 so the client retries later (default).
+  • drop_oldest  – the oldest buffered record is discarded to make room.
+
+Each gunicorn worker owns its own buffer; ``stop()`` is awaited from the
+FastAPI lifespan so pending records are flushed on shutdown.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+import orjson
+
+from db.db import get_pg_pool
+
+LOG_WRITER_MAX_QUEUE = int(os.getenv("LOG_WRITER_MAX_QUEUE", 50000))
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", 500))
+LOG_WRITER_FLUSH_INTERVAL_MS = int(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", 250))
+LOG_WRITER_OVERFLOW = os.getenv("LOG_WRITER_OVERFLOW", "reject")
+
+
+class BatchedLogWriter:
+    """Bounded in-memory buffer flushed to a PostgreSQL table via COPY."""
+
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        max_queue: int = LOG_WRITER_MAX_QUEUE,
+        batch_size: int = LOG_WRITER_BATCH_SIZE,
+        flush_interval_ms: int = LOG_WRITER_FLUSH_INTERVAL_MS,
+        overflow: str = LOG_WRITER_OVERFLOW,
+    ):
+        self.table = table
+        self.columns = tuple(columns)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow = overflow
+
+        self._buffer: Deque[Tuple[Any, ...]] = deque()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # ── Metrics ──────────────────────────────────────────────────────────
+        self.enqueued_total = 0
+        self.flushed_total = 0
+        self.rejected_total = 0
+        self.dropped_total = 0
+        self.failed_flushes = 0
+        self.flush_count = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    # ── Producer side ────────────────────────────────────────────────────────
+
+    def submit(self, record: Tuple[Any, ...]) -> bool:
+        """Buffer one record. Returns False if it was rejected (buffer full)."""
+        return self.submit_many([record]) == 1
+
+    def submit_many(self, records: Sequence[Tuple[Any, ...]]) -> int:
+        """
+        Buffer several records at once. Returns how many were accepted.
+
+        With the ``reject`` policy the whole batch is refused when it does not
+        fit, so callers never have to report a partial success.
+        """
+        free = self.max_queue - len(self._buffer)
+        if len(records) > free:
+            if self.overflow != "drop_oldest":
+                self.rejected_total += len(records)
+                return 0
+            if len(records) > self.max_queue:
+                self.dropped_total += len(records) - self.max_queue
+                records = records[-self.max_queue:]
+            overflow = max(len(records) - (self.max_queue - len(self._buffer)), 0)
+            for _ in range(overflow):
+                self._buffer.popleft()
+            self.dropped_total += overflow
+
+        self._buffer.extend(records)
+        self.enqueued_total += len(records)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+        return len(records)
+
+    # ── Consumer side ────────────────────────────────────────────────────────
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and flush everything still buffered."""
+        if self._task is not None:
+            # Let the loop finish its current COPY instead of cancelling it mid-batch.
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                print(f"⚠️ {self.table} writer: dropping {len(self._buffer)} records on shutdown.")
+                break
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """Write all buffered records in batches. Returns False on a failed COPY."""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not await self._copy(batch):
+                    # Put the batch back (as far as room allows) for the next cycle.
+                    room = self.max_queue - len(self._buffer)
+                    self._buffer.extendleft(reversed(batch[:room]))
+                    self.dropped_total += max(len(batch) - room, 0)
+                    return False
+        return True
+
+    async def _copy(self, batch) -> bool:
+        pool = get_pg_pool()
+        if pool is None:
+            self.failed_flushes += 1
+            return False
+
+        started = time.perf_counter()
+        try:
+            async with pool.acquire() as conn:
+                await conn.copy_records_to_table(self.table, records=batch, columns=self.columns)
+        except Exception as e:
+            self.failed_flushes += 1
+            print(f"⚠️ {self.table} writer: COPY of {len(batch)} records failed: {e}")
+            return False
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flush_count += 1
+        self.flushed_total += len(batch)
+        self.last_batch_size = len(batch)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "queue_depth": len(self._buffer),
+            "max_queue": self.max_queue,
+            "overflow_policy": self.overflow,
+            "enqueued_total": self.enqueued_total,
+            "flushed_total": self.flushed_total,
+            "rejected_total": self.rejected_total,
+            "dropped_total": self.dropped_total,
+            "failed_flushes": self.failed_flushes,
+            "flush_count": self.flush_count,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.flush_count, 2) if self.flush_count else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+USER_ACTIONS_LOG_COLUMNS = ("device_id", "event", "details", "client_timestamp", "created_at")
+
+user_actions_log_writer = BatchedLogWriter("user_actions_logs", USER_ACTIONS_LOG_COLUMNS)
+
+
+def user_action_record(
+    device_id: str,
+    event: str,
+    details: Optional[Dict[str, Any]] = None,
+    client_timestamp: Optional[str] = None,
+) -> Tuple[Any, ...]:
+    """
+    Build a user_actions_logs row in USER_ACTIONS_LOG_COLUMNS order.
+    ``created_at`` is stamped at submit time so buffering does not skew it.
+    """
+    return (
+        device_id,
+        event,
+        orjson.dumps(details).decode() if details else None,
+        client_timestamp,
+        datetime.now(timezone.utc),
+    )
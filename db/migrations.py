@@ -0,0 +1,500 @@
+"""
+Idempotent PostgreSQL DDL applied once at application startup.
+
+Every statement must be safe to re-run (IF NOT EXISTS / guarded DO blocks),
+because it is executed on every boot of every worker.  Statements run in
+order; a failing statement is logged and skipped so that one bad migration
+never prevents the API from coming up.
+"""
+
+from typing import List, Tuple
+
+from db.db import get_pg_pool
+
+MIGRATIONS: List[Tuple[str, str]] = [
+    # ids are random, so there is no way to tell which of several documents
+    # for a screen is current: refuse instead of deleting one.  Once the
+    # duplicates are removed by hand, the next boot builds the unique index.
+    (
+        "ads_config_check_duplicate_screens",
+        """
+        DO $$
+        DECLARE
+            dupes TEXT;
+        BEGIN
+            IF to_regclass('public.ads_config_screen_uidx') IS NULL THEN
+                SELECT string_agg(format('%s (ids %s)', screen, ids), '; ') INTO dupes
+                FROM (
+                    SELECT screen, string_agg(id, ', ' ORDER BY id) AS ids
+                    FROM ads_config GROUP BY screen HAVING COUNT(*) > 1
+                ) d;
+                IF dupes IS NOT NULL THEN
+                    RAISE EXCEPTION 'ads_config has several documents per screen: %. Keep one per screen, then restart to build ads_config_screen_uidx.', dupes;
+                END IF;
+            END IF;
+        END $$;
+        """,
+    ),
+    (
+        "ads_config_screen_uidx",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ads_config_screen_uidx ON ads_config (screen)",
+    ),
+    # user_actions_logs → monthly RANGE partitions on created_at.
+    # An existing plain table is kept as the partition for everything before
+    # next month; db/log_partitions.py creates the monthly partitions after it.
+    # Only small tables are converted here: the id rewrite and primary key
+    # rebuild would block every booting worker on a large one.  Those are
+    # converted offline with pythonutil/partition_user_actions_logs.py.
+    (
+        "user_actions_logs_partitioned",
+        """
+        DO $$
+        DECLARE
+            cutover TIMESTAMPTZ := (date_trunc('month', now() AT TIME ZONE 'UTC') + INTERVAL '1 month') AT TIME ZONE 'UTC';
+            legacy_pk TEXT;
+        BEGIN
+            IF to_regclass('public.user_actions_logs') IS NULL THEN
+                CREATE TABLE user_actions_logs (
+                    id BIGSERIAL,
+                    device_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    details JSONB,
+                    client_timestamp TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, created_at)
+                ) PARTITION BY RANGE (created_at);
+            ELSIF (SELECT relkind FROM pg_class WHERE oid = 'public.user_actions_logs'::regclass) = 'r'
+                  AND pg_total_relation_size('public.user_actions_logs') <= 64 * 1024 * 1024 THEN
+                ALTER TABLE user_actions_logs RENAME TO user_actions_logs_legacy;
+                -- Free the parent's index names; CREATE INDEX on the parent
+                -- adopts these as its partition indexes.
+                ALTER INDEX IF EXISTS user_actions_logs_device_created_idx RENAME TO user_actions_logs_legacy_device_created_idx;
+                ALTER INDEX IF EXISTS user_actions_logs_event_created_idx RENAME TO user_actions_logs_legacy_event_created_idx;
+                UPDATE user_actions_logs_legacy SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+
+                -- The partition must carry the parent's (id, created_at) key,
+                -- not a second primary key of its own.
+                SELECT conname INTO legacy_pk FROM pg_constraint
+                WHERE conrelid = 'public.user_actions_logs_legacy'::regclass AND contype = 'p';
+                IF legacy_pk IS NOT NULL THEN
+                    EXECUTE format('ALTER TABLE user_actions_logs_legacy DROP CONSTRAINT %I', legacy_pk);
+                END IF;
+                ALTER TABLE user_actions_logs_legacy
+                    ALTER COLUMN created_at SET NOT NULL,
+                    ALTER COLUMN id TYPE BIGINT,
+                    ALTER COLUMN id DROP DEFAULT,
+                    ADD CONSTRAINT user_actions_logs_legacy_pkey PRIMARY KEY (id, created_at);
+
+                -- A validated CHECK lets ATTACH skip its own range scan.
+                EXECUTE format(
+                    'ALTER TABLE user_actions_logs_legacy ADD CONSTRAINT user_actions_logs_legacy_cutover CHECK (created_at < %L) NOT VALID',
+                    cutover
+                );
+                ALTER TABLE user_actions_logs_legacy VALIDATE CONSTRAINT user_actions_logs_legacy_cutover;
+
+                CREATE TABLE user_actions_logs (
+                    id BIGINT NOT NULL DEFAULT nextval('user_actions_logs_id_seq'),
+                    device_id TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    details JSONB,
+                    client_timestamp TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, created_at)
+                ) PARTITION BY RANGE (created_at);
+                ALTER SEQUENCE user_actions_logs_id_seq AS BIGINT OWNED BY user_actions_logs.id;
+
+                EXECUTE format(
+                    'ALTER TABLE user_actions_logs ATTACH PARTITION user_actions_logs_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                    cutover
+                );
+            END IF;
+        END $$;
+        """,
+    ),
+    # The rest assumes the partitioned layout; until a large table has been
+    # converted offline they are skipped.
+    (
+        "user_actions_logs_default_partition",
+        """
+        DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'public.user_actions_logs'::regclass) = 'p' THEN
+                CREATE TABLE IF NOT EXISTS user_actions_logs_default PARTITION OF user_actions_logs DEFAULT;
+                CREATE INDEX IF NOT EXISTS user_actions_logs_device_created_idx ON user_actions_logs (device_id, created_at DESC);
+                CREATE INDEX IF NOT EXISTS user_actions_logs_event_created_idx ON user_actions_logs (event, created_at DESC);
+            END IF;
+        END $$;
+        """,
+    ),
+    # Hourly / daily event rollups (stations/rollups.py).
+    (
+        "analytics_event_rollups",
+        """
+        CREATE TABLE IF NOT EXISTS analytics_event_rollups (
+            granularity TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            event TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            event_count BIGINT NOT NULL DEFAULT 0,
+            device_hll BYTEA,
+            PRIMARY KEY (granularity, bucket, event, platform)
+        )
+        """,
+    ),
+    (
+        "analytics_rollup_state",
+        """
+        CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+            name TEXT PRIMARY KEY,
+            watermark TIMESTAMPTZ NOT NULL
+        )
+        """,
+    ),
+    # Rollups track progress by user_actions_logs.id; watermark now records
+    # the time before which every allocated id is rolled up.
+    (
+        "analytics_rollup_state_ids",
+        """
+        ALTER TABLE analytics_rollup_state
+            ADD COLUMN IF NOT EXISTS last_id BIGINT,
+            ADD COLUMN IF NOT EXISTS pending_id BIGINT,
+            ADD COLUMN IF NOT EXISTS pending_at TIMESTAMPTZ
+        """,
+    ),
+    # Device registry fast path (stations/device_registry.py).
+    (
+        "devices_last_seen_at",
+        "ALTER TABLE devices ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMPTZ",
+    ),
+    # Before the unique index exists, keep the most recently seen /
+    # registered row per device_id.
+    (
+        "devices_dedupe_device_id",
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('public.devices_device_id_uidx') IS NULL THEN
+                DELETE FROM devices d
+                USING (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY device_id
+                        ORDER BY COALESCE(last_seen_at, registered_at) DESC NULLS LAST, id
+                    ) AS rn
+                    FROM devices
+                    WHERE device_id IS NOT NULL
+                ) ranked
+                WHERE d.id = ranked.id AND ranked.rn > 1;
+            END IF;
+        END $$;
+        """,
+    ),
+    (
+        "devices_device_id_uidx",
+        "CREATE UNIQUE INDEX IF NOT EXISTS devices_device_id_uidx ON devices (device_id)",
+    ),
+    (
+        "devices_drop_device_id_idx",
+        "DROP INDEX IF EXISTS devices_device_id_idx",
+    ),
+    # Config change feed (config/change_feed.py): every write to a config
+    # document takes the next value of one global sequence and NOTIFYs it.
+    # The transaction-level advisory lock (7_314_005) serializes config
+    # writers until commit, so versions become visible in version order and
+    # a client that has seen version N can never miss a lower one.
+    (
+        "config_version_seq",
+        "CREATE SEQUENCE IF NOT EXISTS config_version_seq AS BIGINT",
+    ),
+    (
+        "config_deletions",
+        """
+        CREATE TABLE IF NOT EXISTS config_deletions (
+            version BIGINT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            config_key TEXT,
+            deleted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ),
+    (
+        "bump_config_version_fn",
+        """
+        CREATE OR REPLACE FUNCTION bump_config_version() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(7314005);
+            NEW.version := nextval('config_version_seq');
+            PERFORM pg_notify('config_changes', NEW.version::text);
+            RETURN NEW;
+        END $$ LANGUAGE plpgsql
+        """,
+    ),
+    (
+        "record_config_deletion_fn",
+        """
+        CREATE OR REPLACE FUNCTION record_config_deletion() RETURNS trigger AS $$
+        DECLARE
+            v BIGINT;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(7314005);
+            v := nextval('config_version_seq');
+            INSERT INTO config_deletions (version, kind, config_key)
+            VALUES (v, TG_TABLE_NAME, to_jsonb(OLD) ->> TG_ARGV[0]);
+            PERFORM pg_notify('config_changes', v::text);
+            RETURN OLD;
+        END $$ LANGUAGE plpgsql
+        """,
+    ),
+    # Projected, scalar-only reads for GET /appconfig/availableupdate.
+    # Same as ads_config: refuse to pick between duplicate parameters.
+    (
+        "app_parameters_check_duplicate_codes",
+        """
+        DO $$
+        DECLARE
+            dupes TEXT;
+        BEGIN
+            IF to_regclass('public.app_parameters_code_uidx') IS NULL THEN
+                SELECT string_agg(format('%s (ids %s)', parameter_code, ids), '; ') INTO dupes
+                FROM (
+                    SELECT parameter_code, string_agg(id, ', ' ORDER BY id) AS ids
+                    FROM app_parameters GROUP BY parameter_code HAVING COUNT(*) > 1
+                ) d;
+                IF dupes IS NOT NULL THEN
+                    RAISE EXCEPTION 'app_parameters has several rows per parameter_code: %. Keep one per code, then restart to build app_parameters_code_uidx.', dupes;
+                END IF;
+            END IF;
+        END $$;
+        """,
+    ),
+    (
+        "app_parameters_code_uidx",
+        "CREATE UNIQUE INDEX IF NOT EXISTS app_parameters_code_uidx ON app_parameters (parameter_code)",
+    ),
+    (
+        "app_parameters_scalar_value",
+        """
+        ALTER TABLE app_parameters ADD COLUMN IF NOT EXISTS scalar_value JSONB
+            GENERATED ALWAYS AS (
+                CASE WHEN jsonb_typeof(parameter_data -> 'value') IN ('string', 'number', 'boolean')
+                     THEN parameter_data -> 'value'
+                END
+            ) STORED
+        """,
+    ),
+    # Normalized premium license ↔ device links (premium/router.py).
+    (
+        "premium_devices",
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('public.premium_devices') IS NULL THEN
+                CREATE TABLE premium_devices (
+                    license_id VARCHAR(24) NOT NULL REFERENCES premium_users (id) ON DELETE CASCADE,
+                    device_id TEXT NOT NULL,
+                    added_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (license_id, device_id)
+                );
+                -- One-time backfill from the legacy JSON array.
+                INSERT INTO premium_devices (license_id, device_id)
+                SELECT u.id, d.device_id
+                FROM premium_users u
+                CROSS JOIN LATERAL jsonb_array_elements_text(u.active_devices) AS d(device_id)
+                WHERE jsonb_typeof(u.active_devices) = 'array'
+                ON CONFLICT DO NOTHING;
+            END IF;
+        END $$;
+        """,
+    ),
+    (
+        "premium_users_license_key_idx",
+        "CREATE INDEX IF NOT EXISTS premium_users_license_key_idx ON premium_users (license_key)",
+    ),
+    # Generated keys are checked against this index; as with app_parameters,
+    # existing duplicates are reported rather than resolved here.
+    (
+        "premium_users_check_duplicate_plain_keys",
+        """
+        DO $$
+        DECLARE
+            dupes TEXT;
+        BEGIN
+            IF to_regclass('public.premium_users_plain_key_uidx') IS NULL THEN
+                SELECT string_agg(format('%s (ids %s)', plain_key, ids), '; ') INTO dupes
+                FROM (
+                    SELECT plain_key, string_agg(id, ', ' ORDER BY id) AS ids
+                    FROM premium_users WHERE plain_key IS NOT NULL
+                    GROUP BY plain_key HAVING COUNT(*) > 1
+                ) d;
+                IF dupes IS NOT NULL THEN
+                    RAISE EXCEPTION 'premium_users has several rows per plain_key: %. Give each license its own key, then restart to build premium_users_plain_key_uidx.', dupes;
+                END IF;
+            END IF;
+        END $$;
+        """,
+    ),
+    (
+        "premium_users_plain_key_uidx",
+        "CREATE UNIQUE INDEX IF NOT EXISTS premium_users_plain_key_uidx ON premium_users (plain_key)",
+    ),
+    (
+        "link_premium_device_fn",
+        """
+        CREATE OR REPLACE FUNCTION link_premium_device(p_license_key TEXT, p_device_id TEXT, p_max_devices INT)
+        RETURNS TEXT AS $$
+        DECLARE
+            v_license_id VARCHAR;
+        BEGIN
+            -- Row lock serialises concurrent links for the same license; every
+            -- statement below runs with a fresh snapshot taken after the lock.
+            SELECT id INTO v_license_id FROM premium_users WHERE license_key = p_license_key LIMIT 1 FOR UPDATE;
+            IF NOT FOUND THEN
+                RETURN 'not_found';
+            END IF;
+
+            INSERT INTO premium_devices (license_id, device_id)
+            SELECT v_license_id, p_device_id
+            WHERE (SELECT COUNT(*) FROM premium_devices WHERE license_id = v_license_id) < p_max_devices
+            ON CONFLICT (license_id, device_id) DO NOTHING;
+            IF FOUND THEN
+                RETURN 'added';
+            END IF;
+
+            IF EXISTS (SELECT 1 FROM premium_devices WHERE license_id = v_license_id AND device_id = p_device_id) THEN
+                RETURN 'linked';
+            END IF;
+            RETURN 'limit';
+        END $$ LANGUAGE plpgsql
+        """,
+    ),
+    # Complaint full-text search (complaints/search.py).
+    (
+        "cust_feedback_complaints_search_vector",
+        """
+        ALTER TABLE cust_feedback_complaints ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english'::regconfig, COALESCE(subject, '')), 'A')
+            || setweight(to_tsvector('english'::regconfig, COALESCE(description, '')), 'B')
+            || setweight(to_tsvector('simple'::regconfig, COALESCE(name, '') || ' ' || COALESCE(email, '')), 'C')
+        ) STORED
+        """,
+    ),
+    (
+        "cust_feedback_complaints_search_idx",
+        "CREATE INDEX IF NOT EXISTS cust_feedback_complaints_search_idx ON cust_feedback_complaints USING GIN (search_vector)",
+    ),
+    (
+        "cust_feedback_complaints_device_idx",
+        "CREATE INDEX IF NOT EXISTS cust_feedback_complaints_device_idx ON cust_feedback_complaints (device_id)",
+    ),
+    # Trigram matching of AI song suggestions (ai_assistant/catalog_match.py).
+    ("pg_trgm_extension", "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    *[
+        migration
+        for songs, albums in (
+            ("hindiflacs_songs", "hindiflacs_albums_list"),
+            ("teluguwap_songs", "teluguwap_albums_list"),
+        )
+        for migration in (
+            (
+                f"{songs}_name_trgm_idx",
+                f"CREATE INDEX IF NOT EXISTS {songs}_name_trgm_idx ON {songs} USING GIN (lower(song_name) gin_trgm_ops)",
+            ),
+            (
+                f"{albums}_name_trgm_idx",
+                f"CREATE INDEX IF NOT EXISTS {albums}_name_trgm_idx ON {albums} USING GIN (lower(album_name) gin_trgm_ops)",
+            ),
+            (
+                f"{songs}_album_id_idx",
+                f"CREATE INDEX IF NOT EXISTS {songs}_album_id_idx ON {songs} (album_id)",
+            ),
+        )
+    ],
+    # Keyset pagination orders for admin lists (db/pagination.py).  created_at
+    # is NOT NULL so pages can use a (created_at, id) row comparison that the
+    # index serves in both directions.  Rows that never had a timestamp are
+    # dated to the epoch, which keeps them at the end of the newest-first list.
+    *[
+        (
+            f"{table}_created_at_not_null",
+            f"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = 'public' AND table_name = '{table}'
+                      AND column_name = 'created_at' AND is_nullable = 'YES'
+                ) THEN
+                    UPDATE {table} SET created_at = 'epoch' WHERE created_at IS NULL;
+                    ALTER TABLE {table}
+                        ALTER COLUMN created_at SET DEFAULT (now() AT TIME ZONE 'UTC'),
+                        ALTER COLUMN created_at SET NOT NULL;
+                END IF;
+            END $$;
+            """,
+        )
+        for table in ("cust_feedback_complaints", "premium_users")
+    ],
+    (
+        "cust_feedback_complaints_created_id_idx",
+        "CREATE INDEX IF NOT EXISTS cust_feedback_complaints_created_id_idx ON cust_feedback_complaints (created_at, id)",
+    ),
+    (
+        "premium_users_created_id_idx",
+        "CREATE INDEX IF NOT EXISTS premium_users_created_id_idx ON premium_users (created_at, id)",
+    ),
+    (
+        "radio_stations_language_id_idx",
+        "CREATE INDEX IF NOT EXISTS radio_stations_language_id_idx ON radio_stations (language, id)",
+    ),
+    (
+        "radio_garden_channels_country_id_idx",
+        "CREATE INDEX IF NOT EXISTS radio_garden_channels_country_id_idx ON radio_garden_channels (country, id)",
+    ),
+    *[
+        (
+            f"{table}_config_version",
+            f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT nextval('config_version_seq');
+            CREATE INDEX IF NOT EXISTS {table}_version_idx ON {table} (version);
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_bump_version') THEN
+                    CREATE TRIGGER {table}_bump_version BEFORE INSERT OR UPDATE ON {table}
+                        FOR EACH ROW EXECUTE FUNCTION bump_config_version();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_record_deletion') THEN
+                    CREATE TRIGGER {table}_record_deletion AFTER DELETE ON {table}
+                        FOR EACH ROW EXECUTE FUNCTION record_config_deletion('{key_column}');
+                END IF;
+            END $$;
+            """,
+        )
+        for table, key_column in (
+            ("ads_config", "screen"),
+            ("app_parameters", "parameter_code"),
+            ("app_settings", "config_name"),
+        )
+    ],
+]
+
+# Serialises migrations across gunicorn workers booting at the same time.
+MIGRATIONS_LOCK_KEY = 7_314_001
+
+
+async def run_startup_migrations():
+    """Apply all MIGRATIONS against the shared asyncpg pool."""
+    pool = get_pg_pool()
+    if pool is None:
+        print("PG pool not connected. Skipping startup migrations.")
+        return
+
+    async with pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_KEY)
+        try:
+            for name, sql in MIGRATIONS:
+                try:
+                    await conn.execute(sql)
+                except Exception as e:
+                    print(f"⚠️ Migration '{name}' failed: {e}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_KEY)
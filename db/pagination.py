@@ -0,0 +1,233 @@
+"""
+Keyset pagination for admin list endpoints.
+
+A router describes its table once with a ListSpec (sortable columns,
+filterable columns) and calls ``fetch_page``.  Pages are ordered by
+``<sort column>, id`` and continued with an opaque cursor holding the last
+row's (sort value, id), so page N costs the same as page 1 instead of
+growing with an OFFSET.
+
+Response bodies stay plain JSON arrays; paging metadata travels in headers
+(see ``apply_page_headers``):
+
+    X-Next-Cursor            pass back as ?cursor= for the next page (absent on the last page)
+    X-Total-Count            matching rows, exact for small tables, estimated otherwise
+    X-Total-Count-Estimated  "true" when X-Total-Count is an estimate
+"""
+
+import base64
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Response
+
+# Below this many rows (per pg_class.reltuples) totals are an exact COUNT(*).
+EXACT_TOTAL_MAX_ROWS = 10_000
+
+_FILTER_OPS = {
+    "eq": "{col} = ${n}",
+    "gte": "{col} >= ${n}",
+    "lt": "{col} < ${n}",
+    "contains": "{col} ILIKE '%' || ${n} || '%'",
+}
+
+
+class ListFilter:
+    """
+    ``column`` compared with ``op``, or a raw ``template`` predicate whose
+    ``${n}`` is replaced by the bound parameter.
+    """
+
+    def __init__(self, column: Optional[str] = None, op: str = "eq", template: Optional[str] = None):
+        if template is None and op not in _FILTER_OPS:
+            raise ValueError(f"Unknown filter op: {op}")
+        self.column = column
+        self.op = op
+        self.template = template
+
+
+class ListSpec:
+    """
+    ``table``   FROM clause, may carry an alias ("premium_users u").
+    ``columns`` SELECT list; must expose every sort field and ``id`` under
+                its public name.
+    ``sorts``   public sort name -> SQL expression (the whitelist).
+    ``filters`` public filter name -> ListFilter.
+    ``not_null_sorts``
+                sort names whose column is NOT NULL.  They page with a row
+                comparison ``(col, id) < (…)`` in the index's native order,
+                so a plain ``(col, id)`` index serves every page in either
+                direction without a Sort.  Nullable sorts order NULLS LAST.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        sorts: Dict[str, str],
+        default_sort: str,
+        filters: Optional[Dict[str, ListFilter]] = None,
+        columns: str = "*",
+        id_column: str = "id",
+        default_limit: int = 100,
+        max_limit: int = 1000,
+        not_null_sorts: Tuple[str, ...] = (),
+    ):
+        self.table = table
+        self.relation = table.split()[0]
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.filters = filters or {}
+        self.columns = columns
+        self.id_column = id_column
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.not_null_sorts = set(not_null_sorts)
+
+
+class Page:
+    def __init__(self, items: List[Dict[str, Any]], next_cursor: Optional[str], total: int, total_estimated: bool):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.total = total
+        self.total_estimated = total_estimated
+
+
+# ── Cursor encoding ──────────────────────────────────────────────────────────
+
+def _encode_cursor(sort: str, order: str, value: Any, row_id: Any) -> str:
+    kind = "dt" if isinstance(value, datetime) else "d" if isinstance(value, date) else "v"
+    raw = orjson.dumps({"s": sort, "o": order, "k": kind, "v": value, "id": row_id})
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, Any]:
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value = data["v"]
+        if value is not None and data["k"] == "dt":
+            value = datetime.fromisoformat(value)
+        elif value is not None and data["k"] == "d":
+            value = date.fromisoformat(value)
+        if data["s"] != sort or data["o"] != order:
+            raise ValueError("cursor was issued for a different sort")
+        return value, data["id"]
+    except (ValueError, KeyError, TypeError, orjson.JSONDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+
+
+# ── Query building ───────────────────────────────────────────────────────────
+
+def _filter_clauses(spec: ListSpec, filters: Dict[str, Any], args: List[Any]) -> List[str]:
+    clauses = []
+    for name, value in filters.items():
+        if value is None or value == "":
+            continue
+        f = spec.filters.get(name)
+        if f is None:
+            raise HTTPException(status_code=400, detail=f"Unknown filter: {name}")
+        if f.template is None and f.op == "contains":
+            value = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        args.append(value)
+        template = f.template or _FILTER_OPS[f.op]
+        clauses.append(template.format(col=f.column, n=len(args)))
+    return clauses
+
+
+def _keyset_clause(
+    sort_col: str, id_col: str, descending: bool, not_null: bool, value: Any, row_id: Any, args: List[Any]
+) -> str:
+    # Ordering is "<sort>, id" for NOT NULL sorts and "<sort> NULLS LAST, id"
+    # otherwise, in both directions.
+    cmp = "<" if descending else ">"
+    args.append(row_id)
+    id_n = len(args)
+    if sort_col == id_col:
+        return f"{id_col} {cmp} ${id_n}"
+    if not_null:
+        args.append(value)
+        return f"({sort_col}, {id_col}) {cmp} (${len(args)}, ${id_n})"
+    if value is None:
+        return f"({sort_col} IS NULL AND {id_col} {cmp} ${id_n})"
+    args.append(value)
+    v_n = len(args)
+    return (
+        f"({sort_col} {cmp} ${v_n} OR ({sort_col} = ${v_n} AND {id_col} {cmp} ${id_n})"
+        f" OR {sort_col} IS NULL)"
+    )
+
+
+async def _estimate_total(conn, spec: ListSpec, where: str, args: List[Any]) -> Tuple[int, bool]:
+    reltuples = await conn.fetchval(
+        "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass($1)", spec.relation
+    )
+    if reltuples is None or reltuples < EXACT_TOTAL_MAX_ROWS:
+        return await conn.fetchval(f"SELECT COUNT(*) FROM {spec.table}{where}", *args), False
+    if not where:
+        return reltuples, True
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {spec.table}{where}", *args)
+    plan = orjson.loads(plan) if isinstance(plan, str) else plan
+    return int(plan[0]["Plan"]["Plan Rows"]), True
+
+
+async def fetch_page(
+    conn,
+    spec: ListSpec,
+    *,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    filters: Optional[Dict[str, Any]] = None,
+) -> Page:
+    sort = sort or spec.default_sort
+    if sort not in spec.sorts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort by '{sort}'. Allowed: {', '.join(sorted(spec.sorts))}",
+        )
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'.")
+    limit = min(max(limit or spec.default_limit, 1), spec.max_limit)
+    descending = order == "desc"
+    sort_col = spec.sorts[sort]
+
+    args: List[Any] = []
+    clauses = _filter_clauses(spec, filters or {}, args)
+    filter_where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    filter_args = list(args)
+
+    if cursor:
+        value, row_id = _decode_cursor(cursor, sort, order)
+        clauses.append(_keyset_clause(
+            sort_col, spec.id_column, descending, sort in spec.not_null_sorts, value, row_id, args
+        ))
+
+    direction = "DESC" if descending else "ASC"
+    order_by = f"{spec.id_column} {direction}"
+    if sort in spec.not_null_sorts:
+        order_by = f"{sort_col} {direction}, {order_by}"
+    elif sort_col != spec.id_column:
+        order_by = f"{sort_col} {direction} NULLS LAST, {order_by}"
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    args.append(limit + 1)
+    rows = await conn.fetch(
+        f"SELECT {spec.columns} FROM {spec.table}{where} ORDER BY {order_by} LIMIT ${len(args)}",
+        *args,
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, order, last[sort], last["id"])
+
+    total, estimated = await _estimate_total(conn, spec, filter_where, filter_args)
+    return Page([dict(r) for r in rows], next_cursor, total, estimated)
+
+
+def apply_page_headers(response: Response, page: Page):
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    response.headers["X-Total-Count"] = str(page.total)
+    response.headers["X-Total-Count-Estimated"] = "true" if page.total_estimated else "false"
@@ -2,6 +2,12 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 # Import the functions directly from the db.db module
 from db.db import connect_to_mongo, close_mongo_connection, connect_to_pg, close_pg_connection
+from db.migrations import run_startup_migrations
+from db.log_writer import user_actions_log_writer
+from db.log_partitions import start_log_partition_maintenance, stop_log_partition_maintenance
+from stations.rollups import start_rollup_engine, stop_rollup_engine
+from stations.device_registry import device_registry
+from config.change_feed import config_change_feed
 from stations.router import router as stations_router
 from stations.admin_router import router as admin_stations_router
 from auth.router import router as auth_router, setup_default_admin
@@ -12,6 +18,7 @@ from complaints.router import router as complaints_router
 from config.router import router as config_router
 from config.ads_router import router as ads_config_router
 from config.app_settings_router import router as app_settings_router
+from config.changes_router import router as config_changes_router
 from stations.postgresql_analytics_router import router as pg_analytics_router
 from premium.router import router as premium_router
 from premium.premium_users_router import router as premium_users_admin_router
@@ -38,8 +45,9 @@ from hindiflacs.hindiflacs_to_blomp import router as hindiflacs_to_blomp
 
 from mail.automate_login_blomp import router as automate_login_blomp
 from mail.bulkmailcreation import router as bulkmailcreation
-from ai_assistant.ai_router import router as ai_router
+from ai_assistant.ai_router import router as ai_router, ensure_chat_indexes, chat_summarizer
 from ai_assistant.top10songs import router as top10_songs
+from ai_assistant.top_songs_snapshots import start_top_songs_refresh, stop_top_songs_refresh
 from radiobrowserinfo.parseradiostations import  router as radio_browser_stations
 from stations.extract_lang_table import  router as extract_lang
 from stations.languages import  router as languages_router
@@ -52,11 +60,26 @@ async def lifespan(app: FastAPI):
     # 1. Logic to run on startup (before the app starts)
     print("Application Startup: Connecting to Mongo and PG...")
     await connect_to_mongo()
+    await ensure_chat_indexes()
     await connect_to_pg()
+    await run_startup_migrations()
+    await start_log_partition_maintenance()
     await setup_default_admin()
+    await user_actions_log_writer.start()
+    await start_rollup_engine()
+    await device_registry.start()
+    await config_change_feed.start()
+    await start_top_songs_refresh()
     yield # <-- Application is now running and serving requests
     # 2. Logic to run on shutdown (when the app shuts down)
-    print("Application Shutdown: Closing DB connections...")
+    print("Application Shutdown: Flushing buffered logs and closing DB connections...")
+    await config_change_feed.stop()
+    await stop_top_songs_refresh()
+    await chat_summarizer.drain()
+    await stop_rollup_engine()
+    await device_registry.stop()
+    await user_actions_log_writer.stop()
+    await stop_log_partition_maintenance()
     await close_pg_connection()
     await close_mongo_connection()
 
@@ -73,6 +96,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # GET, POST, PUT, DELETE, OPTIONS
     allow_headers=["*"],  # Authorization, Content-Type, etc.
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated"],  # db/pagination.py
 )
 app.include_router(auth_router)
 app.include_router(automate_login_blomp)
@@ -85,6 +109,7 @@ app.include_router(complaints_router)
 app.include_router(config_router)
 app.include_router(ads_config_router)
 app.include_router(app_settings_router)
+app.include_router(config_changes_router)
 app.include_router(pg_analytics_router)
 app.include_router(masstelugu_router)
 app.include_router(masstamilan_router)
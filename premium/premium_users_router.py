@@ -1,32 +1,104 @@
+import csv
+import io
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any, List
+from datetime import datetime, timezone
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
 from db.db import get_pg_pool
+from db.pagination import ListFilter, ListSpec, apply_page_headers, fetch_page
 from auth.dependencies import verify_admin_token
+from premium.router import (
+    PLAIN_KEY_ATTEMPTS, allocate_plain_keys, encrypt_licenses, invalidate_license_cache, is_plain_key_conflict,
+)
 import json as py_json
 
 router = APIRouter(prefix="/premium-users-admin", tags=["Premium Users Admin"], dependencies=[Depends(verify_admin_token)])
 
+# Linked devices live in premium_devices; the admin UI still receives them as
+# the ``active_devices`` list it always has.
+_PREMIUM_USER_COLUMNS = """
+    u.id, u.plain_key, u.license_key, u.created_at,
+    COALESCE(
+        (SELECT jsonb_agg(d.device_id ORDER BY d.added_at) FROM premium_devices d WHERE d.license_id = u.id),
+        '[]'::jsonb
+    ) AS active_devices
+"""
+
+PREMIUM_USERS_LIST = ListSpec(
+    table="premium_users u",
+    columns=_PREMIUM_USER_COLUMNS,
+    sorts={"id": "u.id", "created_at": "u.created_at"},
+    default_sort="id",
+    filters={
+        "plain_key": ListFilter("u.plain_key"),
+        "license_key": ListFilter("u.license_key"),
+        "device_id": ListFilter(template="u.id IN (SELECT license_id FROM premium_devices WHERE device_id = ${n})"),
+    },
+    id_column="u.id",
+    default_limit=500,
+    max_limit=1000,
+    not_null_sorts=("created_at",),
+)
+
+PREMIUM_USER_COPY_COLUMNS = ("id", "plain_key", "license_key", "active_devices", "created_at")
+PREMIUM_DEVICE_COPY_COLUMNS = ("license_id", "device_id", "added_at")
+BULK_GENERATE_MAX = 10_000
+IMPORT_MAX_ROWS = 50_000
+EXPORT_FETCH_SIZE = 1000
+
+class BulkGenerateRequest(BaseModel):
+    count: int = Field(..., ge=1, le=BULK_GENERATE_MAX)
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
+def _serialize_user(row) -> Dict[str, Any]:
+    d = dict(row)
+    d["active_devices"] = py_json.loads(d["active_devices"]) if isinstance(d.get("active_devices"), str) else (d.get("active_devices") or [])
+    if d.get("created_at"):
+        d["created_at"] = str(d["created_at"])
+    return d
+
+async def _replace_devices(conn, license_id: str, devices: List[str]) -> List[str]:
+    devices = list(dict.fromkeys(str(d) for d in devices or []))
+    await conn.execute(
+        "DELETE FROM premium_devices WHERE license_id = $1 AND NOT (device_id = ANY($2::text[]))",
+        license_id, devices,
+    )
+    await conn.execute("""
+        INSERT INTO premium_devices (license_id, device_id)
+        SELECT $1, device_id FROM unnest($2::text[]) AS t(device_id)
+        ON CONFLICT (license_id, device_id) DO NOTHING
+    """, license_id, devices)
+    return devices
+
 @router.get("/", summary="Get all Premium Users")
-async def get_premium_users():
+async def get_premium_users(
+    response: Response,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    plain_key: Optional[str] = None,
+    license_key: Optional[str] = None,
+    device_id: Optional[str] = None,
+):
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM premium_users ORDER BY id DESC LIMIT 500")
-            out = []
-            for row in rows:
-                d = dict(row)
-                if isinstance(d.get("created_at"), str) is False and d.get("created_at") is not None:
-                    d["created_at"] = str(d["created_at"])
-                if isinstance(d.get("active_devices"), str):
-                    d["active_devices"] = py_json.loads(d["active_devices"])
-                out.append(d)
-            return out
+            page = await fetch_page(
+                conn, PREMIUM_USERS_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={"plain_key": plain_key, "license_key": license_key, "device_id": device_id},
+            )
+        apply_page_headers(response, page)
+        return [_serialize_user(row) for row in page.items]
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -38,17 +110,17 @@ async def create_premium_user(user: Dict[Any, Any]):
     try:
         new_id = _generate_id()
         async with pool.acquire() as conn:
-            await conn.execute("""
-                INSERT INTO premium_users (id, plain_key, license_key, active_devices, created_at)
-                VALUES ($1, $2, $3, $4, $5)
-            """, new_id, user.get("plain_key"), user.get("license_key"), py_json.dumps(user.get("active_devices", [])), user.get("created_at"))
-            row = await conn.fetchrow("SELECT * FROM premium_users WHERE id = $1", new_id)
-            d = dict(row)
-            d["active_devices"] = py_json.loads(d["active_devices"]) if isinstance(d.get("active_devices"), str) else []
-            if d.get("created_at"):
-                d["created_at"] = str(d["created_at"])
-            return d
+            async with conn.transaction():
+                row = await conn.fetchrow("""
+                    INSERT INTO premium_users (id, plain_key, license_key, active_devices, created_at)
+                    VALUES ($1, $2, $3, '[]'::jsonb, $4)
+                    RETURNING id, plain_key, license_key, created_at
+                """, new_id, user.get("plain_key"), user.get("license_key"), _parse_import_created_at(user.get("created_at")))
+                devices = await _replace_devices(conn, new_id, user.get("active_devices", []))
+        return _serialize_user({**dict(row), "active_devices": devices})
     except Exception as exc:
+        if is_plain_key_conflict(exc):
+            raise HTTPException(status_code=409, detail=f"plain_key '{user.get('plain_key')}' is already in use.")
         raise HTTPException(status_code=500, detail=str(exc))
 
 @router.put("/{user_id}", summary="Update an existing Premium User")
@@ -58,22 +130,30 @@ async def update_premium_user(user_id: str, user: Dict[Any, Any]):
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            exists = await conn.fetchval("SELECT 1 FROM premium_users WHERE id = $1", user_id)
-            if not exists:
-                raise HTTPException(status_code=404, detail="Premium User not found.")
-            await conn.execute("""
-                UPDATE premium_users 
-                SET plain_key = $1, license_key = $2, active_devices = $3
-                WHERE id = $4
-            """, user.get("plain_key"), user.get("license_key"), py_json.dumps(user.get("active_devices", [])), user_id)
-            
-            row = await conn.fetchrow("SELECT * FROM premium_users WHERE id = $1", user_id)
-            d = dict(row)
-            d["active_devices"] = py_json.loads(d["active_devices"]) if isinstance(d.get("active_devices"), str) else []
-            if d.get("created_at"):
-                d["created_at"] = str(d["created_at"])
-            return d
+            async with conn.transaction():
+                existing = await conn.fetchrow("SELECT license_key FROM premium_users WHERE id = $1 FOR UPDATE", user_id)
+                if not existing:
+                    raise HTTPException(status_code=404, detail="Premium User not found.")
+                old_license_key = existing["license_key"]
+                await conn.execute("""
+                    UPDATE premium_users 
+                    SET plain_key = $1, license_key = $2
+                    WHERE id = $3
+                """, user.get("plain_key"), user.get("license_key"), user_id)
+                await _replace_devices(conn, user_id, user.get("active_devices", []))
+
+            row = await conn.fetchrow(f"SELECT {_PREMIUM_USER_COLUMNS} FROM premium_users u WHERE u.id = $1", user_id)
+
+        # Device list or key may have changed; cached verifications are stale.
+        await invalidate_license_cache(old_license_key)
+        await invalidate_license_cache(user.get("license_key"))
+
+        return _serialize_user(row)
+    except HTTPException:
+        raise
     except Exception as exc:
+        if is_plain_key_conflict(exc):
+            raise HTTPException(status_code=409, detail=f"plain_key '{user.get('plain_key')}' is already in use.")
         raise HTTPException(status_code=500, detail=str(exc))
 
 @router.delete("/{user_id}", summary="Delete a Premium User")
@@ -83,9 +163,187 @@ async def delete_premium_user(user_id: str):
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            result = await conn.execute("DELETE FROM premium_users WHERE id = $1", user_id)
-            if result == "DELETE 0":
+            # premium_devices rows go with it (ON DELETE CASCADE).
+            deleted = await conn.fetchrow("DELETE FROM premium_users WHERE id = $1 RETURNING license_key", user_id)
+            if deleted is None:
                 raise HTTPException(status_code=404, detail="Premium User not found")
+        await invalidate_license_cache(deleted["license_key"])
         return {"success": True}
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
+
+# ── Bulk operations ─────────────────────────────────────────────────────────
+
+@router.post("/bulk-generate", summary="Generate many license keys at once")
+async def bulk_generate_keys(body: BulkGenerateRequest):
+    pool = get_pg_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database not connected.")
+
+    created_at = datetime.utcnow()
+    try:
+        async with pool.acquire() as conn:
+            for attempt in range(PLAIN_KEY_ATTEMPTS):
+                plain_keys = await allocate_plain_keys(conn, body.count)
+                records = [
+                    (_generate_id(), plain, encrypted, "[]", created_at)
+                    for plain, encrypted in zip(plain_keys, encrypt_licenses(plain_keys))
+                ]
+                try:
+                    await conn.copy_records_to_table("premium_users", records=records, columns=PREMIUM_USER_COPY_COLUMNS)
+                    break
+                except Exception as exc:
+                    # Another request took one of the keys since the check.
+                    if not is_plain_key_conflict(exc) or attempt == PLAIN_KEY_ATTEMPTS - 1:
+                        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    return {
+        "status": "success",
+        "count": len(records),
+        "keys": [
+            {"id": r[0], "plain_key_for_admin": r[1], "encrypted_license": r[2]}
+            for r in records
+        ],
+    }
+
+def _parse_import_devices(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = py_json.loads(value) if value.lstrip().startswith("[") else value.split(";")
+    return list(dict.fromkeys(str(d).strip() for d in value if str(d).strip()))
+
+def _parse_import_text(row: Dict[str, Any], field: str) -> str:
+    value = row.get(field)
+    if value is None:
+        return ""
+    # NDJSON numbers are taken as text; objects, arrays and booleans are not keys.
+    if isinstance(value, (dict, list, bool)):
+        raise ValueError(f"{field} must be a string.")
+    return str(value).strip()
+
+def _parse_import_created_at(value) -> datetime:
+    if not value:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    # premium_users.created_at is a naive UTC TIMESTAMP.
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def _read_import_rows(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    text = body.decode("utf-8-sig")
+    if "csv" in content_type:
+        return list(csv.DictReader(io.StringIO(text)))
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [orjson.loads(line) for line in text.splitlines() if line.strip()]
+    raise HTTPException(status_code=415, detail="Use Content-Type text/csv or application/x-ndjson.")
+
+@router.post("/import", summary="Bulk import premium users from CSV or NDJSON")
+async def import_premium_users(request: Request):
+    """
+    Each row needs ``plain_key``; ``license_key`` is derived from it when
+    absent.  ``active_devices`` may be a JSON array or a ``;``-separated
+    list, ``created_at`` an ISO timestamp.  Rows are written with COPY in a
+    single transaction, so a bad row imports nothing.
+    """
+    pool = get_pg_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database not connected.")
+
+    try:
+        rows = _read_import_rows(await request.body(), request.headers.get("content-type", ""))
+    except HTTPException:
+        raise
+    except (UnicodeDecodeError, orjson.JSONDecodeError, csv.Error) as exc:
+        raise HTTPException(status_code=400, detail=f"Could not parse import body: {exc}")
+
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many rows: {len(rows)} (max {IMPORT_MAX_ROWS}).")
+
+    parsed = []
+    for line_no, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise HTTPException(status_code=422, detail=f"Row {line_no}: expected an object.")
+        try:
+            plain_key = _parse_import_text(row, "plain_key")
+            if not plain_key:
+                raise ValueError("plain_key is required.")
+            parsed.append((
+                plain_key,
+                _parse_import_text(row, "license_key") or None,
+                _parse_import_devices(row.get("active_devices")),
+                _parse_import_created_at(row.get("created_at")),
+            ))
+        except (ValueError, TypeError) as exc:
+            raise HTTPException(status_code=422, detail=f"Row {line_no}: {exc}")
+
+    missing = [i for i, p in enumerate(parsed) if p[1] is None]
+    derived = encrypt_licenses([parsed[i][0] for i in missing])
+    license_keys = [p[1] for p in parsed]
+    for i, encrypted in zip(missing, derived):
+        license_keys[i] = encrypted
+
+    added_at = datetime.now(timezone.utc)
+    user_records, device_records = [], []
+    for (plain_key, _, devices, created_at), license_key in zip(parsed, license_keys):
+        user_id = _generate_id()
+        user_records.append((user_id, plain_key, license_key, "[]", created_at))
+        device_records.extend((user_id, device_id, added_at) for device_id in devices)
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_records_to_table("premium_users", records=user_records, columns=PREMIUM_USER_COPY_COLUMNS)
+                if device_records:
+                    await conn.copy_records_to_table("premium_devices", records=device_records, columns=PREMIUM_DEVICE_COPY_COLUMNS)
+    except Exception as exc:
+        if is_plain_key_conflict(exc):
+            raise HTTPException(status_code=409, detail=f"A plain_key is already in use: {exc.detail or exc}")
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    return {"status": "success", "imported": len(user_records), "devices": len(device_records)}
+
+async def _export_rows(fmt: str):
+    pool = get_pg_pool()
+    fields = ["id", "plain_key", "license_key", "active_devices", "created_at"]
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        yield buf.getvalue().encode("utf-8")
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            cursor = conn.cursor(
+                f"SELECT {_PREMIUM_USER_COLUMNS} FROM premium_users u ORDER BY u.id",
+                prefetch=EXPORT_FETCH_SIZE,
+            )
+            chunk: List[bytes] = []
+            async for row in cursor:
+                d = _serialize_user(row)
+                if fmt == "csv":
+                    buf.seek(0)
+                    buf.truncate()
+                    writer.writerow([d[f] if f != "active_devices" else ";".join(d[f]) for f in fields])
+                    chunk.append(buf.getvalue().encode("utf-8"))
+                else:
+                    chunk.append(orjson.dumps(d) + b"\n")
+                if len(chunk) >= EXPORT_FETCH_SIZE:
+                    yield b"".join(chunk)
+                    chunk = []
+            if chunk:
+                yield b"".join(chunk)
+
+@router.get("/export", summary="Stream all premium users as NDJSON or CSV")
+async def export_premium_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    if get_pg_pool() is None:
+        raise HTTPException(status_code=503, detail="Database not connected.")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="premium_users.{format}"'},
+    )
@@ -1,16 +1,28 @@
 import base64
+import hashlib
 import json
+import os
+import time
 import uuid
 from datetime import datetime
+from typing import List, Optional
+import asyncpg
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from db.db import get_pg_pool, SECRET_KEY, FIXED_IV
+from db.log_writer import user_actions_log_writer, user_action_record
+from db.redis_config import r_async
 import json as py_json
 
 router = APIRouter()
 
+LICENSE_CACHE_TTL = int(os.getenv("LICENSE_CACHE_TTL", 300))
+MAX_DEVICES_PER_LICENSE = 3
+# Inserts retried when a freshly allocated plain_key was taken concurrently.
+PLAIN_KEY_ATTEMPTS = 3
+
 
 # --- Security Helpers ---
 
@@ -22,19 +34,113 @@ def encrypt_license(plain_key: str):
     return base64.b64encode(encrypted_bytes).decode("utf-8")
 
 
+def encrypt_licenses(plain_keys: List[str]) -> List[str]:
+    """Bulk encrypt_license()."""
+    return [encrypt_license(plain_key) for plain_key in plain_keys]
+
+
+def generate_plain_keys(count: int) -> List[str]:
+    """``count`` distinct 6-character keys in the generate-key format."""
+    keys = set()
+    while len(keys) < count:
+        keys.add(uuid.uuid4().hex[:6].upper())
+    return list(keys)
+
+
+async def allocate_plain_keys(conn, count: int) -> List[str]:
+    """
+    ``count`` distinct keys that no premium_users row uses yet.  A concurrent
+    insert can still take one before ours commits; premium_users_plain_key_uidx
+    rejects that, and callers retry (see is_plain_key_conflict).
+    """
+    keys = set()
+    while len(keys) < count:
+        candidates = set(generate_plain_keys(count - len(keys))) - keys
+        taken = await conn.fetch(
+            "SELECT plain_key FROM premium_users WHERE plain_key = ANY($1::text[])", list(candidates)
+        )
+        keys |= candidates - {r["plain_key"] for r in taken}
+    return list(keys)
+
+
+def is_plain_key_conflict(exc: Exception) -> bool:
+    return (
+        isinstance(exc, asyncpg.UniqueViolationError)
+        and getattr(exc, "constraint_name", None) == "premium_users_plain_key_uidx"
+    )
+
+
 def decrypt_payload(encrypted_text: str):
     """Decrypts the full request payload containing device info and encrypted key."""
     try:
         cipher = AES.new(SECRET_KEY, AES.MODE_CBC, FIXED_IV)
-        print(f"ciphertext: {encrypted_text},cipher: {cipher}")
         decrypted = unpad(cipher.decrypt(base64.b64decode(encrypted_text)), AES.block_size)
-        print(f"decrypted: {decrypted}")
-        print(f"jsondecrypted: {json.loads(decrypted.decode('utf-8'))}")
         return json.loads(decrypted.decode("utf-8"))
     except Exception:
         raise HTTPException(status_code=400, detail="Data decryption failed.")
 
 
+# --- Verification cache ---
+# (license_key, device_id) pairs that verified successfully are remembered in
+# Redis for LICENSE_CACHE_TTL seconds so repeat checks skip PostgreSQL.
+# One hash per license maps device_id → expiry (epoch seconds), so
+# remove-device and the premium-users admin endpoints invalidate with a
+# single HDEL / DEL.
+
+def _license_digest(license_key: str) -> str:
+    return hashlib.sha256(license_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _license_cache_key(license_key: str) -> str:
+    return f"license_verified:{_license_digest(license_key)}"
+
+
+async def _is_verification_cached(license_key: str, device_id: str) -> bool:
+    if r_async is None:
+        return False
+    try:
+        expires = await r_async.hget(_license_cache_key(license_key), device_id)
+        return expires is not None and float(expires) > time.time()
+    except Exception as e:
+        print(f"⚠️ Redis read error (license cache): {e}")
+        return False
+
+
+async def _cache_verification(license_key: str, device_id: str):
+    if r_async is None:
+        return
+    key = _license_cache_key(license_key)
+    try:
+        # Field expiry is checked on read; the hash itself goes away once no
+        # device of the license has verified for LICENSE_CACHE_TTL.
+        async with r_async.pipeline(transaction=False) as pipe:
+            pipe.hset(key, device_id, int(time.time()) + LICENSE_CACHE_TTL)
+            pipe.expire(key, LICENSE_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Redis write error (license cache): {e}")
+
+
+async def invalidate_license_cache(license_key: Optional[str], device_id: Optional[str] = None):
+    """Drop cached verifications for one device, or for every device of a license."""
+    if r_async is None or not license_key:
+        return
+    try:
+        if device_id is not None:
+            await r_async.hdel(_license_cache_key(license_key), device_id)
+        else:
+            await r_async.delete(_license_cache_key(license_key))
+    except Exception as e:
+        print(f"⚠️ Redis delete error (license cache): {e}")
+
+
+def _audit(device_id: str, event: str, details: Optional[dict] = None):
+    """Queue a user_actions_logs audit row on the write-behind log writer."""
+    record = user_action_record(device_id, event, details, datetime.utcnow().isoformat())
+    if not user_actions_log_writer.submit(record):
+        print(f"⚠️ Audit log dropped (buffer full): {device_id} | {event}")
+
+
 # --- Models ---
 
 class EncryptedRequest(BaseModel):
@@ -50,15 +156,21 @@ async def generate_key():
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
         
-    plain_key = uuid.uuid4().hex[:6].upper()
-    encrypted_license = encrypt_license(plain_key)
     new_id = uuid.uuid4().hex[:24]
 
     async with pool.acquire() as conn:
-        await conn.execute("""
-            INSERT INTO premium_users (id, plain_key, license_key, active_devices, created_at)
-            VALUES ($1, $2, $3, $4, $5)
-        """, new_id, plain_key, encrypted_license, py_json.dumps([]), datetime.utcnow())
+        for attempt in range(PLAIN_KEY_ATTEMPTS):
+            plain_key = (await allocate_plain_keys(conn, 1))[0]
+            encrypted_license = encrypt_license(plain_key)
+            try:
+                await conn.execute("""
+                    INSERT INTO premium_users (id, plain_key, license_key, active_devices, created_at)
+                    VALUES ($1, $2, $3, $4, $5)
+                """, new_id, plain_key, encrypted_license, py_json.dumps([]), datetime.utcnow())
+                break
+            except asyncpg.UniqueViolationError as exc:
+                if not is_plain_key_conflict(exc) or attempt == PLAIN_KEY_ATTEMPTS - 1:
+                    raise
 
     return {
         "status": "success",
@@ -69,44 +181,45 @@ async def generate_key():
 
 @router.post("/verify-license")
 async def verify_license(request: EncryptedRequest):
-    """Validates the encrypted key directly against the DB."""
+    """
+    Validates the encrypted key directly against the DB.
+
+    Linked devices live in premium_devices; a new device is linked by one
+    atomic conditional insert, so concurrent verifications cannot push a
+    license past MAX_DEVICES_PER_LICENSE.
+
+    Devices verified within the last LICENSE_CACHE_TTL seconds are answered
+    from the Redis verification cache; audit rows go through the batched
+    log writer instead of blocking the response.
+    """
     data = decrypt_payload(request.payload)
-    print(f"{data.get('device_id')} | {data.get('license_key')}")
+    license_key, device_id = data["license_key"], data["device_id"]
+
+    if await _is_verification_cached(license_key, device_id):
+        _audit(device_id, "Global ads enabled: false", {"action": "verified", "cached": True})
+        return {"status": "success", "is_premium": True}
 
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
 
+    # link_premium_device (db/migrations.py) locks the license row and inserts
+    # the device only while fewer than MAX_DEVICES_PER_LICENSE are linked.
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT active_devices FROM premium_users WHERE license_key = $1", data["license_key"])
-
-        if not user:
-            await conn.execute("""
-                INSERT INTO user_actions_logs (device_id, event, client_timestamp)
-                VALUES ($1, $2, $3)
-            """, data["device_id"], "License verification failed: Encrypted key mismatch", datetime.utcnow().isoformat())
-            raise HTTPException(status_code=404, detail="License key not found.")
-
-        # In PostgreSQL, active_devices is JSONB string
-        active_devices_str = user["active_devices"]
-        active_devices = py_json.loads(active_devices_str) if isinstance(active_devices_str, str) else (active_devices_str or [])
-        print(f"active_devices: {active_devices}")
-
-        if data["device_id"] in active_devices or len(active_devices) < 3:
-            if data["device_id"] not in active_devices:
-                active_devices.append(data["device_id"])
-                await conn.execute("""
-                    UPDATE premium_users SET active_devices = $1 WHERE license_key = $2
-                """, py_json.dumps(active_devices), data["license_key"])
+        outcome = await conn.fetchval(
+            "SELECT link_premium_device($1, $2, $3)", license_key, device_id, MAX_DEVICES_PER_LICENSE
+        )
+
+    if outcome == "not_found":
+        _audit(device_id, "License verification failed: Encrypted key mismatch")
+        raise HTTPException(status_code=404, detail="License key not found.")
 
-            details = py_json.dumps({"action": "verified"})
-            await conn.execute("""
-                INSERT INTO user_actions_logs (device_id, event, details, client_timestamp)
-                VALUES ($1, $2, $3, $4)
-            """, data["device_id"], "Global ads enabled: false", details, datetime.utcnow().isoformat())
-            return {"status": "success", "is_premium": True}
+    if outcome == "limit":
+        raise HTTPException(status_code=403, detail="Device limit reached.")
 
-    raise HTTPException(status_code=403, detail="Device limit reached.")
+    _audit(device_id, "Global ads enabled: false", {"action": "verified"})
+    await _cache_verification(license_key, device_id)
+    return {"status": "success", "is_premium": True}
 
 @router.post("/list-devices")
 async def list_devices(request: EncryptedRequest):
@@ -117,14 +230,17 @@ async def list_devices(request: EncryptedRequest):
         raise HTTPException(status_code=503, detail="Database not connected.")
         
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT active_devices FROM premium_users WHERE license_key = $1", data["license_key"])
+        rows = await conn.fetch("""
+            SELECT d.device_id
+            FROM premium_users u
+            LEFT JOIN premium_devices d ON d.license_id = u.id
+            WHERE u.license_key = $1
+            ORDER BY d.added_at
+        """, data["license_key"])
 
-        if not user:
-            raise HTTPException(status_code=404, detail="License not found.")
-            
-        active_devices_str = user["active_devices"]
-        active_devices = py_json.loads(active_devices_str) if isinstance(active_devices_str, str) else (active_devices_str or [])
-        return {"active_devices": active_devices}
+    if not rows:
+        raise HTTPException(status_code=404, detail="License not found.")
+    return {"active_devices": [r["device_id"] for r in rows if r["device_id"] is not None]}
 
 @router.post("/remove-device")
 async def remove_device(request: EncryptedRequest):
@@ -135,17 +251,13 @@ async def remove_device(request: EncryptedRequest):
         raise HTTPException(status_code=503, detail="Database not connected.")
 
     async with pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT active_devices FROM premium_users WHERE license_key = $1", data["license_key"])
-        if user:
-            active_devices_str = user["active_devices"]
-            active_devices = py_json.loads(active_devices_str) if isinstance(active_devices_str, str) else (active_devices_str or [])
-            if data["device_id"] in active_devices:
-                active_devices.remove(data["device_id"])
-                await conn.execute("UPDATE premium_users SET active_devices = $1 WHERE license_key = $2", py_json.dumps(active_devices), data["license_key"])
-
         await conn.execute("""
-            INSERT INTO user_actions_logs (device_id, event, client_timestamp)
-            VALUES ($1, $2, $3)
-        """, data["device_id"], "Device unlinked", datetime.utcnow().isoformat())
-        
-    return {"status": "success", "message": "Device removed"}
\ No newline at end of file
+            DELETE FROM premium_devices d
+            USING premium_users u
+            WHERE d.license_id = u.id AND u.license_key = $1 AND d.device_id = $2
+        """, data["license_key"], data["device_id"])
+
+    await invalidate_license_cache(data["license_key"], data["device_id"])
+    _audit(data["device_id"], "Device unlinked")
+
+    return {"status": "success", "message": "Device removed"}
@@ -0,0 +1,102 @@
+"""
+Latency benchmark for POST /ai/chat and POST /ai/chat/stream.
+
+Run the API against the stub LLM (pythonutil/stub_llm_server.py), then:
+
+    python pythonutil/bench_ai_chat.py --url http://localhost:8000 --requests 200 --concurrency 20
+
+For each endpoint prints throughput, time-to-first-token (stream only) and
+total latency percentiles.  While the chat load runs, GET /serviceawake is
+probed every 50 ms; its latency shows whether the event loop stays
+responsive under LLM load.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def _pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[max(int(len(values) * p) - 1, 0)]
+
+
+def _summary(label, values):
+    if not values:
+        return f"{label}: n/a"
+    return (f"{label}: p50={statistics.median(values):.0f} p95={_pct(values, 0.95):.0f} "
+            f"p99={_pct(values, 0.99):.0f} max={max(values):.0f} ms")
+
+
+async def _probe(client, stop: asyncio.Event, out: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/serviceawake")
+        out.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def _one_plain(client, i):
+    started = time.perf_counter()
+    resp = await client.post("/ai/chat", json={"device_id": f"bench-{i}", "message": f"How do I remove ads? #{i}"})
+    return resp.status_code, None, (time.perf_counter() - started) * 1000
+
+
+async def _one_stream(client, i):
+    started = time.perf_counter()
+    ttft = None
+    status = None
+    async with client.stream(
+        "POST", "/ai/chat/stream", json={"device_id": f"bench-{i}", "message": f"Downloads not working #{i}"}
+    ) as resp:
+        status = resp.status_code
+        async for line in resp.aiter_lines():
+            if ttft is None and line.startswith("event: token"):
+                ttft = (time.perf_counter() - started) * 1000
+    return status, ttft, (time.perf_counter() - started) * 1000
+
+
+async def run(url: str, total: int, concurrency: int, mode: str):
+    sem = asyncio.Semaphore(concurrency)
+    one = _one_stream if mode == "stream" else _one_plain
+    ttfts, totals, probes, statuses = [], [], [], {}
+
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        async def task(i):
+            async with sem:
+                status, ttft, elapsed = await one(client, i)
+                statuses[status] = statuses.get(status, 0) + 1
+                totals.append(elapsed)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(_probe(client, stop, probes))
+        started = time.perf_counter()
+        await asyncio.gather(*(task(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    print(f"[{mode}] {total} requests, concurrency {concurrency}, statuses {statuses}")
+    print(f"  throughput: {total / elapsed:.1f} req/s")
+    if ttfts:
+        print("  " + _summary("first token", ttfts))
+    print("  " + _summary("total", totals))
+    print("  " + _summary("/serviceawake probe", probes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mode", choices=["plain", "stream", "both"], default="both")
+    args = parser.parse_args()
+    for mode in (["plain", "stream"] if args.mode == "both" else [args.mode]):
+        asyncio.run(run(args.url, args.requests, args.concurrency, mode))
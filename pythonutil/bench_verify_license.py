@@ -0,0 +1,80 @@
+"""
+Throughput benchmark for POST /premium/verify-license.
+
+Fires REQUESTS encrypted verify calls at a running server with CONCURRENCY
+in flight and prints requests/sec plus latency percentiles.  The first call
+per (license, device) misses the verification cache; the rest should hit it.
+
+Usage:
+    python pythonutil/bench_verify_license.py --url http://localhost:8000 \
+        --license-key <encrypted license_key> --devices 3 --requests 2000 --concurrency 50
+
+SECRET_KEY / FIXED_IV are read from the environment (.env), exactly as the
+server does.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import time
+
+import httpx
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _as_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def encrypt_payload(data: dict) -> str:
+    cipher = AES.new(_as_bytes(os.environ["SECRET_KEY"]), AES.MODE_CBC, _as_bytes(os.environ["FIXED_IV"]))
+    raw = json.dumps(data).encode("utf-8")
+    return base64.b64encode(cipher.encrypt(pad(raw, AES.block_size))).decode("utf-8")
+
+
+async def run(url: str, license_key: str, devices: int, total: int, concurrency: int):
+    payloads = [
+        {"payload": encrypt_payload({"license_key": license_key, "device_id": f"bench-device-{i}"})}
+        for i in range(devices)
+    ]
+    latencies = []
+    statuses = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        async def one(i: int):
+            async with sem:
+                started = time.perf_counter()
+                resp = await client.post("/premium/verify-license", json=payloads[i % devices])
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"requests:    {total} (concurrency {concurrency}, {devices} devices)")
+    print(f"statuses:    {statuses}")
+    print(f"throughput:  {total / elapsed:.1f} req/s")
+    print(f"latency ms:  p50={statistics.median(latencies):.1f} "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f} "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.1f} max={latencies[-1]:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--license-key", required=True, help="Encrypted license_key as stored in premium_users")
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.license_key, args.devices, args.requests, args.concurrency))
@@ -0,0 +1,177 @@
+"""
+Offline conversion of a large plain ``user_actions_logs`` table into the
+monthly-partitioned layout of db/migrations.py.
+
+The boot migration only converts small tables.  This script does the same
+conversion in steps that each hold a short lock, except the id widening:
+
+  1. backfill NULL created_at;
+  2. widen id to BIGINT if it is still INTEGER.  This rewrites the table
+     and blocks writes to it, so run it in a maintenance window (it is
+     skipped when id is already BIGINT);
+  3. add CHECK (created_at IS NOT NULL AND created_at < cutover) NOT VALID,
+     then VALIDATE it (no write lock);
+  4. build the (id, created_at) key and the device/event indexes
+     CONCURRENTLY;
+  5. swap in one short transaction: rename to user_actions_logs_legacy,
+     switch the primary key to the prebuilt index, create the partitioned
+     parent and ATTACH the legacy table.  The validated CHECK lets
+     SET NOT NULL and ATTACH skip their table scans.
+
+Every step is safe to re-run.  Afterwards restart the API: the boot
+migrations add the DEFAULT partition and db/log_partitions.py creates the
+monthly ones.
+
+Usage:
+    python pythonutil/partition_user_actions_logs.py
+
+POSTGRESQL_DATABASE_URL_TELUGUWAP is read from the environment (.env), the
+database the API's asyncpg pool uses.
+"""
+
+import os
+from datetime import datetime, timezone
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("POSTGRESQL_DATABASE_URL_TELUGUWAP")
+TABLE = "user_actions_logs"
+LEGACY = "user_actions_logs_legacy"
+
+
+def next_month_start() -> datetime:
+    now = datetime.now(timezone.utc)
+    index = now.year * 12 + now.month  # zero-based month index of next month
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def relkind(cur, name: str):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (f"public.{name}",))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def run(cur, label: str, sql: str, params=None):
+    print(f"→ {label}")
+    cur.execute(sql, params)
+
+
+def partition_user_actions_logs():
+    if not DATABASE_URL:
+        print("❌ POSTGRESQL_DATABASE_URL_TELUGUWAP is not set.")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        kind = relkind(cur, TABLE)
+        if kind == "p":
+            print(f"✅ {TABLE} is already partitioned.")
+            return
+        if kind != "r":
+            print(f"❌ {TABLE} does not exist (the boot migration creates it partitioned).")
+            return
+
+        cutover = next_month_start()
+        print(f"Converting {TABLE}; rows before {cutover.isoformat()} stay in {LEGACY}.")
+
+        run(cur, "backfill NULL created_at",
+            f"UPDATE {TABLE} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+        cur.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s AND column_name = 'id'
+        """, (TABLE,))
+        if cur.fetchone()[0] != "bigint":
+            print("⚠️ id is INTEGER: the next step rewrites the table and blocks writes until it finishes.")
+            run(cur, "widen id to BIGINT", f"ALTER TABLE {TABLE} ALTER COLUMN id TYPE BIGINT")
+        run(cur, "widen id sequence", f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq AS BIGINT")
+
+        cur.execute("""
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = %s::regclass AND conname = 'user_actions_logs_legacy_cutover'
+        """, (f"public.{TABLE}",))
+        if cur.fetchone() is None:
+            run(cur, "add cutover CHECK (NOT VALID)",
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT user_actions_logs_legacy_cutover "
+                f"CHECK (created_at IS NOT NULL AND created_at < %s) NOT VALID",
+                (cutover,))
+        run(cur, "validate cutover CHECK",
+            f"ALTER TABLE {TABLE} VALIDATE CONSTRAINT user_actions_logs_legacy_cutover")
+
+        # A failed CONCURRENTLY build leaves an INVALID index behind; drop it
+        # so the IF NOT EXISTS below rebuilds it.
+        for index, columns, unique in (
+                ("user_actions_logs_legacy_pkey", "(id, created_at)", True),
+                ("user_actions_logs_legacy_device_created_idx", "(device_id, created_at DESC)", False),
+                ("user_actions_logs_legacy_event_created_idx", "(event, created_at DESC)", False),
+        ):
+            cur.execute("""
+                SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+            """, (f"public.{index}",))
+            if cur.fetchone():
+                run(cur, f"drop invalid {index}", f"DROP INDEX CONCURRENTLY {index}")
+            run(cur, f"build {index}",
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS "
+                f"{index} ON {TABLE} {columns}")
+
+        conn.autocommit = False
+        cur.execute("SET LOCAL lock_timeout = '10s'")
+        cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                    (f"public.{TABLE}",))
+        old_pk = cur.fetchone()
+
+        run(cur, f"rename {TABLE} → {LEGACY}", f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+        # Free the parent's index names; CREATE INDEX on the parent adopts
+        # the prebuilt legacy indexes instead.
+        for name in ("device_created_idx", "event_created_idx"):
+            cur.execute(f"DROP INDEX IF EXISTS user_actions_logs_{name}")
+        if old_pk:
+            cur.execute(f'ALTER TABLE {LEGACY} DROP CONSTRAINT "{old_pk[0]}"')
+        run(cur, "switch primary key to (id, created_at)", f"""
+            ALTER TABLE {LEGACY}
+                ALTER COLUMN created_at SET NOT NULL,
+                ALTER COLUMN id DROP DEFAULT,
+                ADD CONSTRAINT user_actions_logs_legacy_pkey PRIMARY KEY USING INDEX user_actions_logs_legacy_pkey
+        """)
+        run(cur, "create partitioned parent", f"""
+            CREATE TABLE {TABLE} (
+                id BIGINT NOT NULL DEFAULT nextval('user_actions_logs_id_seq'),
+                device_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                details JSONB,
+                client_timestamp TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at)
+        """)
+        cur.execute(f"ALTER SEQUENCE user_actions_logs_id_seq OWNED BY {TABLE}.id")
+        run(cur, f"attach {LEGACY}",
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO (%s)",
+            (cutover,))
+        cur.execute(f"CREATE INDEX user_actions_logs_device_created_idx ON {TABLE} (device_id, created_at DESC)")
+        cur.execute(f"CREATE INDEX user_actions_logs_event_created_idx ON {TABLE} (event, created_at DESC)")
+        run(cur, "create DEFAULT partition",
+            f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+        conn.commit()
+        print(f"✅ {TABLE} is partitioned. Restart the API to create the monthly partitions.")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Conversion failed (already committed steps are kept and safe to re-run): {e}")
+        # Left on the plain table, the cutover CHECK would reject inserts
+        # once next month starts.
+        conn.autocommit = True
+        cur = conn.cursor()
+        if relkind(cur, TABLE) == "r":
+            cur.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS user_actions_logs_legacy_cutover")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    partition_user_actions_logs()
@@ -0,0 +1,124 @@
+"""
+Local stub of the Groq (OpenAI-compatible) chat completions API.
+
+Serves POST /openai/v1/chat/completions with configurable latency so the AI
+assistant can be exercised and benchmarked without a Groq key or quota:
+
+    python pythonutil/stub_llm_server.py --port 8090 --ttft-ms 400 --token-ms 25
+
+then run the API with
+
+    GROQ_API_KEY=stub GROQ_BASE_URL=http://127.0.0.1:8090 uvicorn main:app
+
+or, to keep Groq and use the stub as a failover provider,
+
+    LLM_STUB_BASE_URL=http://127.0.0.1:8090 uvicorn main:app
+
+Replies are deterministic ("Stub reply to: <last user message> ...") and
+``--rate-limit-every N`` answers every Nth request with a 429 to exercise
+backoff paths.
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import uuid
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Stub LLM")
+
+SETTINGS = {"ttft_ms": 300, "token_ms": 20, "tokens": 40, "rate_limit_every": 0}
+_request_counter = itertools.count(1)
+
+
+def _reply_tokens(messages) -> list:
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    words = f"Stub reply to: {last_user}".split()
+    filler = "GR Radio keeps your stations and downloads in sync across devices .".split()
+    while len(words) < SETTINGS["tokens"]:
+        words.extend(filler)
+    return [w + " " for w in words[:SETTINGS["tokens"]]]
+
+
+def _usage(messages, tokens) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens),
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    n = next(_request_counter)
+    every = SETTINGS["rate_limit_every"]
+    if every and n % every == 0:
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_exceeded"}},
+            headers={"retry-after": "1"},
+        )
+
+    messages = body.get("messages", [])
+    model = body.get("model", "stub-model")
+    tokens = _reply_tokens(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    await asyncio.sleep(SETTINGS["ttft_ms"] / 1000)
+
+    if not body.get("stream"):
+        await asyncio.sleep(SETTINGS["token_ms"] * len(tokens) / 1000)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(messages, tokens),
+        }
+
+    async def chunks():
+        def chunk(delta, finish_reason=None):
+            return b"data: " + orjson.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + b"\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk({"content": token})
+            await asyncio.sleep(SETTINGS["token_ms"] / 1000)
+        yield chunk({}, "stop")
+        yield b"data: [DONE]\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--ttft-ms", type=int, default=SETTINGS["ttft_ms"], help="Delay before the first token")
+    parser.add_argument("--token-ms", type=int, default=SETTINGS["token_ms"], help="Delay between tokens")
+    parser.add_argument("--tokens", type=int, default=SETTINGS["tokens"], help="Tokens per reply")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Return 429 on every Nth request (0 = never)")
+    args = parser.parse_args()
+    SETTINGS.update(
+        ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=args.tokens, rate_limit_every=args.rate_limit_every
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
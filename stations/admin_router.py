@@ -1,25 +1,71 @@
 import uuid
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import Dict, Any, Optional
 from db.db import get_pg_pool
+from db.pagination import ListFilter, ListSpec, apply_page_headers, fetch_page
 from auth.dependencies import verify_admin_token
 
 router = APIRouter(prefix="/admin-stations", tags=["Admin Stations"], dependencies=[Depends(verify_admin_token)])
 
+RADIO_STATIONS_LIST = ListSpec(
+    table="radio_stations",
+    sorts={"id": "id", "name": "name", "language": "language", "page": "page"},
+    default_sort="id",
+    filters={
+        "language": ListFilter("language"),
+        "genre": ListFilter("genre"),
+        "page": ListFilter("page"),
+        "name": ListFilter("name", "contains"),
+    },
+    default_limit=3000,
+    max_limit=3000,
+)
+
+RADIO_GARDEN_LIST = ListSpec(
+    table="radio_garden_channels",
+    sorts={"id": "id", "name": "name", "country": "country", "language": "language"},
+    default_sort="id",
+    filters={
+        "country": ListFilter("country"),
+        "state": ListFilter("state"),
+        "language": ListFilter("language"),
+        "genre": ListFilter("genre"),
+        "name": ListFilter("name", "contains"),
+    },
+    default_limit=3000,
+    max_limit=3000,
+)
+
 def _generate_id():
     return uuid.uuid4().hex[:24]
 
 # ---- Radio Stations (App Default) endpoints ----
 
 @router.get("/radio-stations", summary="Get all regular Radio Stations")
-async def get_radio_stations():
+async def get_radio_stations(
+    response: Response,
+    limit: int = 3000,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    language: Optional[str] = None,
+    genre: Optional[str] = None,
+    page: Optional[str] = None,
+    name: Optional[str] = Query(None, description="Case-insensitive substring match"),
+):
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM radio_stations ORDER BY id DESC LIMIT 3000")
-            return [dict(row) for row in rows]
+            result = await fetch_page(
+                conn, RADIO_STATIONS_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={"language": language, "genre": genre, "page": page, "name": name},
+            )
+        apply_page_headers(response, result)
+        return result.items
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -90,14 +136,31 @@ async def delete_radio_station(station_id: str):
 # ---- Radio Garden Channels endpoints ----
 
 @router.get("/radio-garden", summary="Get all Radio Garden Stations")
-async def get_radio_garden_stations():
+async def get_radio_garden_stations(
+    response: Response,
+    limit: int = 3000,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    country: Optional[str] = None,
+    state: Optional[str] = None,
+    language: Optional[str] = None,
+    genre: Optional[str] = None,
+    name: Optional[str] = Query(None, description="Case-insensitive substring match"),
+):
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database not connected.")
     try:
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM radio_garden_channels ORDER BY id DESC LIMIT 3000")
-            return [dict(row) for row in rows]
+            result = await fetch_page(
+                conn, RADIO_GARDEN_LIST, limit=limit, cursor=cursor, sort=sort, order=order,
+                filters={"country": country, "state": state, "language": language, "genre": genre, "name": name},
+            )
+        apply_page_headers(response, result)
+        return result.items
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Optional, Dict, Any, List
 from db.db import get_pg_pool
+from db.log_writer import (
+    USER_ACTIONS_LOG_COLUMNS,
+    user_actions_log_writer,
+    user_action_record,
+)
 from db.redis_config import r_async, CACHE_TTL
 from config.ads_config_normalize import (
-    sanitize_ads_document_for_storage,
     expand_for_analytics_client,
-    replace_sanitized_ads_doc,
+    merge_ads_doc_atomic,
 )
+from auth.dependencies import verify_admin_token
+from stations.rollups import query_rollups
+from stations.device_registry import device_registry
 import orjson
 
+try:
+    import zstandard
+except ImportError:  # zstd request bodies are optional
+    zstandard = None
+
 router = APIRouter(
     prefix="/analytics",
     tags=["Analytics"],
@@ -118,6 +133,13 @@ class LogEntry(BaseModel):
     timestamp: str
 
 
+_log_entry_list = TypeAdapter(List[LogEntry])
+
+# Limits for POST /analytics/log/batch
+LOG_BATCH_MAX_ENTRIES = int(os.getenv("LOG_BATCH_MAX_ENTRIES", 1000))
+LOG_BATCH_MAX_BYTES = int(os.getenv("LOG_BATCH_MAX_BYTES", 2 * 1024 * 1024))
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Internal helpers
 # ─────────────────────────────────────────────────────────────────────────────
@@ -175,6 +197,63 @@ async def invalidate_ads_config_cache(screen: str | None = None):
         await _invalidate_cache("ads_config:global")
 
 
+async def _read_log_batch_body(request: Request) -> bytes:
+    """
+    Read a batch body as it arrives, answering 413 as soon as it passes
+    LOG_BATCH_MAX_BYTES (before decoding; the decoded size is checked too).
+    """
+    limit = LOG_BATCH_MAX_BYTES
+    too_large = HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes.")
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            declared = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header.")
+        if declared > limit:
+            raise too_large
+
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _decode_log_batch_body(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """
+    Undo gzip/zstd Content-Encoding on a batch body, refusing anything that
+    inflates past LOG_BATCH_MAX_BYTES.
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    limit = LOG_BATCH_MAX_BYTES
+
+    try:
+        if encoding in ("identity", ""):
+            out = body
+        elif encoding == "gzip":
+            inflater = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            out = inflater.decompress(body, limit + 1)
+        elif encoding == "zstd":
+            if zstandard is None:
+                raise HTTPException(status_code=415, detail="zstd encoding is not supported on this server.")
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                out = reader.read(limit + 1)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding '{encoding}'.")
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Could not decode {encoding} request body.")
+
+    if len(out) > limit:
+        raise HTTPException(status_code=413, detail=f"Decoded batch exceeds {limit} bytes.")
+    return out
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # READ endpoints
 # ─────────────────────────────────────────────────────────────────────────────
@@ -279,23 +358,11 @@ async def upsert_global_ads_config(payload: GlobalAdsConfigUpsert):
     if pool is None:
         raise HTTPException(status_code=503, detail="Database connection failed.")
 
-    update_doc = {"ads_enabled": payload.ads_enabled}
-    import uuid
-
-    async with pool.acquire() as conn:
-        exists = await conn.fetchval("SELECT id FROM ads_config WHERE screen = 'global'")
-        if exists:
-            # We must load, update, save
-            row = await conn.fetchrow("SELECT ads_data FROM ads_config WHERE id = $1", exists)
-            d = orjson.loads(row["ads_data"]) if isinstance(row["ads_data"], str) else (dict(row.get("ads_data") or {}))
-            d["ads_enabled"] = payload.ads_enabled
-            await conn.execute("UPDATE ads_config SET ads_data = $1 WHERE id = $2", orjson.dumps(d).decode(), exists)
-        else:
-            await conn.execute("INSERT INTO ads_config (id, screen, ads_data) VALUES ($1, 'global', $2)", uuid.uuid4().hex[:24], orjson.dumps(update_doc).decode())
+    final = await merge_ads_doc_atomic(pool, "global", {"ads_enabled": payload.ads_enabled})
 
     await _invalidate_cache("ads_config:global")
 
-    return update_doc
+    return {"ads_enabled": final.get("ads_enabled", payload.ads_enabled)}
 
 
 @router.put("/ads/{screen}", response_model=ScreenAdsConfig)
@@ -305,7 +372,7 @@ async def upsert_screen_ads_config(screen: str, payload: AdsConfigUpsert):
 
     Only fields present in the request body are written — absent fields
     keep their existing database values (partial update / PATCH semantics
-    implemented via $set).
+    implemented as a single INSERT … ON CONFLICT (screen) DO UPDATE).
 
     Invalidates the Redis cache for the screen on success.
 
@@ -350,52 +417,9 @@ async def upsert_screen_ads_config(screen: str, payload: AdsConfigUpsert):
     if pool is None:
         raise HTTPException(status_code=503, detail="Database connection failed.")
 
-    # Build $set payload from only the provided (non-None) fields.
-    set_fields: dict = {"screen": screen}
-
-    payload_dict = payload.dict(exclude_none=True)
-    for field, value in payload_dict.items():
-        if isinstance(value, dict):
-            for sub_key, sub_val in value.items():
-                set_fields[f"{field}.{sub_key}"] = sub_val
-        else:
-            set_fields[field] = value
-
-    import uuid
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT * FROM ads_config WHERE screen = $1", screen)
-        if row:
-            oid = row["id"]
-            d = orjson.loads(row["ads_data"]) if isinstance(row["ads_data"], str) else (dict(row.get("ads_data") or {}))
-            for k, v in set_fields.items():
-                if "." in k:
-                    parent, child = k.split(".")
-                    if parent not in d:
-                        d[parent] = {}
-                    d[parent][child] = v
-                else:
-                    d[k] = v
-            # Now we use the sanitize method which expects a whole mongodb-like doc
-            sanitized = sanitize_ads_document_for_storage({**d, "screen": screen})
-            await replace_sanitized_ads_doc(pool, oid, sanitized)
-        else:
-            oid = uuid.uuid4().hex[:24]
-            d = {}
-            for k, v in set_fields.items():
-                if "." in k:
-                    parent, child = k.split(".")
-                    if parent not in d:
-                        d[parent] = {}
-                    d[parent][child] = v
-                else:
-                    d[k] = v
-            sanitized = sanitize_ads_document_for_storage({**d, "screen": screen})
-            sanitized.pop("screen", None)
-            await conn.execute("INSERT INTO ads_config (id, screen, ads_data) VALUES ($1, $2, $3)", oid, screen, orjson.dumps(sanitized).decode())
-
-        final_row = await conn.fetchrow("SELECT * FROM ads_config WHERE id = $1", oid)
-        final = orjson.loads(final_row["ads_data"]) if isinstance(final_row["ads_data"], str) else (dict(final_row.get("ads_data") or {}))
-        final["screen"] = screen
+    # Only the provided (non-None) fields are merged; list blocks are merged
+    # field-by-field inside the same statement.
+    final = await merge_ads_doc_atomic(pool, screen, payload.dict(exclude_none=True))
 
     await _invalidate_cache(f"ads_config:{screen}")
 
@@ -409,33 +433,135 @@ async def upsert_screen_ads_config(screen: str, payload: AdsConfigUpsert):
 
 @router.post("/device/register")
 async def register_device(device: DeviceRegistration):
-    """Register a device ID in the database."""
+    """
+    Register a device ID in the database.
+
+    Devices already known to this worker's registry filter are answered
+    from memory; their last_seen_at is updated by a periodic batched flush.
+    """
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database connection failed.")
 
-    async with pool.acquire() as conn:
-        existing = await conn.fetchval("SELECT 1 FROM devices WHERE device_id = $1", device.deviceId)
-        if existing:
-            return {"message": "Device already registered."}
-
-        await conn.execute("INSERT INTO devices (device_id, platform) VALUES ($1, $2)", device.deviceId, device.platform)
+    if not await device_registry.register(pool, device.deviceId, device.platform):
+        return {"message": "Device already registered."}
 
     return {"message": "Device registered successfully."}
 
 
 @router.post("/log")
 async def log_activity(log: LogEntry):
-    """Store user activity logs in PostgreSQL."""
+    """
+    Accept a user activity log for PostgreSQL.
+
+    The row is buffered by the write-behind log writer and persisted with
+    COPY in the background; the response is sent without waiting for it.
+    Answers 429 when the ingestion buffer is full.
+    """
     pool = get_pg_pool()
     if pool is None:
         raise HTTPException(status_code=503, detail="Database connection failed.")
 
-    from datetime import datetime
-    async with pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO user_actions_logs (device_id, event, details, client_timestamp) VALUES ($1, $2, $3, $4)",
-            log.deviceId, log.event, orjson.dumps(log.details).decode() if log.details else None, log.timestamp
+    accepted = user_actions_log_writer.submit(
+        user_action_record(log.deviceId, log.event, log.details, log.timestamp)
+    )
+    if not accepted:
+        raise HTTPException(
+            status_code=429,
+            detail="Log ingestion is busy. Please retry later.",
+            headers={"Retry-After": "1"},
         )
 
     return {"message": "Log stored successfully."}
+
+
+@router.post("/log/batch")
+async def log_activity_batch(request: Request):
+    """
+    Store many user activity logs in one request and one COPY.
+
+    Body is a JSON array of LogEntry objects (max LOG_BATCH_MAX_ENTRIES,
+    LOG_BATCH_MAX_BYTES on the wire and decoded).  It may be compressed
+    with ``Content-Encoding: gzip`` or ``zstd``.
+    The whole batch is validated up front; any invalid entry rejects the
+    request with 422 and nothing is stored.
+    """
+    pool = get_pg_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database connection failed.")
+
+    raw = _decode_log_batch_body(await _read_log_batch_body(request), request.headers.get("content-encoding"))
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON.")
+    if not isinstance(data, list):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON array of log entries.")
+    if len(data) > LOG_BATCH_MAX_ENTRIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(data)} entries (max {LOG_BATCH_MAX_ENTRIES}).",
+        )
+
+    try:
+        entries = _log_entry_list.validate_python(data)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False))
+
+    if not entries:
+        return {"message": "No logs to store.", "stored": 0}
+
+    records = [user_action_record(e.deviceId, e.event, e.details, e.timestamp) for e in entries]
+    async with pool.acquire() as conn:
+        await conn.copy_records_to_table(
+            "user_actions_logs", records=records, columns=USER_ACTIONS_LOG_COLUMNS
+        )
+
+    return {"message": "Logs stored successfully.", "stored": len(records)}
+
+
+@router.get("/rollups", dependencies=[Depends(verify_admin_token)])
+async def get_event_rollups(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = Query(None, description="Inclusive, defaults to 7 days ago (UTC)"),
+    end: Optional[datetime] = Query(None, description="Exclusive, defaults to now (UTC)"),
+    event: Optional[List[str]] = Query(None),
+    platform: Optional[List[str]] = Query(None),
+    group_by: str = Query("event,platform", description="Comma-separated subset of event,platform; empty = per bucket only"),
+):
+    """
+    Pre-aggregated event counts and distinct-device estimates for the admin UI.
+
+    Examples
+    --------
+    Events per day by type:  ?granularity=day&group_by=event
+    Active devices this week: ?granularity=day&group_by=&start=<monday>
+      → ``totals.distinct_devices`` is the HyperLogLog union over the range.
+    """
+    pool = get_pg_pool()
+    if pool is None:
+        raise HTTPException(status_code=503, detail="Database connection failed.")
+
+    end = end or datetime.now(timezone.utc)
+    start = start or (end - timedelta(days=7))
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'start' must be before 'end'.")
+
+    return await query_rollups(
+        granularity,
+        start,
+        end,
+        events=event,
+        platforms=platform,
+        group_by=[g.strip() for g in group_by.split(",") if g.strip()],
+    )
+
+
+@router.get("/log/metrics", dependencies=[Depends(verify_admin_token)])
+async def log_writer_metrics():
+    """Queue depth and flush latency of this worker's log writer."""
+    return user_actions_log_writer.metrics()
@@ -0,0 +1,128 @@
+"""
+Device registry fast path for POST /analytics/device/register.
+
+  • A per-worker Bloom filter of known device_ids is seeded from ``devices``
+    in the background at startup.
+  • A filter hit never touches Postgres on the request path: the device is
+    only queued for a ``last_seen_at`` bump.
+  • A filter miss does one ``INSERT … ON CONFLICT (device_id) DO NOTHING``.
+  • Queued ``last_seen_at`` bumps are flushed every DEVICE_SEEN_FLUSH_SECONDS
+    as a single multi-row upsert.  Because that flush is an upsert, a device
+    wrongly reported as known by the Bloom filter (false positive) still gets
+    inserted on the next flush.
+"""
+
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from db.db import get_pg_pool
+from stations.bloom import BloomFilter
+
+DEVICE_BLOOM_CAPACITY = int(os.getenv("DEVICE_BLOOM_CAPACITY", 2_000_000))
+DEVICE_BLOOM_ERROR_RATE = float(os.getenv("DEVICE_BLOOM_ERROR_RATE", 0.001))
+DEVICE_SEEN_FLUSH_SECONDS = int(os.getenv("DEVICE_SEEN_FLUSH_SECONDS", 60))
+
+
+def _generate_id():
+    return uuid.uuid4().hex[:24]
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self.known = BloomFilter(DEVICE_BLOOM_CAPACITY, DEVICE_BLOOM_ERROR_RATE)
+        self.seeded = False
+        self._seen: Dict[str, Tuple[Optional[str], datetime]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def register(self, pool, device_id: str, platform: Optional[str]) -> bool:
+        """Returns True if the device was newly inserted."""
+        if device_id in self.known:
+            self._seen[device_id] = (platform, datetime.now(timezone.utc))
+            return False
+
+        now = datetime.now(timezone.utc)
+        async with pool.acquire() as conn:
+            inserted = await conn.fetchval("""
+                INSERT INTO devices (id, device_id, platform, registered_at, last_seen_at)
+                VALUES ($1, $2, $3, $4::timestamptz, $4::timestamptz)
+                ON CONFLICT (device_id) DO NOTHING
+                RETURNING id
+            """, _generate_id(), device_id, platform, now)
+
+        self.known.add(device_id)
+        if not inserted:
+            self._seen[device_id] = (platform, now)
+        return inserted is not None
+
+    async def _seed(self, pool):
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor("SELECT device_id FROM devices", prefetch=10000):
+                    if row["device_id"]:
+                        self.known.add(row["device_id"])
+        self.seeded = True
+        print(f"Device registry seeded with {self.known.count} devices.")
+
+    async def flush_seen(self):
+        """Write queued last_seen_at bumps (and any Bloom false positives)."""
+        if not self._seen:
+            return
+        pool = get_pg_pool()
+        if pool is None:
+            return
+
+        pending, self._seen = self._seen, {}
+        device_ids = list(pending)
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO devices (id, device_id, platform, registered_at, last_seen_at)
+                    SELECT id, device_id, platform, seen_at, seen_at
+                    FROM unnest($1::text[], $2::text[], $3::text[], $4::timestamptz[])
+                         AS t(id, device_id, platform, seen_at)
+                    ON CONFLICT (device_id) DO UPDATE
+                    SET last_seen_at = GREATEST(devices.last_seen_at, EXCLUDED.last_seen_at),
+                        platform = COALESCE(devices.platform, EXCLUDED.platform)
+                """,
+                    [_generate_id() for _ in device_ids],
+                    device_ids,
+                    [pending[d][0] for d in device_ids],
+                    [pending[d][1] for d in device_ids],
+                )
+        except (Exception, asyncio.CancelledError) as e:
+            # Keep the bumps for the next flush (including the one in stop()).
+            for device_id, value in pending.items():
+                self._seen.setdefault(device_id, value)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            print(f"⚠️ Device last_seen flush failed ({len(pending)} devices): {e}")
+
+    async def _run(self, pool):
+        try:
+            await self._seed(pool)
+        except Exception as e:
+            print(f"⚠️ Device registry seeding failed, using DB path only: {e}")
+        while True:
+            await asyncio.sleep(DEVICE_SEEN_FLUSH_SECONDS)
+            await self.flush_seen()
+
+    async def start(self):
+        pool = get_pg_pool()
+        if self._task is None and pool is not None:
+            self._task = asyncio.create_task(self._run(pool))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_seen()
+
+
+device_registry = DeviceRegistry()
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
-from db.db import get_pg_conn
-import psycopg2
-from psycopg2.extras import Json
+from db.db import get_pg_pool
+from db.log_writer import user_actions_log_writer, user_action_record
 
 router = APIRouter(
     prefix="/analytics/pg",
@@ -18,36 +17,24 @@ class LogEntry(BaseModel):
 
 @router.post("/log")
 async def log_activity_pg(log: LogEntry):
-    """Store user activity logs in PostgreSQL."""
-    conn = get_pg_conn()
-    if conn is None:
+    """
+    Store user activity logs in PostgreSQL.
+
+    Legacy path kept for older app versions; it shares the asyncpg pool and
+    the write-behind log writer with /analytics/log.  The user_actions_logs
+    table is created by the startup migrations (db/migrations.py).
+    """
+    if get_pg_pool() is None:
         raise HTTPException(status_code=503, detail="PostgreSQL connection failed.")
-    
-    try:
-        cur = conn.cursor()
-        # Ensure table exists
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_actions_logs (
-                id SERIAL PRIMARY KEY,
-                device_id TEXT NOT NULL,
-                event TEXT NOT NULL,
-                details JSONB,
-                client_timestamp TEXT,
-                created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        cur.execute(
-            "INSERT INTO user_actions_logs (device_id, event, details, client_timestamp) VALUES (%s, %s, %s, %s)",
-            (log.deviceId, log.event, Json(log.details) if log.details else None, log.timestamp)
+
+    accepted = user_actions_log_writer.submit(
+        user_action_record(log.deviceId, log.event, log.details, log.timestamp)
+    )
+    if not accepted:
+        raise HTTPException(
+            status_code=429,
+            detail="Log ingestion is busy. Please retry later.",
+            headers={"Retry-After": "1"},
         )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return {"message": "Log stored in PostgreSQL successfully."}
-    except Exception as e:
-        if conn:
-            conn.rollback()
-            conn.close()
-        print(f"PostgreSQL insertion error: {e}")
-        raise HTTPException(status_code=500, detail=f"PostgreSQL error: {str(e)}")
+
+    return {"message": "Log stored in PostgreSQL successfully."}
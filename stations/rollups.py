@@ -0,0 +1,285 @@
+"""
+Incremental rollups of ``user_actions_logs`` into hourly and daily counters.
+
+Progress is tracked on the BIGINT ``id`` (insert order), not on
+``created_at``: the batched log writer stamps created_at at submit time and
+re-queues a batch after a failed COPY, so late rows can carry timestamps
+well behind rows that are already rolled up.  Each cycle notes the id
+sequence's current value; once ROLLUP_LAG_SECONDS have passed (every COPY
+that took one of those ids has committed) the rows up to it are read,
+aggregated per (granularity, bucket, event, platform) of their created_at
+and added into ``analytics_event_rollups``:
+
+  • event_count  – exact number of events
+  • device_hll   – HyperLogLog sketch of distinct device_ids; sketches of
+                   any set of rows can be merged to estimate distinct devices
+                   over a range (e.g. "active devices this week").
+
+The id watermark advance and the counter merge commit in one transaction, so a
+crashed cycle is simply redone.  Buckets are UTC; platform comes from the
+``devices`` table ("unknown" when the device never registered).
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db.db import get_pg_pool
+from stations.hll import HyperLogLog
+
+ROLLUP_NAME = "user_actions_logs"
+ROLLUP_LAG_SECONDS = int(os.getenv("ROLLUP_LAG_SECONDS", 120))
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", 60))
+# Ids read per cycle; a backlog is worked through in several cycles.
+ROLLUP_MAX_BATCH_IDS = int(os.getenv("ROLLUP_MAX_BATCH_IDS", 200_000))
+ROLLUP_BACKFILL_DAYS = int(os.getenv("ROLLUP_BACKFILL_DAYS", 7))
+
+ROLLUP_LOCK_KEY = 7_314_003
+GRANULARITIES = ("hour", "day")
+
+_task: Optional[asyncio.Task] = None
+
+RollupKey = Tuple[str, datetime, str, str]
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+class _RollupState:
+    def __init__(self, last_id: int, pending_id: Optional[int], pending_at: Optional[datetime]):
+        self.last_id = last_id
+        # Sequence value noted at pending_at; rolled up after ROLLUP_LAG_SECONDS.
+        self.pending_id = pending_id
+        self.pending_at = pending_at
+
+
+async def _load_state(conn) -> _RollupState:
+    row = await conn.fetchrow("""
+        SELECT watermark, last_id, pending_id, pending_at
+        FROM analytics_rollup_state WHERE name = $1 FOR UPDATE
+    """, ROLLUP_NAME)
+    if row is not None and row["last_id"] is not None:
+        pending_at = _utc(row["pending_at"]) if row["pending_at"] is not None else None
+        return _RollupState(row["last_id"], row["pending_id"], pending_at)
+
+    # First run, or state left by the created_at watermark: start after the
+    # rows that watermark already covers (or outside the backfill window).
+    if row is not None:
+        start = _utc(row["watermark"])
+    else:
+        start = (datetime.now(timezone.utc) - timedelta(days=ROLLUP_BACKFILL_DAYS)).replace(
+            minute=0, second=0, microsecond=0
+        )
+    last_id = await conn.fetchval(
+        "SELECT COALESCE(MAX(id), 0) FROM user_actions_logs WHERE created_at < $1", start
+    )
+    await conn.execute("""
+        INSERT INTO analytics_rollup_state (name, watermark, last_id) VALUES ($1, $2, $3)
+        ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id
+    """, ROLLUP_NAME, start, last_id)
+    return _RollupState(last_id, None, None)
+
+
+async def _note_pending(conn, state: _RollupState, now: datetime):
+    """Remember the id sequence's current value to roll up once it is safe."""
+    seq = await conn.fetchval(
+        "SELECT COALESCE(pg_sequence_last_value('user_actions_logs_id_seq'::regclass), 0)"
+    )
+    state.pending_id, state.pending_at = (seq, now) if seq > state.last_id else (None, None)
+
+
+def _aggregate(rows: Iterable[Any]) -> Dict[RollupKey, Tuple[int, HyperLogLog]]:
+    """Fold (hour, event, platform, device_id, n) rows into hour and day groups."""
+    counts: Dict[RollupKey, int] = defaultdict(int)
+    sketches: Dict[RollupKey, HyperLogLog] = defaultdict(HyperLogLog)
+
+    for row in rows:
+        hour = _utc(row["hour"])
+        day = hour.replace(hour=0)
+        for key in (("hour", hour, row["event"], row["platform"]), ("day", day, row["event"], row["platform"])):
+            counts[key] += row["n"]
+            sketches[key].add(row["device_id"])
+
+    return {key: (counts[key], sketches[key]) for key in counts}
+
+
+async def _merge_into_rollups(conn, groups: Dict[RollupKey, Tuple[int, HyperLogLog]]):
+    keys = list(groups)
+    columns = (
+        [k[0] for k in keys],
+        [k[1] for k in keys],
+        [k[2] for k in keys],
+        [k[3] for k in keys],
+    )
+
+    existing = await conn.fetch("""
+        SELECT r.granularity, r.bucket, r.event, r.platform, r.event_count, r.device_hll
+        FROM analytics_event_rollups r
+        JOIN unnest($1::text[], $2::timestamptz[], $3::text[], $4::text[]) AS k(granularity, bucket, event, platform)
+          ON r.granularity = k.granularity AND r.bucket = k.bucket
+         AND r.event = k.event AND r.platform = k.platform
+        FOR UPDATE OF r
+    """, *columns)
+
+    for row in existing:
+        key = (row["granularity"], _utc(row["bucket"]), row["event"], row["platform"])
+        count, sketch = groups[key]
+        groups[key] = (count + row["event_count"], sketch.merge(HyperLogLog.from_bytes(row["device_hll"])))
+
+    await conn.execute("""
+        INSERT INTO analytics_event_rollups (granularity, bucket, event, platform, event_count, device_hll)
+        SELECT * FROM unnest($1::text[], $2::timestamptz[], $3::text[], $4::text[], $5::bigint[], $6::bytea[])
+        ON CONFLICT (granularity, bucket, event, platform)
+        DO UPDATE SET event_count = EXCLUDED.event_count, device_hll = EXCLUDED.device_hll
+    """, *columns, [groups[k][0] for k in keys], [groups[k][1].to_bytes() for k in keys])
+
+
+async def _save_state(conn, state: _RollupState, watermark: Optional[datetime] = None):
+    await conn.execute("""
+        UPDATE analytics_rollup_state
+        SET last_id = $2, pending_id = $3, pending_at = $4, watermark = COALESCE($5, watermark)
+        WHERE name = $1
+    """, ROLLUP_NAME, state.last_id, state.pending_id, state.pending_at, watermark)
+
+
+async def run_rollup_cycle() -> int:
+    """
+    Roll up one batch of new log rows. Returns the number of source groups
+    processed, or -1 when another worker is busy or no ids are old enough
+    yet (caught up).
+    """
+    pool = get_pg_pool()
+    if pool is None:
+        return -1
+
+    async with pool.acquire() as conn:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ROLLUP_LOCK_KEY):
+            return -1
+        try:
+            async with conn.transaction():
+                now = datetime.now(timezone.utc)
+                state = await _load_state(conn)
+                if state.pending_id is None:
+                    await _note_pending(conn, state, now)
+                    await _save_state(conn, state)
+                    return -1
+                if now - state.pending_at < timedelta(seconds=ROLLUP_LAG_SECONDS):
+                    return -1
+
+                lower = state.last_id
+                upper = min(state.pending_id, lower + ROLLUP_MAX_BATCH_IDS)
+                rows = await conn.fetch("""
+                    WITH agg AS (
+                        SELECT date_trunc('hour', created_at AT TIME ZONE 'UTC') AS hour,
+                               event, device_id, COUNT(*) AS n
+                        FROM user_actions_logs
+                        WHERE id > $1 AND id <= $2
+                        GROUP BY 1, 2, 3
+                    )
+                    SELECT agg.hour, agg.event, COALESCE(d.platform, 'unknown') AS platform,
+                           agg.device_id, agg.n
+                    FROM agg
+                    LEFT JOIN LATERAL (
+                        SELECT platform FROM devices WHERE devices.device_id = agg.device_id LIMIT 1
+                    ) d ON TRUE
+                """, lower, upper)
+
+                groups = _aggregate(rows)
+                if groups:
+                    await _merge_into_rollups(conn, groups)
+
+                state.last_id = upper
+                watermark = None
+                if upper == state.pending_id:
+                    # Every id allocated before pending_at is now rolled up.
+                    watermark = state.pending_at
+                    await _note_pending(conn, state, now)
+                await _save_state(conn, state, watermark)
+                return len(rows)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ROLLUP_LOCK_KEY)
+
+
+async def query_rollups(
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    events: Optional[List[str]] = None,
+    platforms: Optional[List[str]] = None,
+    group_by: Iterable[str] = ("event", "platform"),
+) -> Dict[str, Any]:
+    """
+    Read rollup rows for [start, end) and collapse them to `group_by`
+    (any subset of "event", "platform"; the bucket is always kept).
+    """
+    pool = get_pg_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT bucket, event, platform, event_count, device_hll
+            FROM analytics_event_rollups
+            WHERE granularity = $1 AND bucket >= $2 AND bucket < $3
+              AND ($4::text[] IS NULL OR event = ANY($4::text[]))
+              AND ($5::text[] IS NULL OR platform = ANY($5::text[]))
+            ORDER BY bucket
+        """, granularity, start, end, events or None, platforms or None)
+
+    group_by = tuple(g for g in ("event", "platform") if g in group_by)
+    buckets: Dict[tuple, Tuple[int, HyperLogLog]] = {}
+    total_sketch = HyperLogLog()
+    total_count = 0
+
+    for row in rows:
+        sketch = HyperLogLog.from_bytes(row["device_hll"])
+        key = (_utc(row["bucket"]),) + tuple(row[g] for g in group_by)
+        count, merged = buckets.get(key, (0, HyperLogLog()))
+        buckets[key] = (count + row["event_count"], merged.merge(sketch))
+        total_sketch.merge(sketch)
+        total_count += row["event_count"]
+
+    return {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": list(group_by),
+        "buckets": [
+            {
+                "bucket": key[0].isoformat(),
+                **dict(zip(group_by, key[1:])),
+                "count": count,
+                "distinct_devices": sketch.count(),
+            }
+            for key, (count, sketch) in buckets.items()
+        ],
+        "totals": {"count": total_count, "distinct_devices": total_sketch.count()},
+    }
+
+
+async def _rollup_loop():
+    while True:
+        try:
+            # Keep going while there is a backlog; sleep once caught up.
+            while await run_rollup_cycle() >= 0:
+                pass
+        except Exception as e:
+            print(f"⚠️ Rollup cycle failed: {e}")
+        await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+
+
+async def start_rollup_engine():
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_rollup_loop())
+
+
+async def stop_rollup_engine():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,180 @@
+"""
+Routing checks for the LLM gateway with local fake providers (no network,
+no provider SDKs needed):
+
+    python test_llm_routing.py
+
+The checks are named check_* so pytest does not collect them.
+"""
+
+import asyncio
+import os
+
+# Keep the module-level gateway from configuring real providers (and so
+# importing the groq / google.genai SDKs).
+os.environ["LLM_PROVIDERS"] = ""
+
+import ai_assistant.llm_gateway as gateway_module
+from ai_assistant.llm_gateway import LLMGateway
+from ai_assistant.llm_providers import LLMProvider
+
+gateway_module.LLM_RETRY_BASE_SECONDS = 0.01
+gateway_module.LLM_HEDGE_MIN_MS = 20
+gateway_module.LLM_HEDGE_AFTER_MS = 200
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeProvider(LLMProvider):
+    rpm = 100_000
+    tpm = 100_000_000
+
+    def __init__(self, name, latency=0.01, fail=False, fail_mid_stream=False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.fail_mid_stream = fail_mid_stream
+        self.calls = 0
+
+    async def complete(self, model, messages, **params):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise FakeError(f"{self.name} is down")
+        return f"{self.name}: {messages[-1]['content']}"
+
+    async def open_stream(self, model, messages, **params):
+        self.calls += 1
+        if self.fail:
+            raise FakeError(f"{self.name} is down")
+
+        async def deltas():
+            await asyncio.sleep(self.latency)
+            for word in ("hello", " from ", self.name):
+                yield word
+                if self.fail_mid_stream:
+                    raise FakeError(f"{self.name} dropped the stream")
+
+        return deltas()
+
+    def is_retryable(self, exc):
+        return isinstance(exc, FakeError)
+
+
+def ask(i):
+    return [{"role": "user", "content": f"question {i}"}]
+
+
+async def warm_up(gateway, n=10):
+    for provider in gateway.providers:
+        for i in range(n):
+            await gateway._attempt(provider, "m", ask(i), {}, 10)
+
+
+async def check_routes_to_fastest():
+    slow, fast = FakeProvider("slow", latency=0.05), FakeProvider("fast", latency=0.01)
+    gateway = LLMGateway([slow, fast])
+    await warm_up(gateway)
+    assert [p.name for p in gateway.ranked()] == ["fast", "slow"]
+    reply = await gateway.complete(model="m", messages=ask("x"))
+    assert reply.startswith("fast:"), reply
+    print("✅ routes to the provider with the lowest p95")
+
+
+async def check_failover_on_error():
+    broken, backup = FakeProvider("broken", fail=True), FakeProvider("backup")
+    gateway = LLMGateway([broken, backup])
+    reply = await gateway.complete(model="m", messages=ask(1))
+    assert reply.startswith("backup:"), reply
+    assert gateway.failovers == 1
+    print("✅ fails over when the first provider errors")
+
+
+async def check_unhealthy_demoted():
+    broken, backup = FakeProvider("broken", fail=True), FakeProvider("backup", latency=0.05)
+    gateway = LLMGateway([broken, backup])
+    for i in range(6):
+        await gateway.complete(model="m", messages=ask(i))
+    calls = broken.calls
+    await gateway.complete(model="m", messages=ask("after"))
+    assert gateway.ranked()[0].name == "backup"
+    assert broken.calls == calls, "unhealthy provider should not be tried first"
+    print("✅ error rate above the threshold moves a provider to the back")
+
+
+async def check_hedges_slow_request():
+    stuck, quick = FakeProvider("stuck", latency=1.0), FakeProvider("quick", latency=0.01)
+    gateway = LLMGateway([stuck, quick])
+    started = asyncio.get_running_loop().time()
+    reply = await gateway.complete(model="m", messages=ask("slow"))
+    elapsed = asyncio.get_running_loop().time() - started
+    assert reply.startswith("quick:"), reply
+    assert elapsed < 0.5, elapsed
+    assert gateway.hedges == 1 and gateway.hedge_wins == 1
+    print(f"✅ hedges after the deadline ({elapsed * 1000:.0f} ms instead of 1000 ms)")
+
+
+async def check_all_down_raises():
+    gateway = LLMGateway([FakeProvider("a", fail=True), FakeProvider("b", fail=True)])
+    try:
+        await gateway.complete(model="m", messages=ask(1))
+    except FakeError:
+        pass
+    else:
+        raise AssertionError("expected FakeError")
+    assert gateway.retries == gateway_module.LLM_MAX_RETRIES and gateway.failures == 1
+    print("✅ retries, then raises when every provider is down")
+
+
+async def check_coalesces_identical_prompts():
+    provider = FakeProvider("only", latency=0.05)
+    gateway = LLMGateway([provider])
+    replies = await asyncio.gather(*(gateway.complete(model="m", messages=ask("same")) for _ in range(5)))
+    assert len(set(replies)) == 1 and provider.calls == 1
+    print("✅ identical in-flight prompts share one call")
+
+
+async def check_stream_failover():
+    gateway = LLMGateway([FakeProvider("broken", fail=True), FakeProvider("backup")])
+    stream = await gateway.open_stream(model="m", messages=ask(1))
+    text = "".join([delta async for delta in stream])
+    assert text == "hello from backup", text
+    assert all(sem._value == gateway._max_concurrency for sem in gateway._sems.values())
+    print("✅ streams fail over on open and release their slot")
+
+
+async def check_stream_stats():
+    provider = FakeProvider("streamer", latency=0.02)
+    gateway = LLMGateway([provider])
+    stream = await gateway.open_stream(model="m", messages=ask(1))
+    [delta async for delta in stream]
+    (_, latency_ms, ok), = gateway.stats["streamer"].samples
+    assert ok and latency_ms >= 20, latency_ms
+
+    provider.fail_mid_stream = True
+    stream = await gateway.open_stream(model="m", messages=ask(2))
+    try:
+        [delta async for delta in stream]
+    except FakeError:
+        pass
+    else:
+        raise AssertionError("expected FakeError")
+    assert [ok for _, _, ok in gateway.stats["streamer"].samples] == [True, False]
+    print(f"✅ streams record time to first token ({latency_ms:.0f} ms) and mid-stream failures")
+
+
+async def main():
+    await check_routes_to_fastest()
+    await check_failover_on_error()
+    await check_unhealthy_demoted()
+    await check_hedges_slow_request()
+    await check_all_down_raises()
+    await check_coalesces_identical_prompts()
+    await check_stream_failover()
+    await check_stream_stats()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())